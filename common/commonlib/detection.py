@@ -0,0 +1,321 @@
+"""
+Day2 schema detection records: the accessors of the record dictionaries,
+and a compact detection record. The compact record holds only the fields of
+a day2 schema record that the state kept across batches reads, so that the
+state does not reference the (much larger) original dictionaries.
+"""
+
+__version__ = '0.2'
+
+import json
+
+
+def get_xy(json_ele, point_key="centroid"):
+    """
+    Get the x and y values of a detected vehicle
+
+    Arguments:
+        json_ele {[dict]} -- Detection record in json schema
+
+    Keyword Arguments:
+        point_key {string} -- The location of the object: "centroid", or
+            "coordinate" in older schemas (default: {"centroid"})
+
+    Returns:
+        [list] -- A list comprised of [x,y]
+    """
+    if json_ele.get("object", {}).get(point_key, None) is not None:
+        (varx, vary) = (json_ele['object'][point_key]
+                        ['x'], json_ele['object'][point_key]['y'])
+        return [varx, vary]
+    else:
+        return None
+
+
+def get_obj_id_in_sensor(json_ele):
+    """
+    Get the object id value of a detected vehicle. The object id is a
+    combination of the sensor id and the object id
+
+    Arguments:
+        json_ele {[dict]} -- Detection record in json schema
+
+    Returns:
+        [string] -- Object ID
+    """
+    return "^S{}_^O{}".format(json_ele['sensor']['id'],
+                              json_ele['object']['id'])
+
+
+def get_obj_classid(json_ele):
+    """
+    Not used in favour of get_classid_string below that returns '' instead of None on lookup failure
+    Get the class id value of a detected object. 
+    
+    Arguments:
+        json_ele {[dict]} -- Detection record in json schema
+
+    Returns:
+        [string] -- Object ID
+    """
+    return json_ele.get('object', {}).get('classid', None)
+
+
+def get_obj_id(json_ele):
+    """
+    Get the object id value of a detected object. The object id returned
+    in this function is a string of the the object id
+
+    Arguments:
+        json_ele {[dict]} -- Detection record in json schema
+
+    Returns:
+        [string] -- Object ID
+    """
+    return json_ele.get('object', {}).get('id', None)
+
+
+def get_obj_id_str(json_ele):
+    """
+    Get the object id value of a detected vehicle. The object id returned
+    in this function is a string of the the object id (prefixed by some
+    unique chars)
+
+    Arguments:
+        json_ele {[dict]} -- Detection record in json schema
+
+    Returns:
+        [string] -- Object ID
+    """
+    return "^^O{}".format(get_obj_id(json_ele))
+
+
+def get_camera(json_ele):
+    """
+    Get the sensor/camera id of the detection
+
+    Arguments:
+        json_ele {[dict]} -- Detection record in json schema
+
+    Returns:
+        [string] -- Sensor ID
+    """
+    return json_ele['sensor']['id']
+
+
+def is_spot_rec(json_ele):
+    """
+    Is the given detection a parking spot record? The record is a parking spot
+    record if the "place" has a "parkingSpot" element, and if the event type
+    is either ["parked", "pulled", "empty"]
+
+    Arguments:
+        json_ele {[dict]} -- Detection record in json schema
+
+    Returns:
+        [boolean] -- True if the record is a parking spot record
+    """
+    if ((json_ele.get("place", {}).get("parkingSpot", None) is not None) and
+        (json_ele.get("event", {}).get("type", None) in
+         ["parked", "pulled", "empty"])):
+        return True
+    return False
+
+
+def is_parked_rec(json_ele):
+    """
+    Returns if the given detection is of a vehicle parked record. The record
+    is a parking spot record if the "place" has a "parkingSpot" element, and
+    if the event type is "parked"
+
+    Arguments:
+        json_ele {[dict]} -- Detection record in json schema
+
+    Returns:
+        [boolean] -- True if the record is of a parked car
+    """
+    if ((json_ele.get("place", {}).get("parkingSpot", None) is not None) and
+            (json_ele.get("event", {}).get("type", None) == "parked")):
+        return True
+    return False
+
+
+def is_empty_spot_rec(json_ele):
+    """
+    Returns if the given detection is of a parking spot that is empty. The
+    record is a parking spot record if the "place" has a "parkingSpot"
+    element, and if the event type is "empty"
+
+    Arguments:
+        json_ele {[dict]} -- Detection record in json schema
+
+    Returns:
+        [boolean] -- True if the record is of a empty spot
+    """
+    if ((json_ele.get("place", {}).get("parkingSpot", None) is not None) and
+            (json_ele.get("event", {}).get("type", None) == "empty")):
+        return True
+    return False
+
+
+def is_pulled_rec(json_ele):
+    """
+    Returns if the given detection is of a vehicle that has pulled
+    from a parking spot. The record is a parking spot record if the
+    "place" has a "parkingSpot" element, and if the event type is
+    "pulled"
+
+    Arguments:
+        json_ele {[dict]} -- Detection record in json schema
+
+    Returns:
+        [boolean] -- True if the record is of a pulled ar
+    """
+    if ((json_ele.get("place", {}).get("parkingSpot", None) is not None) and
+            (json_ele.get("event", {}).get("type", None) == "pulled")):
+        return True
+    return False
+
+
+def is_aisle_rec(json_ele):
+    """
+    Returns if the given detection is of a vehicle is for a vehicle on aisle.
+    The record is a aisle record if the "place" has a "aisle", "entrace" or
+    "exit" element, and if the event type is one among
+    ["entry",  "exit", "moving", "stopped"]
+
+    Arguments:
+        json_ele {[dict]} -- Detection record in json schema
+
+    Returns:
+        [boolean] -- True if the record is of a pulled ar
+    """
+    if(((json_ele.get("place", {}).get("entrance", None) is not None) or
+        (json_ele.get("place", {}).get("exit", None) is not None) or
+        (json_ele.get("place", {}).get("aisle", None) is not None)) and
+        (json_ele.get("event", {}).get("type", None)
+         in ["entry", "exit", "moving", "stopped"])):
+        return True
+    return False
+
+
+def get_vehicle_string(json_ele):
+    """
+    Get a string that describes a vehicle (in terms of its attributes).
+    Currently it just returns the license plate. It can be extended
+    to return other attributes
+
+    Arguments:
+        json_ele {[dict]} -- Detection record in json schema
+
+    Returns:
+        [string] -- Vehicle description string
+    """
+    vehicle = json_ele['object'].get('vehicle',{})
+    veh_string = vehicle.get('license', "")
+    return veh_string
+
+
+def get_tracker_string(json_ele):
+    """
+    Get the single camera tracker id of the detection ('' if not set)
+    """
+    return json_ele.get('object', {}).get('trackerid', '')
+
+
+def get_classid_string(json_ele):
+    """
+    Get the class id of the detection ('' if not set)
+    """
+    return json_ele.get('object', {}).get('classid', '')
+
+
+class Detection:
+    """
+    One detection. The attributes are:
+        timestamp {string} -- "@timestamp" (as in the record, not parsed)
+        x, y {float} -- object centroid (or coordinate in older schemas)
+        sensor {string} -- sensor id
+        obj_id {string} -- object id
+        classid {string} -- object class id
+        trackerid {string} -- single camera tracker id
+        level {string} -- place.subplace.level
+        event_type {string} -- event.type
+
+    Fields that are missing in the record are None
+    """
+
+    __slots__ = ("timestamp", "x", "y", "sensor", "obj_id", "classid",
+                 "trackerid", "level", "event_type")
+
+    def __init__(self, timestamp=None, x=None, y=None, sensor=None,
+                 obj_id=None, classid=None, trackerid=None, level=None,
+                 event_type=None):
+        self.timestamp = timestamp
+        self.x = x
+        self.y = y
+        self.sensor = sensor
+        self.obj_id = obj_id
+        self.classid = classid
+        self.trackerid = trackerid
+        self.level = level
+        self.event_type = event_type
+
+    def __repr__(self):
+        return ("Detection(timestamp={}, x={}, y={}, sensor={}, obj_id={}, "
+                "classid={}, trackerid={}, level={}, event_type={})".format(
+                    self.timestamp, self.x, self.y, self.sensor, self.obj_id,
+                    self.classid, self.trackerid, self.level, self.event_type))
+
+    @classmethod
+    def from_json(cls, json_ele, point_key=None):
+        """
+        Create a detection from a day2 schema record. The record is not
+        referenced by the detection
+
+        Arguments:
+            json_ele {dict or string} -- The record, as a dictionary or as
+            a json string
+
+        Keyword Arguments:
+            point_key {string} -- The location of the object, as in
+                get_xy() (default: {None}, the "centroid", or the
+                "coordinate" if there is no centroid)
+
+        Returns:
+            [Detection] -- The detection
+        """
+        if not isinstance(json_ele, dict):
+            json_ele = json.loads(json_ele)
+        obj = json_ele.get("object", {})
+        if point_key is not None:
+            point = obj.get(point_key, None)
+        else:
+            point = obj.get("centroid", None)
+            if point is None:
+                point = obj.get("coordinate", None)
+        if point is not None:
+            x = point.get("x", None)
+            y = point.get("y", None)
+        else:
+            x = y = None
+        return cls(timestamp=json_ele.get("@timestamp", None),
+                   x=x,
+                   y=y,
+                   sensor=json_ele.get("sensor", {}).get("id", None),
+                   obj_id=obj.get("id", None),
+                   classid=obj.get("classid", None),
+                   trackerid=obj.get("trackerid", None),
+                   level=json_ele.get("place", {}).get("subplace", {}).get("level", None),
+                   event_type=json_ele.get("event", {}).get("type", None))
+
+    def get_xy(self):
+        """
+        Get the x and y values of the detection (same as get_xy())
+
+        Returns:
+            [list] -- [x,y], or None if the detection has no location
+        """
+        if self.x is None:
+            return None
+        return [self.x, self.y]
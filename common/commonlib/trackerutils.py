@@ -0,0 +1,101 @@
+"""
+Utility functions shared by the tracker, the processor and the player
+"""
+
+__version__ = '0.2'
+
+import random
+import string
+
+import numpy as np
+
+
+def get_timestamp_str(datetime_obj):
+    """Return the string formatted timestamp for a given datetime object.
+    We assume that the datetime object is in the UTC timezone
+    Return format = '<YYYY>-<mm>-<dd>T<HH>:<MM>:<SS.SSS>Z'
+    where YYYY = 4 digit year
+        mm = 2 digit month
+        dd = 2 digit date
+        HH = 2 digit hour ( 0  to 23 )
+        HH = 2 digit minute ( 0  to 59 )
+        SS.SSS = Seconds (upto millisecond accuracy, 00.000 to 59.999)
+        Z signifies the UTC time-zone
+    Returns:
+        [string] -- Timestamp string
+    """
+    (dtobj, micro) = datetime_obj.strftime('%Y-%m-%dT%H:%M:%S.%f').split('.')
+    dtobj = "%s.%03dZ" % (dtobj, int(micro) / 1000)
+    return dtobj
+
+
+def get_mean_xy(pts):
+    """
+    Return the mean xy point (x_mean, y_mean) from the set of points
+
+    Arguments:
+        pts {list} -- List of (x,y) points
+
+    Returns:
+        [tuple] -- Mean (x,y) point
+    """
+
+    x_list = [p[0] for p in pts]
+    y_list = [p[1] for p in pts]
+    x_rep = np.mean(x_list)
+    y_rep = np.mean(y_list)
+    return (x_rep, y_rep)
+
+
+def get_median_xy(pts):
+    """
+    Return the median xy point (x_median, y_median) from the set of points
+
+    Arguments:
+        pts {list} -- List of (x,y) points
+
+    Returns:
+        [tuple] -- Median (x,y) point
+    """
+
+    x_list = [p[0] for p in pts]
+    y_list = [p[1] for p in pts]
+    # Use mean. Its faster
+    x_rep = np.median(x_list)
+    y_rep = np.median(y_list)
+    return (x_rep, y_rep)
+
+
+def get_max_camy_xy(pts):
+    """
+    Return the xy point with maximum y from the set of points
+
+    Arguments:
+        pts {list} -- List of (global_x,global_y, cam_x, cam_y) points
+
+    Returns:
+        [tuple] -- (x,y) point
+    """
+    x_rep = None
+    y_rep = None
+    best_camy = None
+    for point in pts:
+        if best_camy is None or best_camy < point[3]:
+            best_camy = point[3]
+            x_rep = point[0]
+            y_rep = point[1]
+    return (x_rep, y_rep)
+
+
+def get_random_lp():
+    """Generate a random license plate string (in standard California
+    state style)
+
+    Returns:
+        [string] -- Random license plate string
+    """
+    retval = str(random.choice([5] * 1 + [6]*2 + [7] * 2 + [8] * 1))
+    retval += ''.join(random.choice(string.ascii_uppercase)
+                      for _ in range(3))
+    retval += ''.join(random.choice(string.digits) for _ in range(3))
+    return retval
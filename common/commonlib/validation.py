@@ -6,13 +6,14 @@ import iso8601
 import jsonschema
 
 
-def schema_validate(record_str, day2_schema):
+def schema_validate(record_str, day2_schema, decode_fn=json.loads):
 
     retval = None
     # 1. Try to decode it into utf-8
-    # 2. Try to check if it is a valid json
+    # 2. Try to check if it is a valid json (decode_fn: e.g. the tracker
+    # decodes into records that keep their json text)
     try:
-        retval = json.loads(record_str)
+        retval = decode_fn(record_str)
         if day2_schema is not None:
             jsonschema.validate(retval, day2_schema)
     except UnicodeError as unicode_error:
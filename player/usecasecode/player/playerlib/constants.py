@@ -13,6 +13,9 @@ TAKE_ONE_FRAME_PER_PERIOD = True
 ASSUME_OBJS_HAVE_SAME_ID_INTRA_FRAME_PERIOD = True
 MERGE_CLOSE_BBS_FROM_SAME_CAM = True
 APPROX_TIME_PERIOD_TO_PRINT_INFO_IN_SEC = 10.0
+# Location of the object in the records: the player reads the "coordinate"
+# of the older schema (the tracker and processor read the "centroid")
+POINT_KEY = "coordinate"
 
 
 # Sensitive thresholds (Be careful while tuning)
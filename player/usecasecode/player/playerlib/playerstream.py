@@ -9,14 +9,14 @@ import time
 from timeit import default_timer as timer
 import iso8601
 from datetime import datetime, timedelta
-import copy
 
 import pandas as pd
 from kafka import KafkaProducer, errors
 #from kafka import KafkaConsumer
 #from cassandra.cluster import Cluster
 
-from playerlib import constants, validation, trackerutils
+from commonlib import validation
+from playerlib import constants, trackerutils
 
 class PlayerStream:
     """
@@ -306,7 +306,7 @@ class PlayerStream:
 
             #msgs_write = self.state_obj.state.msgs_write  #msgs_write is the output json to write to anomaly topic
             #self.state_obj.state.reset_msgs_write()
-            msgs_write = copy.deepcopy(all_json_list)  
+            msgs_write = list(all_json_list)  
             
         #db_write = self.state_obj.state.db_write  #data to write to database
         #self.state_obj.state.reset_db_write()
@@ -325,8 +325,11 @@ class PlayerStream:
         if self.producer is not None:
             for json_ele in json_list:
                 if self.add_timestamps:
-                    json_ele['object']['signature'].append(time.time()) # 0 = fake video frame read time
-                    json_ele['object']['signature'].append(time.time()) # 1 = fake write to kafka topic time
+                    # copy-on-write: the object is shared with the recorded detection
+                    json_ele = dict(json_ele, object=dict(json_ele['object']))
+                    json_ele['object']['signature'] = json_ele['object']['signature'] + [
+                        time.time(),  # 0 = fake video frame read time
+                        time.time()]  # 1 = fake write to kafka topic time
                 self.producer.send(self.out_kafkatopics, json_ele)
         return
 
@@ -4,7 +4,6 @@ This module has core classes for multicam tracking
 
 __version__ = '0.2'
 
-import copy
 import logging
 import math
 import time
@@ -18,6 +17,7 @@ from datetime import datetime
 #from scipy.spatial import distance_matrix
 #from shapely.geometry import LineString, Point
 
+from commonlib import detection
 from playerlib import constants, trackerutils
 #from geo.core import spatial
 #from euclidean import euchelper
@@ -54,7 +54,7 @@ class StateTrackerState:
         
         # data internal to the StateTracker object typically maintained over time       
         self.possible_stalled_cars = {}  #TJH added. key = vehicle license. will contain the license, bbox, start time
-        self.possible_understays = {}  #TJH added. key:vehicle license, start_time:time, json:json
+        self.possible_understays = {}  #TJH added. key:vehicle license, start_time:time, det:detection.Detection
         self.entry_exit_count = self.reset_entry_exit_count()
         self.entry_exit_update_sec = config.get("entry_exit_update_sec", constants.ENTRY_EXIT_UPDATE_SEC)
         self.understay_thresh_sec = config.get("understay_thresh_sec", constants.UNDERSTAY_THRESH_SEC)
@@ -284,7 +284,7 @@ class StateTracker:
 
     def calc_stalls(self, state_recs):
         """ Process and return stalled vehicles
-        self.possible_stalled_cars structure =  {'vehicle license', {'start_time':time, 'json':json}}
+        self.possible_stalled_cars structure =  {'vehicle license', {'start_time':time, 'det':detection.Detection}}
         NOTE: IN reality you would need to run a periodic process to delete orphaned possible_stalled_cars records, say once an hour
         """
         stalls = []
@@ -295,17 +295,17 @@ class StateTracker:
             if curr_vehicle:   #if it's a vehicle
                 curr_possible_stalled_car = self.state.possible_stalled_cars.get(curr_vehicle, {})
                 if not curr_possible_stalled_car:
-                    self.state.possible_stalled_cars.update({curr_vehicle:{'start_time':curr_time, 'json':json_ele}})
+                    self.state.possible_stalled_cars.update({curr_vehicle:{'start_time':curr_time,
+                                                                           'det':detection.Detection.from_json(json_ele, point_key=constants.POINT_KEY)}})
                 else:
                     age = curr_time - curr_possible_stalled_car.get('start_time', 0.0)
                     if age >= self.state.stalled_car_thresh_sec:
-                        prev_json_ele = curr_possible_stalled_car.get('json', {})
-                        prev_xy = trackerutils.get_xy(prev_json_ele)
+                        prev_det = curr_possible_stalled_car['det']
                         curr_xy = trackerutils.get_xy(json_ele)
-                        if abs(curr_xy[0] - prev_xy[0]) < self.state.stalled_car_thresh_mtr and \
-                           abs(curr_xy[1] - prev_xy[1]) < self.state.stalled_car_thresh_mtr:
+                        if abs(curr_xy[0] - prev_det.x) < self.state.stalled_car_thresh_mtr and \
+                           abs(curr_xy[1] - prev_det.y) < self.state.stalled_car_thresh_mtr:
                                json_ele.update({'endTimestamp': json_ele.get('@timestamp','')})
-                               json_ele.update({'startTimestamp': prev_json_ele.get('@timestamp','')})
+                               json_ele.update({'startTimestamp': prev_det.timestamp or ''})
                                json_ele.update({'event':{'id': str(uuid.uuid4()), 'type': 'UnexpectedStopping'}})
                                json_ele.update({'analyticsModule':{'id': '1', 
                                                                     'description': 'Unexpected Stopping ' + str(age) + ' seconds', 
@@ -326,7 +326,7 @@ class StateTracker:
 
     def calc_understays(self, state_recs):
         """ Process and return understays
-        self.possible_understays structure =  {'vehicle license', {'start_time':time, 'json':json}}
+        self.possible_understays structure =  {'vehicle license', {'start_time':time, 'det':detection.Detection}}
         NOTE: IN reality you would need to run a periodic process to delete orphaned possible_understays records, say once an hour
         """
         understays = []
@@ -335,7 +335,8 @@ class StateTracker:
         for json_ele in state_recs['entry']:
             curr_vehicle = trackerutils.get_vehicle_string(json_ele)
             if curr_vehicle:  #if this is a vehicle
-                self.state.possible_understays.update({curr_vehicle:{'start_time':curr_time, 'json':json_ele}})
+                self.state.possible_understays.update({curr_vehicle:{'start_time':curr_time,
+                                                                     'det':detection.Detection.from_json(json_ele, point_key=constants.POINT_KEY)}})
 
         #process exits                
         for json_ele in state_recs['exit']:   #IT APPEARS WE DONT SEE ANY 'EXIT' msgs so actually we wont see any understays!
@@ -344,9 +345,9 @@ class StateTracker:
             if exitdict:  #if this is a vehicle with a potential understay record
                 time_of_stay = curr_time - exitdict.get('start_time', 0.0)   #should decode json_ele's timestamp instead but ok for demo
                 if time_of_stay <= self.state.understay_thresh_sec:
-                    prev_json_ele = exitdict.get('json', {})
+                    prev_det = exitdict['det']
                     json_ele.update({'endTimestamp': json_ele.get('@timestamp','')})
-                    json_ele.update({'startTimestamp': prev_json_ele.get('@timestamp','')})
+                    json_ele.update({'startTimestamp': prev_det.timestamp or ''})
                     json_ele.update({'event':{'id': str(uuid.uuid4()), 'type': 'Understay'}})
                     json_ele.update({'analyticsModule':{'id': '1', 
                                                         'description': 'Short Stay ' + str(time_of_stay/60) + ' minutes', 
@@ -377,12 +378,23 @@ class StateTracker:
         return 
 
     
+    def copy_for_output(self, json_list):
+        """ copy-on-write copies of the records for the database: only the
+            top level dicts are copied, the nested fields are shared with the
+            original payload. Only top level fields of the copies may be
+            set or removed (nested dicts are replaced, not changed)
+        """
+        return [dict(json_ele) for json_ele in json_list]
+
     def remove_unwanted_fields(self, json_list):
         """ remove json fields not present in cassandra table
         """
         for json_ele in json_list:
             if json_ele.get('analyticsModule', {}).get('confidence', None) is not None:
-                del json_ele['analyticsModule']['confidence']
+                # copy-on-write: analyticsModule is shared with the payload
+                json_ele['analyticsModule'] = {
+                    key: value for key, value in json_ele['analyticsModule'].items()
+                    if key != 'confidence'}
         return    
 
     def add_calculated_fields(self, json_list):
@@ -434,9 +446,8 @@ class StateTracker:
         state_recs = self.get_vehicles_in_difft_states(all_json_list)
 
         # process database updates to be done
-        state_recs_copy = copy.deepcopy(state_recs)
-        parkingspot = state_recs_copy['parked'] + state_recs_copy['empty']
-        aisle = state_recs_copy['moving'] + state_recs_copy['entry'] + state_recs_copy['exit']
+        parkingspot = self.copy_for_output(state_recs['parked'] + state_recs['empty'])
+        aisle = self.copy_for_output(state_recs['moving'] + state_recs['entry'] + state_recs['exit'])
 
         self.replace_timestamp(parkingspot)
         self.remove_unwanted_fields(parkingspot)
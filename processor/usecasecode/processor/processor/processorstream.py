@@ -16,7 +16,8 @@ from kafka import KafkaConsumer, KafkaProducer, errors
 
 from cassandra.cluster import Cluster
 
-from processor import constants, statetracker, validation
+from commonlib import validation
+from processor import constants, statetracker
 
 class ProcessorStream:
     """
@@ -348,7 +349,9 @@ class ProcessorStream:
         if detections:
             for d in detections:
                 if self.add_timestamps:
-                    d['object']['signature'].append(time.time())  #6th signature item = processor write to cassandra
+                    # copy-on-write: the object is shared with the kafka payload
+                    d = dict(d, object=dict(d['object']))
+                    d['object']['signature'] = d['object']['signature'] + [time.time()]  #6th signature item = processor write to cassandra
                 future = self.session.execute_async(self.query_i_objectmarker, [json.dumps(d)])
                 future.add_callbacks(self.handle_success, self.handle_error)
         
@@ -4,13 +4,13 @@ This module has core classes for multicam stream processing
 
 __version__ = '0.2'
 
-import copy
 import logging
 import time
 import uuid
 import iso8601
 from datetime import datetime
 
+from commonlib import detection
 from processor import constants, trackerutils
 
 
@@ -44,7 +44,7 @@ class StateTrackerState:
         self.reset_db_write()
         
         # data internal to the StateTracker object typically maintained over time       
-        self.possible_motionless = {}  #TJH added. key = tracker id. structure: {'trackerid', {'start_time':time, 'type':'veh' or 'per', 'json':json}}
+        self.possible_motionless = {}  #TJH added. key = tracker id. structure: {'trackerid', {'start_time':time, 'type':'veh' or 'per', 'det':detection.Detection}}
         self.entry_exit_count = self.reset_entry_exit_count()  #not used
         self.stalled_veh_classids = config.get("stalled_veh_classids", constants.STALLED_VEH_CLASSIDS)
         self.stalled_veh_thresh_sec = config.get("stalled_veh_thresh_sec", constants.STALLED_VEH_THRESH_SEC)
@@ -156,7 +156,7 @@ class StateTracker:
                                               'thresh_mtr':self.motionless_thresh_mtr,
                                               'delete_sec':self.motionless_delete_sec,
                                               'curr_time':datetime of 'now'}   
-        self.possible_motionless structure =  {'trackerid', {'start_time':time, 'type':'veh' or 'per', 'json':json}}
+        self.possible_motionless structure =  {'trackerid', {'start_time':time, 'type':'veh' or 'per', 'det':detection.Detection}}
         NOTE: IN reality you would need to run a periodic process to delete orphaned possible_motionless records, say once an hour
         """
         if not params['classids']:
@@ -171,19 +171,19 @@ class StateTracker:
                 if curr_object:
                     curr_possible_motionless_object = self.state.possible_motionless.get(curr_object, {})
                     if not curr_possible_motionless_object:
+                        # Keep only the fields read below, not the whole record
                         self.state.possible_motionless.update({curr_object:{'start_time': curr_time,
                                                                             'type': params['type'],
-                                                                            'json': json_ele}})
+                                                                            'det': detection.Detection.from_json(json_ele)}})
                     else:
                         age = (curr_time - curr_possible_motionless_object['start_time']).total_seconds()
                         if age >= params['thresh_sec']:
-                            prev_json_ele = curr_possible_motionless_object.get('json', {})
-                            prev_xy = trackerutils.get_xy(prev_json_ele)
+                            prev_det = curr_possible_motionless_object['det']
                             curr_xy = trackerutils.get_xy(json_ele)
-                            if abs(curr_xy[0] - prev_xy[0]) < params['thresh_mtr'] and \
-                               abs(curr_xy[1] - prev_xy[1]) < params['thresh_mtr']:
+                            if abs(curr_xy[0] - prev_det.x) < params['thresh_mtr'] and \
+                               abs(curr_xy[1] - prev_det.y) < params['thresh_mtr']:
                                    json_ele.update({'endTimestamp': json_ele.get('@timestamp','')})
-                                   json_ele.update({'startTimestamp': prev_json_ele.get('@timestamp','')})
+                                   json_ele.update({'startTimestamp': prev_det.timestamp or ''})
                                    if params['type'] == 'veh':
                                        json_ele.update({'event':{'id': str(uuid.uuid4()), 'type': 'UnexpectedStopping'}})
                                        json_ele.update({'analyticsModule':{'id': '1', 
@@ -204,6 +204,15 @@ class StateTracker:
     
 
     
+    def copy_for_output(self, json_list):
+        """ copy-on-write copies of the records for the database: only the
+            top level dicts are copied, the nested fields are shared with the
+            original payload. Only top level fields of the copies may be
+            set or removed (nested dicts are replaced, not changed)
+        """
+        return [dict(json_ele) for json_ele in json_list]
+
+
     def replace_timestamp(self, json_list):
         """ replace '@timestamp' with 'timestamp'
         """
@@ -217,7 +226,10 @@ class StateTracker:
         """
         for json_ele in json_list:
             if json_ele.get('analyticsModule', {}).get('confidence', None) is not None:
-                del json_ele['analyticsModule']['confidence']
+                # copy-on-write: analyticsModule is shared with the payload
+                json_ele['analyticsModule'] = {
+                    key: value for key, value in json_ele['analyticsModule'].items()
+                    if key != 'confidence'}
         return    
 
 
@@ -291,8 +303,7 @@ class StateTracker:
         state_recs = self.get_objects_in_difft_states(all_json_list)
 
         # process database updates to be done
-        state_recs_copy = copy.deepcopy(state_recs)
-        detections = state_recs_copy['detection']
+        detections = self.copy_for_output(state_recs['detection'])
         self.replace_timestamp(detections)
         #self.remove_unwanted_fields(detections)  #not presently needed
         self.update_location_fields(detections)
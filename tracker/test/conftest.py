@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The tracker code (code_libs) and the test helpers (synthetic)
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TEST_DIR, "..", "usecasecode", "tracker"))
+sys.path.insert(0, TEST_DIR)
@@ -0,0 +1,180 @@
+"""
+Synthetic day2 schema detections for the tracker tests.
+
+Objects move along straight lines through the fields of view of a few
+cameras. Each camera reports the objects it sees at its own frame rate,
+with position noise and its own (single camera tracker) object ids. Camera
+pairs "0000"/"0001" and "0400"/"0401" overlap (as in
+config/config_tracker.json), so objects seen by both get clustered.
+"""
+
+import copy
+import datetime
+import random
+
+import iso8601
+
+CAMERAS = {
+    # camera id: (x range, y range) of its field of view
+    "0000": ((-60.0, 10.0), (-40.0, 40.0)),
+    "0001": ((-10.0, 60.0), (-40.0, 40.0)),
+    "0100": ((-60.0, 60.0), (40.0, 90.0)),
+    "0400": ((-60.0, 10.0), (-90.0, -40.0)),
+    "0401": ((-10.0, 60.0), (-90.0, -40.0)),
+}
+
+START_TIME = datetime.datetime(2019, 6, 30, 7, 40, 0)
+
+TEMPLATE = {
+    "messageid": "",
+    "mdsversion": "1.0",
+    "@timestamp": "",
+    "place": {
+        "id": "1",
+        "name": "synthetic",
+        "type": "street",
+        "location": {"lat": 0.0, "lon": 0.0, "alt": 0.0},
+        "subplace": {"id": "0", "name": "", "level": "p1",
+                     "coordinate": {"x": 0.0, "y": 0.0, "z": 0.0}},
+    },
+    "sensor": {
+        "id": "",
+        "type": "Camera",
+        "description": "synthetic camera",
+        "location": {"lat": 0.0, "lon": 0.0, "alt": 0.0},
+        "coordinate": {"x": 0.0, "y": 0.0, "z": 0.0},
+    },
+    "analyticsModule": {"id": "1", "description": "Vehicle Detection",
+                        "source": "OpenALR", "version": "1.0"},
+    "object": {
+        "id": "",
+        "speed": 0.0,
+        "direction": 0.0,
+        "orientation": 0.0,
+        "classid": "",
+        "confidence": 0.9,
+        "vehicle": {"type": "sedan", "make": "Bugatti", "model": "M",
+                    "color": "blue", "licenseState": "CA", "license": "",
+                    "confidence": 0.9},
+        "bbox": {"topleftx": 0, "toplefty": 0, "bottomrightx": 0,
+                 "bottomrighty": 0},
+        "location": {"lat": 0.0, "lon": 0.0, "alt": 0.0},
+        "coordinate": {"x": 0.0, "y": 0.0, "z": 0.0},
+        "centroid": {"x": 0.0, "y": 0.0, "z": 0.0},
+    },
+    "event": {"id": "", "type": "detection"},
+    "videoPath": "",
+}
+
+
+def in_fov(cam, x, y):
+    """True if (x, y) is in the field of view of the camera"""
+    (minx, maxx), (miny, maxy) = CAMERAS[cam]
+    return minx <= x <= maxx and miny <= y <= maxy
+
+
+def get_detections(num_objects=40, duration_sec=30.0, fps=5.0, seed=0,
+                   id_prefix="", start_time=START_TIME):
+    """
+    Generate the detections of num_objects objects over duration_sec
+
+    Keyword Arguments:
+        num_objects {int} -- Number of objects (default: {40})
+        duration_sec {float} -- Duration of the scene (default: {30.0})
+        fps {float} -- Frame rate of the cameras (default: {5.0})
+        seed {int} -- Random seed (default: {0})
+        id_prefix {string} -- Prefix of the object ids (default: {""})
+        start_time {datetime} -- Time of the start of the scene (default:
+            {START_TIME})
+
+    Returns:
+        list -- day2 schema dictionaries, sorted by timestamp
+    """
+    rnd = random.Random(seed)
+    objects = []
+    for i in range(num_objects):
+        start = rnd.uniform(0.0, duration_sec * 0.7)
+        x_0, y_0 = rnd.uniform(-60.0, 60.0), rnd.uniform(-90.0, 90.0)
+        speed = rnd.uniform(0.0, 8.0)
+        dx, dy = rnd.choice([(1, 0), (-1, 0), (0, 1), (0, -1), (0.7, 0.7)])
+        objects.append({"start": start,
+                        "end": start + rnd.uniform(3.0, 15.0),
+                        "x": x_0, "y": y_0,
+                        "vx": dx * speed, "vy": dy * speed,
+                        "classid": rnd.choice(["car", "car", "person"]),
+                        "license": "LP{:03d}".format(i) if rnd.random() < 0.5 else ""})
+
+    json_list = []
+    frame_dt = 1.0 / fps
+    cam_ids = {}  # key: (camera, object index), value: single camera track id
+    next_id = {cam: 100 for cam in CAMERAS}
+    for cam_num, cam in enumerate(sorted(CAMERAS)):
+        # Each camera has its own frame phase
+        t_frame = cam_num * frame_dt / len(CAMERAS)
+        while t_frame < duration_sec:
+            for obj_num, obj in enumerate(objects):
+                if not obj["start"] <= t_frame <= obj["end"]:
+                    continue
+                age = t_frame - obj["start"]
+                x = obj["x"] + obj["vx"] * age
+                y = obj["y"] + obj["vy"] * age
+                if not in_fov(cam, x, y) or rnd.random() < 0.05:
+                    continue
+                key = (cam, obj_num)
+                if key not in cam_ids or rnd.random() < 0.01:
+                    # New single camera track (or an id switch)
+                    cam_ids[key] = "{}{}".format(id_prefix, next_id[cam])
+                    next_id[cam] += 1
+                json_ele = copy.deepcopy(TEMPLATE)
+                timestamp = start_time + datetime.timedelta(seconds=t_frame)
+                json_ele["@timestamp"] = "{}.{:03d}Z".format(
+                    timestamp.strftime("%Y-%m-%dT%H:%M:%S"),
+                    timestamp.microsecond // 1000)
+                json_ele["messageid"] = "{}-{}".format(cam, len(json_list))
+                json_ele["sensor"]["id"] = cam
+                json_ele["object"]["id"] = cam_ids[key]
+                json_ele["object"]["classid"] = obj["classid"]
+                json_ele["object"]["vehicle"]["license"] = obj["license"]
+                json_ele["object"]["centroid"]["x"] = x + rnd.gauss(0.0, 0.5)
+                json_ele["object"]["centroid"]["y"] = y + rnd.gauss(0.0, 0.5)
+                json_ele["event"]["id"] = json_ele["messageid"]
+                json_list.append(json_ele)
+            t_frame += frame_dt
+    json_list.sort(key=lambda json_ele: (json_ele["@timestamp"],
+                                         json_ele["messageid"]))
+    return json_list
+
+
+def get_fov_dict():
+    """
+    Returns:
+        dict -- The FOV polygon of each camera (the CAMERA_FOV config key)
+    """
+    return {cam: [[minx, miny], [maxx, miny], [maxx, maxy], [minx, maxy]]
+            for cam, ((minx, maxx), (miny, maxy)) in CAMERAS.items()}
+
+
+def get_windows(json_list, resample_time_sec=0.5):
+    """
+    Split the detections into the batches of the tracker (one per
+    resample_time_sec period)
+
+    Arguments:
+        json_list {list} -- day2 schema dictionaries, sorted by timestamp
+
+    Keyword Arguments:
+        resample_time_sec {float} -- The batch period (default: {0.5})
+
+    Returns:
+        list -- list of batches (lists of dictionaries)
+    """
+    windows = []
+    last_period = None
+    for json_ele in json_list:
+        period = int(iso8601.parse_date(json_ele["@timestamp"]).timestamp() //
+                     resample_time_sec)
+        if period != last_period:
+            windows.append([])
+            last_period = period
+        windows[-1].append(json_ele)
+    return windows
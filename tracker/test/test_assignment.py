@@ -0,0 +1,97 @@
+"""
+The auction solver must find an optimal assignment: the same total cost as
+linear_sum_assignment(), with and without a warm start
+"""
+
+import numpy as np
+import pytest
+from scipy.optimize import linear_sum_assignment
+
+from code_libs.mctrack import assignment
+
+
+def get_cost_matrix(random_state, num_rows, num_cols, max_cost=1000):
+    """Integer costs: the auction is exact when n * min_eps * scale < 1"""
+    return random_state.randint(0, max_cost, size=(num_rows, num_cols)).astype(float)
+
+
+def check_optimal(cost_matrix, solution):
+    """The solution is a valid assignment with the optimal total cost"""
+    row_ind, col_ind = solution
+    assert len(set(row_ind.tolist())) == len(row_ind)
+    assert len(set(col_ind.tolist())) == len(col_ind)
+    assert len(row_ind) == min(cost_matrix.shape)
+    row_opt, col_opt = linear_sum_assignment(cost_matrix)
+    assert cost_matrix[row_ind, col_ind].sum() == cost_matrix[row_opt, col_opt].sum()
+
+
+@pytest.mark.parametrize("shape", [(1, 1), (5, 5), (30, 30), (12, 20), (20, 12),
+                                   (1, 7), (7, 1)])
+def test_auction_matches_exact(shape):
+    random_state = np.random.RandomState(0)
+    for _ in range(5):
+        solver = assignment.AuctionSolver()
+        cost_matrix = get_cost_matrix(random_state, *shape)
+        check_optimal(cost_matrix, solver.solve(cost_matrix))
+        assert solver.stats["fallbacks"] == 0
+
+
+def test_auction_empty():
+    row_ind, col_ind = assignment.AuctionSolver().solve(np.zeros((0, 4)))
+    assert len(row_ind) == 0 and len(col_ind) == 0
+
+
+def test_auction_warm_start():
+    # A sequence of problems as in tracking: the objects persist with
+    # slowly changing costs, some leave and new ones arrive, so that the
+    # size and scale of the problem change
+    random_state = np.random.RandomState(1)
+    solver = assignment.AuctionSolver()
+    obj_ids = list(range(25))
+    next_id = len(obj_ids)
+    cost_matrix = get_cost_matrix(random_state, 20, len(obj_ids))
+    for step in range(30):
+        col_keys = [[str(obj_id)] for obj_id in obj_ids]
+        check_optimal(cost_matrix, solver.solve(cost_matrix, col_keys))
+        num_leave = random_state.randint(0, 4)
+        num_arrive = random_state.randint(0, 4)
+        keep = sorted(random_state.choice(len(obj_ids), len(obj_ids) - num_leave,
+                                          replace=False))
+        obj_ids = [obj_ids[j] for j in keep] + list(range(next_id, next_id + num_arrive))
+        next_id += num_arrive
+        cost_matrix = cost_matrix[:, keep] + random_state.randint(-20, 21, size=(20, len(keep)))
+        cost_matrix = np.clip(cost_matrix, 0, None)
+        cost_matrix = np.hstack([cost_matrix, get_cost_matrix(random_state, 20, num_arrive)])
+        if step % 10 == 9:
+            cost_matrix *= 3
+    assert solver.stats["solved"] == 30
+    assert solver.stats["warmStarted"] == 29
+    assert solver.stats["fallbacks"] == 0
+
+
+def test_auction_warm_start_other_problem():
+    # Prices of an unrelated, differently sized and scaled problem: still
+    # the optimal assignment
+    random_state = np.random.RandomState(2)
+    solver = assignment.AuctionSolver()
+    cost_matrix = get_cost_matrix(random_state, 10, 15, max_cost=100000)
+    solver.solve(cost_matrix, [[str(j)] for j in range(15)])
+    cost_matrix = get_cost_matrix(random_state, 25, 20, max_cost=50)
+    check_optimal(cost_matrix, solver.solve(cost_matrix, [[str(j)] for j in range(20)]))
+    assert solver.stats["warmStarted"] == 1
+    assert solver.stats["fallbacks"] == 0
+
+
+def test_auction_fallback():
+    # Too few bids to converge: the exact solver is used, and counted
+    random_state = np.random.RandomState(3)
+    solver = assignment.AuctionSolver(max_bids_factor=1)
+    col_keys = [[str(j)] for j in range(20)]
+    for _ in range(2):
+        cost_matrix = get_cost_matrix(random_state, 20, 20)
+        check_optimal(cost_matrix, solver.solve(cost_matrix, col_keys))
+    assert solver.stats["solved"] == 2
+    assert solver.stats["fallbacks"] == 2
+    # No prices are kept from a fallback: no warm start
+    assert solver.stats["warmStarted"] == 0
+    assert solver.stats["coldRestarts"] == 0
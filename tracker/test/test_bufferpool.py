@@ -0,0 +1,59 @@
+"""
+The buffer pool must reuse its arrays across timesteps with varying sizes
+and dtypes, and condensed_dist() must give the same result as squareform()
+"""
+
+import numpy as np
+import pytest
+from scipy.spatial.distance import squareform
+
+from code_libs.mctrack import bufferpool
+
+
+def get_dist_matrix(random_state, num, dtype):
+    dist_matrix = random_state.rand(num, num).astype(dtype)
+    dist_matrix = dist_matrix + dist_matrix.T
+    np.fill_diagonal(dist_matrix, 0)
+    return dist_matrix
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32, np.int64])
+def test_condensed_dist(dtype):
+    random_state = np.random.RandomState(0)
+    buffer_pool = bufferpool.BufferPool()
+    for num in [1, 2, 10, 7, 10, 30]:
+        dist_matrix = get_dist_matrix(random_state, num, dtype)
+        condensed = bufferpool.condensed_dist(dist_matrix, buffer_pool)
+        assert condensed.dtype == dtype
+        assert np.array_equal(condensed, squareform(dist_matrix, checks=False))
+
+
+def test_varying_sizes_reuse():
+    # The number of detections alternates between timesteps: once every
+    # size has been seen, nothing is allocated
+    random_state = np.random.RandomState(1)
+    buffer_pool = bufferpool.BufferPool(max_triu_sizes=4)
+    sizes = [12, 30, 7, 25] * 10
+    for num in sizes[:4]:
+        bufferpool.condensed_dist(get_dist_matrix(random_state, num, np.float64),
+                                  buffer_pool)
+    num_allocs = buffer_pool.num_allocs
+    for num in sizes[4:]:
+        bufferpool.condensed_dist(get_dist_matrix(random_state, num, np.float64),
+                                  buffer_pool)
+    assert buffer_pool.num_allocs == num_allocs
+    # A new size drops the least recently used one
+    bufferpool.condensed_dist(get_dist_matrix(random_state, 5, np.float64),
+                              buffer_pool)
+    assert sorted(buffer_pool.triu_indices) == [5, 7, 25, 30]
+
+
+def test_buffers_per_dtype():
+    buffer_pool = bufferpool.BufferPool()
+    float_arr = buffer_pool.get("work", (4, 5))
+    bool_arr = buffer_pool.get("work", (4, 5), dtype=bool)
+    int_arr = buffer_pool.get("work", (3, 3), dtype=np.int_)
+    assert (float_arr.dtype, bool_arr.dtype, int_arr.dtype) == (
+        np.float64, np.bool_, np.int_)
+    assert buffer_pool.get_stats()["numBuffers"] == 3
+    assert buffer_pool.get("work", (2, 10), dtype=bool).base is bool_arr.base
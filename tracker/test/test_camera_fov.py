@@ -0,0 +1,78 @@
+"""
+The camera rules derived from the FOV polygons (CAMERA_FOV without other
+camera rules) must not keep apart the detections whose objects were
+clustered before (linked by id), whatever the FOVs. Configured camera rules
+still do
+"""
+
+import copy
+
+import pytest
+
+import synthetic
+from code_libs.mctrack import mctracker
+from test_equivalence import get_config
+
+# The FOVs of "0100" and "0400" do not overlap, and (0, 0) is in neither
+CAMERAS = ["0100", "0400"]
+
+
+def get_detections():
+    json_list = []
+    for i, cam in enumerate(CAMERAS):
+        json_ele = copy.deepcopy(synthetic.TEMPLATE)
+        json_ele["@timestamp"] = "2019-06-30T07:40:00.000Z"
+        json_ele["sensor"]["id"] = cam
+        json_ele["object"]["id"] = cam + "-7"
+        json_ele["object"]["classid"] = "car"
+        json_ele["object"]["centroid"].update({"x": 0.5 * i, "y": 0.0})
+        json_list.append(json_ele)
+    return json_list
+
+
+def get_clusters(tracker_config, linked, dont_match=None):
+    config = get_config(tracker_config, camera_fov=True)
+    config["object_ids_track_across_frames"] = True
+    if dont_match is not None:
+        config["dont_match_cameras_adj_list"] = dont_match
+    mctracker_obj = mctracker.MulticamTracker(config)
+    state = mctracker_obj.state
+    json_list = get_detections()
+    if linked:
+        id_set = set(json_ele["object"]["id"] for json_ele in json_list)
+        for obj_id in id_set:
+            state.clustered_oid_map[obj_id] = {"update_ts": None, "id_set": id_set,
+                                               "id": 0}
+    params = {
+        "cam_overlap_adj_list": state.overlapping_camera_ids,
+        "dont_match_cameras_adj_list": state.dont_match_cameras_adj_list,
+        "match_type": state.match_type,
+        "dist_thresh": mctracker_obj.config.cl_dist_thresh_m,
+        "camera_fov": state.camera_fov,
+        "camera_rules_from_fov": state.camera_rules_from_fov,
+    }
+    clusters = mctracker_obj.get_cluster(json_list, mctracker_obj.config.cl_dist_thresh_m,
+                                         params)
+    return state, list(clusters)
+
+
+@pytest.mark.parametrize("tracker_config", [
+    {"KERNEL_BACKEND": "python"},
+    {"KERNEL_BACKEND": "numpy"},
+    {"KERNEL_BACKEND": "python", "CLUSTER_ENGINE": "greedy"},
+], ids=["python", "numpy", "greedy"])
+def test_linked_by_id(tracker_config):
+    state, clusters = get_clusters(tracker_config, linked=True)
+    assert state.camera_rules_from_fov
+    assert CAMERAS[1] in state.dont_match_cameras_adj_list[CAMERAS[0]]
+    assert clusters[0] == clusters[1]
+
+    # Not linked: kept apart by the FOVs
+    _, clusters = get_clusters(tracker_config, linked=False)
+    assert clusters[0] != clusters[1]
+
+    # Configured camera rules apply to the linked detections too
+    state, clusters = get_clusters(tracker_config, linked=True,
+                                   dont_match={CAMERAS[0]: [CAMERAS[1]]})
+    assert not state.camera_rules_from_fov
+    assert clusters[0] != clusters[1]
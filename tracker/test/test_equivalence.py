@@ -0,0 +1,203 @@
+"""
+The optional code paths of the tracker (kernels, buffer pool, interned ids,
+compact state, trajectory buffer, match-by-id fast path, clustering by
+components) must give the same output as the reference per-pair python code.
+The approximate ("greedy") clustering engine must give the same clusters as
+the complete linkage where the clusters are well separated. The output
+records must be copies, without the fields used inside the tracker
+"""
+
+import copy
+import json
+import math
+import os
+
+import numpy as np
+import pytest
+
+import synthetic
+from code_libs.mctrack import constants, mctracker
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "..", "config", "config_tracker.json")
+
+# All the optional code paths off
+REFERENCE_CONFIG = {
+    "KERNEL_BACKEND": "python",
+    "USE_BUFFER_POOL": False,
+    "INTERN_OBJECT_IDS": False,
+    "COMPACT_TRACK_STATE": False,
+    "USE_TRAJECTORY_BUFFER": False,
+    "MATCH_BY_ID_FAST_PATH": False,
+}
+
+
+def get_config(tracker_config, camera_fov=False):
+    """The test config, with the trackerConfig keys overridden"""
+    with open(CONFIG_FILE) as config_file:
+        config = json.load(config_file)
+    config["trackerConfig"].update(tracker_config)
+    if camera_fov:
+        # The camera rules come from the FOVs
+        config["overlapping_camera_ids"] = {}
+        config["CAMERA_FOV"] = synthetic.get_fov_dict()
+    return config
+
+
+def run_tracker(config, windows):
+    """Track the windows. Returns the output of each batch as json"""
+    mctracker_obj = mctracker.MulticamTracker(config)
+    outputs = []
+    for all_json_list in windows:
+        mctracker_obj.process_batch(copy.deepcopy(all_json_list))
+        retval = mctracker_obj.state.retval
+        if retval:
+            outputs.append(json.dumps(retval, sort_keys=True))
+    return outputs
+
+
+def assert_same_output(outputs, reference):
+    """
+    The outputs are equal, except for the floats that may differ in the last
+    bits (the numpy kernels compute the directions with np.arctan2())
+    """
+    def assert_same(value, ref_value):
+        if isinstance(ref_value, float):
+            assert math.isclose(value, ref_value, rel_tol=1e-12, abs_tol=1e-9)
+        elif isinstance(ref_value, dict):
+            assert sorted(value) == sorted(ref_value)
+            for key in ref_value:
+                assert_same(value[key], ref_value[key])
+        elif isinstance(ref_value, list):
+            assert len(value) == len(ref_value)
+            for ele, ref_ele in zip(value, ref_value):
+                assert_same(ele, ref_ele)
+        else:
+            assert value == ref_value
+
+    assert len(outputs) == len(reference)
+    for output, ref_output in zip(outputs, reference):
+        assert_same(json.loads(output), json.loads(ref_output))
+
+
+def get_canonical(outputs):
+    """
+    Sort the records of each batch by message id, and number the tracker
+    ids by their first appearance. Two outputs with the same tracks, but
+    created in a different order, are then equal
+    """
+    tracker_ids = {}
+    canonical = []
+    for output in outputs:
+        json_list = sorted(json.loads(output),
+                           key=lambda json_ele: json_ele["messageid"])
+        for json_ele in json_list:
+            obj = json_ele["object"]
+            obj["trackerid"] = tracker_ids.setdefault(obj["trackerid"],
+                                                      len(tracker_ids))
+        canonical.append(json_list)
+    return canonical
+
+
+@pytest.fixture(scope="module", params=[(0, 40), (1, 80)],
+                ids=["seed0", "seed1"])
+def scene(request):
+    """The windows of a synthetic scene, and the reference output"""
+    seed, num_objects = request.param
+    windows = synthetic.get_windows(
+        synthetic.get_detections(num_objects=num_objects, seed=seed))
+    reference = run_tracker(get_config(REFERENCE_CONFIG), windows)
+    return windows, reference
+
+
+@pytest.mark.parametrize("tracker_config", [
+    {"KERNEL_BACKEND": "numpy"},
+    {"KERNEL_BACKEND": "auto"},
+    {"USE_BUFFER_POOL": True},
+    {"INTERN_OBJECT_IDS": True},
+    {"COMPACT_TRACK_STATE": True},
+    {"USE_TRAJECTORY_BUFFER": True},
+    {"MATCH_BY_ID_FAST_PATH": True},
+], ids=lambda tracker_config: "-".join(
+    "{}={}".format(key, value) for key, value in tracker_config.items()))
+def test_option_output(scene, tracker_config):
+    windows, reference = scene
+    this_config = dict(REFERENCE_CONFIG, **tracker_config)
+    assert_same_output(run_tracker(get_config(this_config), windows), reference)
+
+
+def test_default_output(scene):
+    windows, reference = scene
+    assert_same_output(run_tracker(get_config({}), windows), reference)
+
+
+def test_output_records(scene):
+    # The merged ids of the clusters stay in the tracker state: the
+    # tracked records are not changed, the output records are copies
+    windows, _ = scene
+    mctracker_obj = mctracker.MulticamTracker(get_config({}))
+    num_merged = 0
+    for all_json_list in windows:
+        all_json_list = copy.deepcopy(all_json_list)
+        mctracker_obj.process_batch(all_json_list)
+        num_merged += len(mctracker_obj.state.cluster_id_lists)
+        in_objects = set(id(json_ele["object"]) for json_ele in all_json_list)
+        for json_ele in all_json_list + mctracker_obj.state.retval:
+            assert "id_list" not in json_ele["object"]
+        for json_ele in mctracker_obj.state.retval:
+            assert id(json_ele["object"]) not in in_objects
+            assert isinstance(json_ele["object"]["id"], str)
+    assert num_merged > 0
+
+
+@pytest.mark.parametrize("kernel_backend", ["python", "numpy"])
+def test_fov_component_output(scene, kernel_backend, monkeypatch):
+    # Small batches: the FOV clustering is split into components. The
+    # clusters are the same, but they are found in another order
+    windows, _ = scene
+    config = get_config({"KERNEL_BACKEND": kernel_backend}, camera_fov=True)
+    reference = get_canonical(run_tracker(config, windows))
+    assert reference
+    monkeypatch.setattr(constants, "CLUSTER_COMPONENT_BATCH_SIZE", 4)
+    assert get_canonical(run_tracker(config, windows)) == reference
+
+
+def get_rule_dist_matrix(mctracker_obj, json_list, max_d, params):
+    """The clustering distance (get_cluster_pair_dist()) of every pair"""
+    num = len(json_list)
+    dist_matrix = mctracker_obj.get_distance_matrix(json_list, json_list)
+    for i in range(num):
+        for j in range(i + 1, num):
+            dist_matrix[i, j] = dist_matrix[j, i] = mctracker_obj.get_cluster_pair_dist(
+                json_list[i], json_list[j], dist_matrix[i, j], max_d, params)
+    return dist_matrix
+
+
+def test_greedy_clustering(scene):
+    # The greedy engine is order dependent, and may split or group the
+    # detections differently from the complete linkage where clusters are
+    # within max_d of each other. But every pair in a greedy cluster is
+    # within max_d, and if no pair across two exact clusters is within
+    # max_d, both engines find the same clusters
+    windows, _ = scene
+    mctracker_obj = mctracker.MulticamTracker(get_config(REFERENCE_CONFIG))
+    counts = {"separated": 0, "other": 0}
+
+    def comparing_cluster(json_list, max_d, params):
+        exact = np.asarray(mctracker_obj.get_cluster_exact(json_list, max_d, params))
+        greedy = np.asarray(mctracker_obj.get_cluster_greedy(json_list, max_d, params))
+        dist_matrix = get_rule_dist_matrix(mctracker_obj, json_list, max_d, params)
+        same_exact = exact[:, None] == exact[None, :]
+        same_greedy = greedy[:, None] == greedy[None, :]
+        assert np.all(dist_matrix[same_greedy] <= max_d)
+        if np.all(dist_matrix[np.logical_not(same_exact)] > max_d):
+            counts["separated"] += 1
+            assert np.array_equal(same_greedy, same_exact)
+        else:
+            counts["other"] += 1
+        return exact
+
+    mctracker_obj.get_cluster = comparing_cluster
+    for all_json_list in windows:
+        mctracker_obj.process_batch(copy.deepcopy(all_json_list))
+    assert counts["separated"] > 0
@@ -0,0 +1,48 @@
+"""
+The ignore regions (ioutils.load_ignore_regions()) must not import shapely
+when no polygons are configured, and must ignore the same detections as the
+per polygon contains() test when they are
+"""
+
+import sys
+
+import pytest
+
+import synthetic
+from code_libs.mctrack import ioutils
+
+REGIONS = {
+    "0000": [[[-50.0, -30.0], [-20.0, -30.0], [-20.0, 30.0], [-50.0, 30.0]]],
+    "0001": [[[0.0, 0.0], [40.0, 0.0], [40.0, 40.0]],
+             [[20.0, -40.0], [60.0, -40.0], [60.0, -10.0], [20.0, -10.0]]],
+    "0100": [],
+}
+
+
+@pytest.mark.parametrize("config", [
+    {}, {"IGNORE_DETECTION_DICT_MOVING": {}},
+    {"IGNORE_DETECTION_DICT_MOVING": {"0000": [], "0001": []}},
+])
+def test_no_regions(config, monkeypatch):
+    for name in list(sys.modules):
+        if name == "shapely" or name.startswith("shapely."):
+            monkeypatch.delitem(sys.modules, name)
+    monkeypatch.setitem(sys.modules, "shapely", None)  # import fails
+    assert ioutils.load_ignore_regions(config) is None
+    json_list = synthetic.get_detections(num_objects=5, duration_sec=2.0)
+    retval, ignored_list = ioutils.ignore_false_detections(json_list, None)
+    assert retval == json_list
+    assert retval is not json_list
+    assert ignored_list == []
+
+
+def test_same_split():
+    json_list = synthetic.get_detections(num_objects=20, duration_sec=10.0)
+    ignore_regions = ioutils.load_ignore_regions(
+        {"IGNORE_DETECTION_DICT_MOVING": REGIONS})
+    retval, ignored_list = ioutils.ignore_false_detections(json_list, ignore_regions)
+    ref_retval, ref_ignored = ioutils.ignore_false_detections(
+        json_list, ioutils.create_poly_dict(REGIONS))
+    assert ignored_list
+    assert retval == ref_retval
+    assert ignored_list == ref_ignored
@@ -0,0 +1,75 @@
+"""
+The numba kernels must give the same results as the numpy kernels
+"""
+
+import numpy as np
+import pytest
+
+numba = pytest.importorskip("numba")
+
+from code_libs.mctrack import kernels  # noqa: E402
+
+
+def get_codes(random_state, num):
+    return (random_state.randint(0, 4, num).astype(np.int64),
+            random_state.randint(0, 2, num).astype(np.int64),
+            random_state.randint(0, num // 2 + 1, num).astype(np.int64))
+
+
+def get_dist_matrix(random_state, num):
+    dist_matrix = random_state.rand(num, num) * 20
+    dist_matrix = dist_matrix + dist_matrix.T
+    np.fill_diagonal(dist_matrix, 0.0)
+    return dist_matrix
+
+
+@pytest.mark.parametrize("num", [1, 2, 15, 60])
+def test_cluster_pair_dist(num):
+    random_state = np.random.RandomState(num)
+    cam_codes, class_codes, _ = get_codes(random_state, num)
+    can_merge = random_state.rand(4, 4) > 0.3
+    can_merge = can_merge & can_merge.T
+    np.fill_diagonal(can_merge, False)
+    linked = random_state.rand(num, num) > 0.9
+    linked = linked | linked.T
+    dist_numpy = get_dist_matrix(random_state, num)
+    dist_numba = dist_numpy.copy()
+    kernels.cluster_pair_dist_numpy(dist_numpy, cam_codes, class_codes,
+                                    can_merge, linked, 1000.0)
+    kernels.cluster_pair_dist_numba(dist_numba, cam_codes, class_codes,
+                                    can_merge, linked, 1000.0)
+    assert np.array_equal(dist_numpy, dist_numba)
+
+
+@pytest.mark.parametrize("merge_same_ts", [False, True])
+@pytest.mark.parametrize("num", [1, 2, 15, 60])
+def test_same_cam_pair_dist(num, merge_same_ts):
+    random_state = np.random.RandomState(num)
+    ts_codes, class_codes, obj_codes = get_codes(random_state, num)
+    dist_numpy = get_dist_matrix(random_state, num)
+    dist_numba = dist_numpy.copy()
+    kernels.same_cam_pair_dist_numpy(dist_numpy, obj_codes, ts_codes,
+                                     class_codes, merge_same_ts, 1000.0)
+    kernels.same_cam_pair_dist_numba(dist_numba, obj_codes, ts_codes,
+                                     class_codes, merge_same_ts, 1000.0)
+    assert np.array_equal(dist_numpy, dist_numba)
+
+
+@pytest.mark.parametrize("num", [0, 1, 50])
+def test_directions(num):
+    random_state = np.random.RandomState(num)
+    first_xy = random_state.rand(num, 2) * 10
+    last_xy = first_xy + (random_state.rand(num, 2) - 0.5) * 4
+    last_xy[::7] = first_xy[::7]  #not moved
+    dir_numpy = kernels.directions_numpy(first_xy, last_xy, 0.5)
+    dir_numba = kernels.directions_numba(first_xy, last_xy, 0.5)
+    assert np.array_equal(np.isnan(dir_numpy), np.isnan(dir_numba))
+    assert np.allclose(dir_numpy, dir_numba, rtol=1e-12, atol=0, equal_nan=True)
+    moved = np.logical_not(np.isnan(dir_numpy))
+    assert np.all((dir_numpy[moved] >= 0.0) & (dir_numpy[moved] < 360.0))
+
+
+def test_get_kernels():
+    assert kernels.get_kernels("auto").name == "numba"
+    assert kernels.get_kernels("numpy").name == "numpy"
+    assert kernels.get_kernels("python") is None
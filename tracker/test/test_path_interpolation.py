@@ -0,0 +1,74 @@
+"""
+The timestamps of the interpolated network paths
+(networkhelper.Network.get_interpolated_paths()): the first timestamp plus
+the total time times the share of the path length travelled. The first
+point is at the first timestamp, the end point at the last one
+"""
+
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from code_libs.network import networkhelper
+
+MAP_INFO = [[[0.0, 0.0], [10.0, 0.0]], [[10.0, 0.0], [10.0, 7.0]],
+            [[10.0, 7.0], [3.0, 7.0]]]
+START = pd.Timestamp("2019-06-30T07:40:39.951")
+
+
+@pytest.fixture(scope="module")
+def network():
+    _, network = networkhelper.load_road_network(MAP_INFO)
+    return network
+
+
+def get_end_points(network):
+    return (network.get_nearest_point_id([0.0, 0.0]),
+            network.get_nearest_point_id([3.0, 7.0]))
+
+
+@pytest.mark.parametrize("start_ts", [START, START.to_datetime64(), START.to_pydatetime()],
+                         ids=["Timestamp", "datetime64", "datetime"])
+def test_timestamps(network, start_ts):
+    st_pt, end_pt = get_end_points(network)
+    total_time_sec = 7.3
+    end_ts = start_ts + datetime.timedelta(seconds=total_time_sec)
+    path = network.get_interpolated_path(st_pt, end_pt, [start_ts, end_ts], 0.5)
+
+    ts_list = [ele[0] for ele in path]
+    assert all(isinstance(ts, pd.Timestamp) for ts in ts_list)
+    assert ts_list[0] == START
+    assert abs((ts_list[-1] - pd.Timestamp(end_ts)) / np.timedelta64(1, 'us')) < 1
+    assert path[-1][1:3] == [3.0, 7.0]
+
+    # Proportional to the distance travelled, not accumulated per hop
+    cum_lth = np.cumsum([ele[3] for ele in path])
+    elapsed = np.array([(ts - START) / np.timedelta64(1, 's') for ts in ts_list])
+    assert np.allclose(elapsed, cum_lth / cum_lth[-1] * total_time_sec, atol=1e-6)
+    assert np.all(np.diff(elapsed) > 0)
+    assert np.all(np.diff(elapsed) <= 0.5 + 1e-6)
+    # The nodes are on the path
+    xy_list = [ele[1:3] for ele in path]
+    for node_xy in [[10.0, 0.0], [10.0, 7.0]]:
+        assert node_xy in xy_list
+
+
+def test_zero_time(network):
+    st_pt, end_pt = get_end_points(network)
+    path = network.get_interpolated_path(st_pt, end_pt, [START, START], 0.5)
+    assert [ele[0] for ele in path] == [START] * len(path)
+    assert [ele[1:3] for ele in path] == network.get_path_xy(
+        network.get_shortest_path_bw_id(st_pt, end_pt)).tolist()
+
+
+def test_batch(network):
+    st_pt, end_pt = get_end_points(network)
+    requests = [(st_pt, end_pt, [START, START + pd.Timedelta(4.0, unit='s')]),
+                (end_pt, st_pt, [START, START + pd.Timedelta(9.5, unit='s')]),
+                (st_pt, st_pt, [START, START + pd.Timedelta(1.0, unit='s')])]
+    paths = network.get_interpolated_paths(requests, 0.5)
+    for (this_st, this_end, ts_arr), path in zip(requests, paths):
+        assert path == network.get_interpolated_path(this_st, this_end, ts_arr, 0.5)
+    assert paths[2] == [[START, 0.0, 0.0, 0.0]]
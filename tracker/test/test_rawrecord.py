@@ -0,0 +1,95 @@
+"""
+Records decoded as rawrecord.RawRecord must give the same tracker output as
+records decoded with json, and must re-use the original text of the fields
+that the tracker did not change
+"""
+
+import copy
+import json
+
+import pytest
+
+import synthetic
+from code_libs.mctrack import mctracker, rawrecord
+from test_equivalence import get_config
+
+
+def get_raw_windows(json_list, indent=None):
+    return [[json.dumps(json_ele, indent=indent).encode("utf-8")
+             for json_ele in all_json_list]
+            for all_json_list in synthetic.get_windows(json_list)]
+
+
+def run_tracker(raw_windows, decode_fn, encode_fn):
+    """Track the encoded windows. Returns the decoded output records"""
+    mctracker_obj = mctracker.MulticamTracker(get_config({}))
+    outputs = []
+    for raw_list in raw_windows:
+        mctracker_obj.process_batch([decode_fn(rec) for rec in raw_list])
+        outputs.extend(json.loads(encode_fn(json_ele).decode("utf-8"))
+                       for json_ele in mctracker_obj.state.retval)
+        mctracker_obj.state.retval = []
+    return outputs
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_same_output(indent):
+    json_list = synthetic.get_detections(num_objects=20, duration_sec=10.0)
+    raw_windows = get_raw_windows(json_list, indent=indent)
+    reference = run_tracker(raw_windows, json.loads,
+                            lambda rec: json.dumps(rec).encode("utf-8"))
+    outputs = run_tracker(raw_windows, rawrecord.RawRecord.from_json_str,
+                          rawrecord.encode_record)
+    assert reference
+    assert outputs == reference
+
+
+def test_splice():
+    json_ele = copy.deepcopy(synthetic.TEMPLATE)
+    json_ele["object"]["signature"] = [0.1 * i for i in range(10)]
+    text = json.dumps(json_ele, indent=1)
+    record = rawrecord.RawRecord.from_json_str(text)
+    assert record == json_ele
+    assert record.to_json_str() == text
+
+    # Changed (also in place), added and unchanged fields, in a copy
+    out = copy.copy(record)
+    out["object"] = dict(record["object"])
+    out["object"]["id"] = "0000-12"
+    out["object"]["trackerid"] = "tracker 7"
+    out["object"]["centroid"]["x"] = 3.5
+    out["place"]["subplace"]["level"] = "P1"
+    out["videoPath"] = "video.mp4"
+    expected = copy.deepcopy(json_ele)
+    expected["object"].update({"id": "0000-12", "trackerid": "tracker 7"})
+    expected["object"]["centroid"]["x"] = 3.5
+    expected["place"]["subplace"]["level"] = "P1"
+    expected["videoPath"] = "video.mp4"
+    out_text = out.to_json_str()
+    assert json.loads(out_text) == expected
+    # The unchanged fields keep their original text
+    for key in ["sensor", "analyticsModule", "event"]:
+        assert json.dumps(json_ele[key], indent=1).replace("\n", "\n ") in out_text
+    assert json.dumps(json_ele["object"]["signature"], indent=1).replace(
+        "\n", "\n  ") in out_text
+
+    # Removed fields: re-encoded
+    del out["object"]["bbox"]
+    del out["event"]
+    del expected["object"]["bbox"]
+    del expected["event"]
+    assert json.loads(out.to_json_str()) == expected
+
+
+@pytest.mark.parametrize("text", ['{}', '{"a\\"b": {"c": 1}}', ' {"object": {}} ',
+                                  '{"place": {"x\\u0041": [1, 2]}, "c": null}'])
+def test_not_split(text):
+    record = rawrecord.RawRecord.from_json_str(text)
+    assert record == json.loads(text)
+    assert json.loads(rawrecord.encode_record(record).decode("utf-8")) == record
+
+
+@pytest.mark.parametrize("text", ['', '[1, 2]', '{"a": 1', '{"a": 1} x', b'{"a": "\xff"}'])
+def test_invalid(text):
+    with pytest.raises(ValueError):
+        rawrecord.RawRecord.from_json_str(text)
@@ -0,0 +1,46 @@
+"""
+The on-disk road network cache (networkhelper.load_road_network()) must be
+keyed by the content of the map, whatever its container types, and must
+remove the caches of older cache versions
+"""
+
+import os
+
+import numpy as np
+
+from code_libs.network import networkhelper
+
+MAP_INFO = [[[0.0, 0.0], [10.0, 0.0]], [[10.0, 0.0], [10.0, 10.0]],
+            [[10.0, 10.0], [0.0, 10.0]]]
+
+
+def test_key_of_containers():
+    key = networkhelper.get_road_network_key(MAP_INFO, 0.1)
+    map_array = np.array(MAP_INFO)
+    for map_info in [map_array, tuple(map_array), [tuple(line) for line in map_array],
+                     [[[int(x), int(y)] for x, y in line] for line in MAP_INFO]]:
+        assert networkhelper.get_road_network_key(map_info, 0.1) == key
+    assert networkhelper.get_road_network_key(MAP_INFO, 0.2) != key
+    assert networkhelper.get_road_network_key(MAP_INFO[:2], 0.1) != key
+    # Lines with different numbers of points
+    ragged = [np.array(MAP_INFO[0]), np.array(MAP_INFO[1] + [[20.0, 10.0]])]
+    assert (networkhelper.get_road_network_key(ragged, 0.1) ==
+            networkhelper.get_road_network_key([line.tolist() for line in ragged], 0.1))
+
+
+def test_old_caches_removed(tmpdir):
+    cache_dir = str(tmpdir)
+    old_cache = os.path.join(cache_dir, networkhelper.CACHE_DIR_PREFIX + "0123abcd")
+    os.mkdir(old_cache)
+    other_map = MAP_INFO[:2]
+    networkhelper.load_road_network(other_map, cache_dir=cache_dir)
+    assert not os.path.exists(old_cache)
+
+    dense_lines, network = networkhelper.load_road_network(MAP_INFO, cache_dir=cache_dir)
+    assert sorted(os.listdir(cache_dir)) == sorted(
+        networkhelper.get_cache_dir_name(map_info, 0.1) for map_info in [MAP_INFO, other_map])
+    cached_lines, cached_network = networkhelper.load_road_network(
+        np.array(MAP_INFO), cache_dir=cache_dir)
+    assert np.array_equal(cached_lines, dense_lines)
+    assert np.array_equal(cached_network.get_arrays()["edges"],
+                          network.get_arrays()["edges"])
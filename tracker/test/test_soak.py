@@ -0,0 +1,127 @@
+"""
+Soak tests: a long run with object id churn (new ids in every scene) must keep
+the tracker state and the memory flat (see MulticamTracker.get_state_gauges()
+and the MAX_* caps)
+"""
+
+import datetime
+import gc
+import json
+import logging
+import os
+import tracemalloc
+
+import numpy as np
+
+import synthetic
+from code_libs.mctrack import mctracker
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "..", "config", "config_tracker.json")
+
+# State test: 2 simulated hours (120 scenes of 60 sec), gauges sampled after
+# every other scene
+SIM_HOURS = 2.0
+SCENE_SEC = 60.0
+NUM_OBJECTS = 6
+SAMPLE_EVERY = 2
+WARM_UP = 0.25         # fraction of the samples before the growth is measured
+MAX_RUN_GROWTH = 0.05  # max growth over the run (least squares line) of the capped state
+STATE_CAPS = {"matchStats": 30, "clusteredOidMap": 10, "carryOverList": 5}
+
+# Memory test (traced, much slower): 5 simulated minutes
+MEM_NUM_SCENES = 30
+MEM_SCENE_SEC = 10.0
+MEM_SAMPLE_EVERY = 3
+MAX_GROWTH = 1.1       # max growth from the first to the second half of the run
+MEM_CAPS = {"matchStats": 30, "clusteredOidMap": 300, "carryOverList": 40}
+
+
+def get_tracker(caps):
+    with open(CONFIG_FILE) as config_file:
+        config = json.load(config_file)
+    config["trackerConfig"].update({"MAX_MATCH_STATS": caps["matchStats"],
+                                    "MAX_CLUSTERED_OIDS": caps["clusteredOidMap"],
+                                    "MAX_CARRY_OVER_TRACKS": caps["carryOverList"]})
+    # Keep the clustered object ids across timesteps (clustered_oid_map)
+    config["object_ids_track_across_frames"] = True
+    return mctracker.MulticamTracker(config)
+
+
+def run_scenes(mctracker_obj, num_scenes, scene_sec, num_objects, sample_every,
+               sample_fn):
+    """Track scenes of new objects. sample_fn() is called every sample_every scenes"""
+    for scene in range(num_scenes):
+        start_time = synthetic.START_TIME + datetime.timedelta(
+            seconds=scene * scene_sec)
+        json_list = synthetic.get_detections(
+            num_objects=num_objects, duration_sec=scene_sec, seed=scene,
+            id_prefix="{}-".format(scene), start_time=start_time)
+        for all_json_list in synthetic.get_windows(json_list):
+            mctracker_obj.process_batch(all_json_list)
+            mctracker_obj.state.retval = []
+        del json_list, all_json_list
+        if scene % sample_every == sample_every - 1:
+            sample_fn((scene + 1) * scene_sec / 3600.0)
+
+
+def test_state_is_flat(caplog):
+    # The eviction warnings would be kept by the log capture
+    caplog.set_level(logging.ERROR)
+    mctracker_obj = get_tracker(STATE_CAPS)
+    hours = []
+    capped_bytes = []
+
+    def sample(hour):
+        gauges = mctracker_obj.get_state_gauges()
+        for name, cap in STATE_CAPS.items():
+            assert gauges[name]["count"] <= cap
+        hours.append(hour)
+        # The state kept across scenes. The other structures hold the
+        # objects of the current scene (or the largest scene so far)
+        capped_bytes.append(sum(gauges[name]["bytes"] for name in
+                                ("matchStats", "clusteredOidMap", "idRegistry")))
+
+    run_scenes(mctracker_obj, int(SIM_HOURS * 3600 / SCENE_SEC), SCENE_SEC,
+               NUM_OBJECTS, SAMPLE_EVERY, sample)
+    assert mctracker_obj.state.num_evicted["clusteredOidMap"] > 0
+    assert mctracker_obj.state.num_evicted["carryOverList"] > 0
+
+    # Growth over the run, from the slope of the samples after the warm up
+    first = int(len(hours) * WARM_UP)
+    hours = np.array(hours[first:])
+    capped_bytes = np.array(capped_bytes[first:], dtype=np.float64)
+    slope = np.polyfit(hours, capped_bytes, 1)[0]
+    run_growth = slope * (hours[-1] - hours[0]) / capped_bytes.mean()
+    assert run_growth <= MAX_RUN_GROWTH
+
+
+def test_memory_is_flat(caplog):
+    caplog.set_level(logging.ERROR)
+    mctracker_obj = get_tracker(MEM_CAPS)
+    state_bytes = []
+    traced_bytes = []
+
+    def sample(_):
+        gauges = mctracker_obj.get_state_gauges()
+        for name, cap in MEM_CAPS.items():
+            assert gauges[name]["count"] <= cap
+        state_bytes.append(sum(gauge.get("bytes", 0)
+                               for gauge in gauges.values()))
+        del gauges
+        gc.collect()
+        traced_bytes.append(tracemalloc.get_traced_memory()[0])
+
+    tracemalloc.start()
+    try:
+        run_scenes(mctracker_obj, MEM_NUM_SCENES, MEM_SCENE_SEC, 15,
+                   MEM_SAMPLE_EVERY, sample)
+    finally:
+        tracemalloc.stop()
+    assert mctracker_obj.state.num_evicted["carryOverList"] > 0
+
+    # The largest sample of the second half is not much larger than the
+    # largest sample of the first half (which includes the warm up)
+    half = len(state_bytes) // 2
+    for values in [state_bytes, traced_bytes]:
+        assert max(values[half:]) <= MAX_GROWTH * max(values[:half])
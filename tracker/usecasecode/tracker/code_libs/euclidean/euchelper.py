@@ -2,11 +2,13 @@
 Eucledian helper classes
 """
 import math
-from shapely.geometry import LineString
 import numpy
 
 __version__ = '0.2'
 
+# Max distance between the points of a densified line (see densify_graph())
+DENSIFY_DIST = 3
+
 
 def interpolate_line(the_pt1, the_pt2, proportion):
     """Interplolate a line between two points the_pt1 and the_pt2
@@ -21,6 +23,7 @@ def interpolate_line(the_pt1, the_pt2, proportion):
     Returns:
         list -- the interpolated point (x,y)
     """
+    from shapely.geometry import LineString
     line = LineString([the_pt1, the_pt2])
     projected_pt = line.interpolate(proportion, normalized=True)
     the_pt = list(projected_pt.coords)[0]
@@ -47,113 +50,92 @@ def get_angle(var_x1, var_y1, var_x2, var_y2):
     # return math.degrees(math.atan2(1,1))
 
 
-def densify_line(line, hypotenuse):
+def get_dense_points(lines, hypotenuse=DENSIFY_DIST):
     """
-    Densify a line ("line")
+    Densify lines: points are added along each line (from its end point
+    with the smaller x) every "hypotenuse" units. All the lines are
+    densified together, from their lengths and point counts
 
     Arguments:
-        line {[type]} -- [description]
-        hypotenuse {[type]} -- [description]
+        lines {list} -- list of lines [[x1,y1],[x2,y2]] (or (n,2,2) array)
+
+    Keyword Arguments:
+        hypotenuse {float} -- Distance between the points
+            (default: {DENSIFY_DIST})
 
     Returns:
-        [type] -- [description]
+        tuple -- (points, counts): (p,2) array of the points of all the
+        lines, from the first to the second end point of each line, and the
+        number of points of each line
     """
-    x1_temp = line[0][0]
-    y1_temp = line[0][1]
-
-    x2_temp = line[1][0]
-    y2_temp = line[1][1]
-
-    # Flag to keep track if reorder was needed
-    flipped = False
-
-    # Reorder so that x1 is smaller than x2
-    if x2_temp > x1_temp:
-        var_x1 = x1_temp
-        var_y1 = y1_temp
-        var_x2 = x2_temp
-        var_y2 = y2_temp
+    if isinstance(lines, numpy.ndarray):
+        lines = lines[:, :2]
     else:
-        flipped = True
-        var_x1 = x2_temp
-        var_y1 = y2_temp
-        var_x2 = x1_temp
-        var_y2 = y1_temp
-
-    # Get total distance to evaluate number of needed points
-    dist_euc = math.sqrt(pow((var_x2-var_x1), 2) + pow((var_y2-var_y1), 2))
-
-    # Get the angle of the line
-    angle_radians = get_angle(var_x1, var_y1, var_x2, var_y2)
-    # print(angle_radians)
-
-    # Calculate number of needed internal points, allowing any remainder
-    internal_points = int(int(dist_euc)/hypotenuse)
-
-    # Calculate the needed x values
-    x_out = [var_x1]
-    for a_pt in range(internal_points):
-        adj = hypotenuse*math.cos(angle_radians)
-        next_x = x_out[a_pt] + adj
-        x_out.append(next_x)
-
-    xp_pt = [var_x1, var_x2]
-    fp_pt = [var_y1, var_y2]
-
-    y_out = numpy.interp(x_out, xp_pt, fp_pt)
+        lines = [[line[0], line[1]] for line in lines]
+    lines = numpy.asarray(lines, dtype=numpy.float64).reshape(-1, 2, 2)
+
+    # The points are placed from the end point with the smaller x
+    flipped = numpy.logical_not(lines[:, 1, 0] > lines[:, 0, 0])
+    start = numpy.where(flipped[:, None], lines[:, 1], lines[:, 0])
+    end = numpy.where(flipped[:, None], lines[:, 0], lines[:, 1])
+    delta = end - start
+    dist = numpy.hypot(delta[:, 0], delta[:, 1])
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        unit = numpy.where(dist[:, None] > 0, delta / dist[:, None], 0.0)
+
+    # Internal points (allowing any remainder, but not on the end point)
+    num_internal = (numpy.floor(dist) // hypotenuse).astype(numpy.int64)
+    num_internal[num_internal * hypotenuse >= dist] -= 1
+    counts = numpy.maximum(num_internal, 0) + 2
+
+    line_index = numpy.repeat(numpy.arange(len(lines)), counts)
+    step = numpy.arange(len(line_index)) - numpy.repeat(numpy.cumsum(counts) - counts,
+                                                        counts)
+    step = numpy.where(flipped[line_index], counts[line_index] - 1 - step, step)
+    points = start[line_index] + (step * hypotenuse)[:, None] * unit[line_index]
+    at_end = step == counts[line_index] - 1
+    points[at_end] = end[line_index[at_end]]
+    return points, counts
+
+
+def densify_line(line, hypotenuse=DENSIFY_DIST):
+    """
+    Densify a line ("line")
 
-    dense_line = [[var_x1, var_y1]]
-    for a_pt in range(0, len(x_out)):
-        dense_line.append([x_out[a_pt], y_out[a_pt]])
-    dense_line.append([var_x2, var_y2])
+    Arguments:
+        line {list} -- [[x1,y1],[x2,y2]]
 
-    if flipped:
-        dense_line.reverse()
+    Keyword Arguments:
+        hypotenuse {float} -- Distance between the points
+            (default: {DENSIFY_DIST})
 
-    return dense_line
+    Returns:
+        list -- The points [x,y] of the dense line
+    """
+    points, _ = get_dense_points([line], hypotenuse)
+    return points.tolist()
 
 
-def densify_graph(currentgraph):
+def densify_graph(currentgraph, hypotenuse=DENSIFY_DIST):
     """
     Densify the entire graph given by lines "currentgraph"
 
     Arguments:
         currentgraph {list} -- list of lines that make the current graph
 
+    Keyword Arguments:
+        hypotenuse {float} -- Distance between the points
+            (default: {DENSIFY_DIST})
+
     Returns:
-        list -- graph with dense lines
+        numpy.ndarray -- (n,2,2) array of the segments [[x1,y1],[x2,y2]] of
+        the dense lines (used to build the road network)
     """
-    dense_graph = []
-    for line in currentgraph:
-        retval = densify_line(line, 3)
-        dense_graph.append(retval)
-
-    # To retun linestrings:
-    # return dense_graph
-
-    # This logic returns a list of lines (as opposed to LineString)
-    dense_lines = []
-    xcoords = []
-    ycoords = []
-    counter = 0  # track the nunber of processed points
-    #print_me = False
-    for line in dense_graph:
-        # if print_me:
-            # print(line)
-            #print_me = False
-        for index in range(0, len(line)-1):
-            dense_lines.append([line[index], line[index+1]])
-            #print([[xcoords[a-2], ycoords[a-2]], [xcoords[a-1], ycoords[a-1]]])
-        for pair_list in line:
-            xcoords.append(pair_list[0])
-            ycoords.append(pair_list[1])
-            counter = counter + 1
-
-    # To plot dense graph:
-    # matplt.scatter(xcoords, ycoords)
-    # matplt.show()
-
-    return dense_lines
+    points, counts = get_dense_points(currentgraph, hypotenuse)
+    has_next = numpy.ones(len(points), dtype=bool)
+    has_next[numpy.cumsum(counts) - 1] = False
+    from_index = numpy.flatnonzero(has_next)
+    return numpy.stack([points[from_index], points[from_index + 1]], axis=1)
 
 
 """
@@ -7,7 +7,8 @@ __version__ = '0.2'
 import math
 import numpy as np
 
-import pysal.lib.cg.sphere as sphere
+# pysal (pysal.lib.cg.sphere) is imported by the functions that use it,
+# since it loads a large part of scipy and pandas
 
 
 def geointerpolate(point0, point1, proportion):
@@ -21,6 +22,7 @@ def geointerpolate(point0, point1, proportion):
     Returns:
         list -- the list of interpolated points (lng,lat)
     """
+    import pysal.lib.cg.sphere as sphere
     return sphere.geointerpolate(point0, point1, proportion)
 
 
@@ -35,9 +37,32 @@ def geo_distance_in_km(pt1, pt2):
     Returns:
         float -- Ditance between pt1 and pt2
     """
+    import pysal.lib.cg.sphere as sphere
     return sphere.harcdist(pt1, pt2)
 
 
+def geo_distances_in_km(pts1, pts2):
+    """
+    Array version of geo_distance_in_km() (haversine formula, with the
+    earth radius of pysal)
+
+    Arguments:
+        pts1 {np.array} -- (n,2) (lng,lat) of the first points
+        pts2 {np.array} -- (n,2) (lng,lat) of the second points (or one
+            (lng,lat) point for all)
+
+    Returns:
+        np.array -- (n,) distances in km
+    """
+    import pysal.lib.cg.sphere as sphere
+    pts1 = np.radians(np.asarray(pts1, dtype=np.float64).reshape(-1, 2))
+    pts2 = np.radians(np.asarray(pts2, dtype=np.float64).reshape(-1, 2))
+    hav = (np.sin((pts2[:, 1] - pts1[:, 1]) / 2.0) ** 2 +
+           np.cos(pts1[:, 1]) * np.cos(pts2[:, 1]) *
+           np.sin((pts2[:, 0] - pts1[:, 0]) / 2.0) ** 2)
+    return 2.0 * np.arcsin(np.sqrt(np.minimum(hav, 1.0))) * sphere.RADIUS_EARTH_KM
+
+
 def get_nearest_point(kdtree, the_pt, dist_thresh_in_km=0.005):
     """
     Get the nearest point to "the_pt" using the the kd=tree index
@@ -104,6 +129,29 @@ def get_lng_lat_coord(origin_lnglat, xy_pt):
     return ret_pt
 
 
+def get_lng_lat_coords(origin_lnglat, xy_arr):
+    """
+    Array version of get_lng_lat_coord(): the (lng, lat) of many (x,y)
+    points (in km from the origin)
+
+    Arguments:
+        origin_lnglat {list} -- The (longitude,latitude) of the origin point
+        xy_arr {np.array} -- (n,2) (x,y) points
+
+    Returns:
+        np.array -- (n,2) (longitude, latitude) of the points
+    """
+    origin_lng, origin_lat = float(origin_lnglat[0]), float(origin_lnglat[1])
+    xy_arr = np.asarray(xy_arr, dtype=np.float64).reshape(-1, 2)
+    ret_arr = np.empty_like(xy_arr)
+    ret_arr[:, 1] = origin_lat - (xy_arr[:, 1] * 360.0 / 40000.0)
+    # cos of the mean latitude of the origin and the point
+    ret_arr[:, 0] = origin_lng - (
+        xy_arr[:, 0] * 360.0 /
+        (40000.0 * np.cos((origin_lat + ret_arr[:, 1]) * math.pi / 360.0)))
+    return ret_arr
+
+
 def get_flat_earth_coord(origin, the_pt):
     """
     Get the flat earth coordinates (x,y) from a given (lng,lat) point "pt".
@@ -123,6 +171,27 @@ def get_flat_earth_coord(origin, the_pt):
     return vardx, vardy
 
 
+def get_flat_earth_coords(origin, lnglat_arr):
+    """
+    Array version of get_flat_earth_coord(): the flat earth (x,y) of many
+    (lng,lat) points
+
+    Arguments:
+        origin {list} -- (lng,lat) of the origin point
+        lnglat_arr {np.array} -- (n,2) (lng,lat) points
+
+    Returns:
+        np.array -- (n,2) (x,y) of the points
+    """
+    origin_lng, origin_lat = float(origin[0]), float(origin[1])
+    lnglat_arr = np.asarray(lnglat_arr, dtype=np.float64).reshape(-1, 2)
+    ret_arr = np.empty_like(lnglat_arr)
+    ret_arr[:, 0] = ((origin_lng - lnglat_arr[:, 0]) * 40000.0 *
+                     np.cos((origin_lat + lnglat_arr[:, 1]) * math.pi / 360) / 360)
+    ret_arr[:, 1] = (origin_lat - lnglat_arr[:, 1]) * 40000.0 / 360
+    return ret_arr
+
+
 def get_euc_dist(pt1, pt2):
     """
     Get eucledian distance between two points pt1 and pt2
@@ -140,6 +209,23 @@ def get_euc_dist(pt1, pt2):
     return math.hypot(pt2[0] - pt1[0], pt2[1] - pt1[1])
 
 
+def get_euc_dists(pts1, pts2):
+    """
+    Array version of get_euc_dist()
+
+    Arguments:
+        pts1 {np.array} -- (n,2) flat earth (x,y) of the first points
+        pts2 {np.array} -- (n,2) flat earth (x,y) of the second points (or
+            one (x,y) point for all)
+
+    Returns:
+        np.array -- (n,) distances
+    """
+    pts1 = np.asarray(pts1, dtype=np.float64).reshape(-1, 2)
+    pts2 = np.asarray(pts2, dtype=np.float64).reshape(-1, 2)
+    return np.hypot(pts2[:, 0] - pts1[:, 0], pts2[:, 1] - pts1[:, 1])
+
+
 def get_radangle_flat_earth_old(pt1, pt2):
     """Get the angle for two given points (in flat earth coords)
 
@@ -188,6 +274,24 @@ def get_radangle_flat_earth(the_pt1, the_pt2):
     return angle_trunc(math.atan2(delta_y, delta_x))
 
 
+def get_radangles_flat_earth(pts1, pts2):
+    """
+    Array version of get_radangle_flat_earth()
+
+    Arguments:
+        pts1 {np.array} -- (n,2) (x,y) of the first points
+        pts2 {np.array} -- (n,2) (x,y) of the second points
+
+    Returns:
+        np.array -- (n,) angles (in radians) in [0, 2*pi)
+    """
+    pts1 = np.asarray(pts1, dtype=np.float64).reshape(-1, 2)
+    pts2 = np.asarray(pts2, dtype=np.float64).reshape(-1, 2)
+    angles = np.arctan2(pts2[:, 1] - pts1[:, 1], pts2[:, 0] - pts1[:, 0])
+    angles[angles < 0.0] += math.pi * 2
+    return angles
+
+
 def get_all_rects(rect, the_pt):
     """
     Get all rectangles for the point the_pt
@@ -214,6 +318,7 @@ def get_angle_between_pts_on_sphere(the_pt1, the_pt2):
     Returns:
         float -- angle in radians between first and second point
     """
+    import pysal.lib.cg.sphere as sphere
     return sphere.radangle(the_pt1, the_pt2)
 
 
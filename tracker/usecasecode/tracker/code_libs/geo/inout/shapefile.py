@@ -4,17 +4,41 @@ This module is handles all shapefile operatoons
 
 __version__ = '0.2'
 
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
 import shapefile
 
 SORT_COORDS = False
 
+# Shape types read by the geometry cache (see GeometryCache)
+SHAPE_TYPES = {
+    "polygon": (shapefile.POLYGON, shapefile.POLYGONZ, shapefile.POLYGONM),
+    "polyline": (shapefile.POLYLINE, shapefile.POLYLINEZ, shapefile.POLYLINEM),
+}
+
+# Version of the on-disk geometry cache (see load_geometry_cache()).
+# Change it when the way the geometries are read changes
+GEOMETRY_CACHE_VERSION = 1
+GEOMETRY_CACHE_DIR_PREFIX = "geometry_"
+GEOMETRY_CACHE_ARRAYS = ("coords", "offsets", "record_index")
+
 
-def get_polygons_from_shape_file(sh_file):
+def get_polygons_from_shape_file(sh_file, rectangles_only=True):
     """Get all polygons from a given shape file
 
     Arguments:
         sh_file {[string]} -- The shapefile
 
+    Keyword Arguments:
+        rectangles_only {bool} -- Skip the polygons that are not rectangles
+            (default: {True})
+
     Returns:
         [list] -- list of polygons
     """
@@ -41,7 +65,7 @@ def get_polygons_from_shape_file(sh_file):
                   "shape.".format(shape_rec.shape.shapeType))
             continue
 
-        if len(shape_rec.shape.points) != 5:
+        if rectangles_only and len(shape_rec.shape.points) != 5:
             print("Currently we support rectangles (polygons with 5 points "
                   "incl. end point repeated). Num points found: {}. Skipping "
                   "polygon. Features of polygon: {}"
@@ -108,3 +132,345 @@ def get_polylines_from_shape_file(sh_file):
         index += 1
 
     return feature_list
+
+
+def get_field_names(shpfile):
+    """
+    Get the names of the record fields of a shapefile
+
+    Arguments:
+        shpfile {shapefile.Reader} -- The shapefile reader
+
+    Returns:
+        [list] -- The field names (the deletion flag field is skipped)
+    """
+    field_names = []
+    for index, fld in enumerate(shpfile.fields[1:]):
+        if fld:
+            field_names.append(fld[0])
+        else:
+            field_names.append("field_{}".format(index))
+    return field_names
+
+
+def simplify_points(points, tolerance, closed):
+    """
+    Simplify a line or a polygon ring (Douglas-Peucker), so that no point
+    moves by more than tolerance
+
+    Arguments:
+        points {np.array} -- (n,2) array of points
+        tolerance {float} -- The max distance of a removed point from the
+            simplified line
+        closed {bool} -- True if the points are a polygon ring (first point
+            not repeated at the end). The simplified ring stays valid
+
+    Returns:
+        [np.array] -- (m,2) array of points, m <= n
+    """
+    from shapely.geometry import LineString, Polygon
+    if closed:
+        if len(points) < 4:
+            return points
+        ring = Polygon(points).simplify(tolerance, preserve_topology=True)
+        if ring.is_empty:
+            return points
+        return np.asarray(ring.exterior.coords, dtype=np.float64)[:-1]
+    if len(points) < 3:
+        return points
+    line = LineString(points).simplify(tolerance, preserve_topology=False)
+    return np.asarray(line.coords, dtype=np.float64)
+
+
+def iter_shape_parts(sh_file, kind, tolerance=0.0):
+    """
+    Read the polygons or polylines of a shapefile one shape at a time
+
+    Arguments:
+        sh_file {string} -- The shapefile
+        kind {string} -- "polygon" or "polyline"
+
+    Keyword Arguments:
+        tolerance {float} -- Simplify the parts with this tolerance
+            (default: {0.0}, no simplification)
+
+    Yields:
+        [tuple] -- (record number, record dict, list of (n,2) point arrays,
+        one per part). The end point of a polygon ring, which repeats its
+        first point, is omitted
+    """
+    shape_types = SHAPE_TYPES[kind]
+    closed = kind == "polygon"
+    with shapefile.Reader(sh_file) as shpfile:
+        field_names = get_field_names(shpfile)
+        for rec_num, shape_rec in enumerate(shpfile.iterShapeRecords()):
+            shape = shape_rec.shape
+            if shape.shapeType not in shape_types:
+                logging.error("ERROR: %s: shape %d is not a %s (shapeType=%d). "
+                              "Skipping it", sh_file, rec_num, kind,
+                              shape.shapeType)
+                continue
+            points = np.asarray(shape.points, dtype=np.float64).reshape(-1, 2)
+            bounds = list(shape.parts) + [len(points)]
+            parts = []
+            for start, end in zip(bounds[:-1], bounds[1:]):
+                part = points[start:end]
+                if closed and len(part) > 1 and np.array_equal(part[0], part[-1]):
+                    part = part[:-1]
+                if tolerance:
+                    part = simplify_points(part, tolerance, closed)
+                parts.append(part)
+            record = {field_names[i]: value
+                      for i, value in enumerate(shape_rec.record)}
+            yield rec_num, record, parts
+
+
+class GeometryCache:
+    """
+    The parts (polygon rings or polylines) of a shapefile in flat arrays:
+    the points of all parts in one (n,2) coords array, and offsets such that
+    part i is coords[offsets[i]:offsets[i+1]]. record_index gives the record
+    of each part, and records the fields of each record.
+
+    The arrays can be saved as .npy files and memory-mapped when they are
+    loaded (see load_geometry_cache()), so the shapefile is only parsed once
+    """
+
+    def __init__(self, coords, offsets, record_index, records):
+        self.coords = coords
+        self.offsets = offsets
+        self.record_index = record_index
+        self.records = records
+
+    @classmethod
+    def from_shape_file(cls, sh_file, kind, tolerance=0.0):
+        """
+        Read the parts of a shapefile (see iter_shape_parts())
+
+        Returns:
+            [GeometryCache] -- The geometries
+        """
+        parts = []
+        record_index = []
+        records = []
+        for _, record, shape_parts in iter_shape_parts(sh_file, kind, tolerance):
+            parts.extend(shape_parts)
+            record_index.extend([len(records)] * len(shape_parts))
+            records.append(record)
+        offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(part) for part in parts])
+        coords = (np.concatenate(parts) if parts
+                  else np.zeros((0, 2), dtype=np.float64))
+        return cls(coords, offsets, np.array(record_index, dtype=np.int64),
+                   records)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def get_points(self, index):
+        """
+        Returns:
+            [np.array] -- (n,2) points of the part index
+        """
+        return self.coords[self.offsets[index]:self.offsets[index + 1]]
+
+    def get_lines(self):
+        """
+        Returns:
+            [list] -- The parts as lists of [x,y] points (e.g. MAP_INFO)
+        """
+        # One conversion of the whole coords array, then list slices
+        points = self.coords.tolist()
+        offsets = self.offsets.tolist()
+        return [points[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+    def get_segments(self):
+        """
+        Split the parts into their consecutive 2-point segments, the format
+        of the road network lines (MAP_INFO)
+
+        Returns:
+            [list] -- list of segments [[x1,y1],[x2,y2]]
+        """
+        # Every point but the last one of each part starts a segment
+        has_next = np.ones(len(self.coords), dtype=bool)
+        ends = np.asarray(self.offsets[1:]) - 1
+        has_next[ends[ends >= 0]] = False
+        from_index = np.flatnonzero(has_next)
+        points = self.coords.tolist()
+        return [[points[i], points[i + 1]] for i in from_index.tolist()]
+
+    def get_features(self):
+        """
+        Returns:
+            [list] -- One dict per part, with the "points" of the part and
+            the fields of its record (same as get_polygons_from_shape_file()
+            and get_polylines_from_shape_file())
+        """
+        features = []
+        for points, rec_index in zip(self.get_lines(), self.record_index.tolist()):
+            feature = {"points": points}
+            feature.update(self.records[rec_index])
+            features.append(feature)
+        return features
+
+    def get_polygon_dict(self, id_field):
+        """
+        Build the polygons of each record, and group them by the value of a
+        record field. The parts of a record are its polygon rings: clockwise
+        rings are exteriors, counterclockwise rings are holes (interior
+        rings) of the exterior that contains them (as in the shapefile
+        format). If a record has no clockwise ring, each of its rings is an
+        exterior
+
+        Arguments:
+            id_field {string} -- The field (e.g. the sensor id)
+
+        Returns:
+            [dict] -- key: field value (as a string), value: list of
+            polygons (shapely.geometry.Polygon). Records without the field
+            are skipped
+        """
+        from shapely.geometry import Point, Polygon
+        record_rings = {}  #key: record index, value: list of rings
+        parts = np.split(self.coords, np.asarray(self.offsets[1:-1]))
+        for points, rec_index in zip(parts, self.record_index.tolist()):
+            record_rings.setdefault(rec_index, []).append(points)
+
+        poly_dict = {}
+        for rec_index, rings in record_rings.items():
+            key = self.records[rec_index].get(id_field, None)
+            if key is None:
+                continue
+            clockwise = [get_signed_area(ring) < 0 for ring in rings]
+            if not any(clockwise):
+                clockwise = [True] * len(rings)
+            exteriors = [ring for ring, is_ext in zip(rings, clockwise) if is_ext]
+            holes = [[] for _ in exteriors]
+            shells = [Polygon(ring) for ring in exteriors]
+            for ring, is_ext in zip(rings, clockwise):
+                if is_ext:
+                    continue
+                point = Point(ring[0])
+                # The exterior that contains the hole (the last one if none)
+                owner = next((i for i, shell in enumerate(shells)
+                              if shell.contains(point)), len(shells) - 1)
+                holes[owner].append(ring)
+            poly_dict.setdefault(str(key), []).extend(
+                Polygon(ring, these_holes)
+                for ring, these_holes in zip(exteriors, holes))
+        return poly_dict
+
+
+def get_signed_area(ring):
+    """
+    Get the signed area of a polygon ring (shoelace formula)
+
+    Arguments:
+        ring {np.array} -- (n,2) points of the ring (first point not
+            repeated at the end)
+
+    Returns:
+        [float] -- The area. Negative if the ring is clockwise
+    """
+    x_arr = ring[:, 0]
+    y_arr = ring[:, 1]
+    return 0.5 * float(np.dot(x_arr, np.roll(y_arr, -1)) -
+                       np.dot(np.roll(x_arr, -1), y_arr))
+
+
+def get_geometry_cache_key(sh_file, kind, tolerance):
+    """
+    Get the key of the cached geometries of a shapefile: a hash of the path,
+    size and modification time of its files, and of the read options
+
+    Returns:
+        [string] -- The key (hex)
+    """
+    base = os.path.splitext(os.path.abspath(sh_file))[0]
+    stats = []
+    for ext in (".shp", ".dbf"):
+        stat = os.stat(base + ext)
+        stats.append([stat.st_size, stat.st_mtime_ns])
+    content = json.dumps([GEOMETRY_CACHE_VERSION, base, stats, kind, tolerance])
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def save_geometry_cache(cache_path, geometry):
+    """
+    Save the geometries as .npy files (and the records as json) in the
+    directory cache_path. The directory is written under a temporary name
+    first, so a partially written cache is never loaded
+
+    Arguments:
+        cache_path {string} -- The cache directory of the shapefile
+        geometry {GeometryCache} -- The geometries
+    """
+    parent_dir = os.path.dirname(cache_path) or "."
+    tmp_path = tempfile.mkdtemp(prefix=".tmp_" + GEOMETRY_CACHE_DIR_PREFIX,
+                                dir=parent_dir)
+    try:
+        for name in GEOMETRY_CACHE_ARRAYS:
+            np.save(os.path.join(tmp_path, name + ".npy"), getattr(geometry, name))
+        with open(os.path.join(tmp_path, "records.json"), "w") as records_file:
+            json.dump(geometry.records, records_file, default=str)
+        os.rename(tmp_path, cache_path)
+    except OSError:
+        # e.g. another process has written the same cache meanwhile
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+
+def load_geometry_cache(sh_file, kind, tolerance=0.0, cache_dir=None):
+    """
+    Read the polygons or polylines of a shapefile (see
+    GeometryCache.from_shape_file()). If cache_dir is given, the result is
+    cached there, keyed by get_geometry_cache_key(). Later calls load the
+    arrays (memory-mapped) instead of parsing the shapefile again. A cache
+    that can not be read or written is logged, and the shapefile is read as
+    without a cache
+
+    Arguments:
+        sh_file {string} -- The shapefile
+        kind {string} -- "polygon" or "polyline"
+
+    Keyword Arguments:
+        tolerance {float} -- Simplify the parts with this tolerance
+            (default: {0.0}, no simplification)
+        cache_dir {string} -- The cache directory (default: {None}, no cache)
+
+    Returns:
+        [GeometryCache] -- The geometries
+    """
+    cache_path = None
+    if cache_dir is not None:
+        try:
+            cache_path = os.path.join(
+                cache_dir, GEOMETRY_CACHE_DIR_PREFIX +
+                get_geometry_cache_key(sh_file, kind, tolerance))
+        except OSError as cache_error:
+            logging.error("ERROR: Geometry cache: could not stat %s: %s",
+                          sh_file, str(cache_error))
+    if cache_path is not None and os.path.isdir(cache_path):
+        try:
+            arrays = {name: np.load(os.path.join(cache_path, name + ".npy"),
+                                    mmap_mode="r")
+                      for name in GEOMETRY_CACHE_ARRAYS}
+            with open(os.path.join(cache_path, "records.json")) as records_file:
+                records = json.load(records_file)
+            logging.info("Geometry cache: loaded %s from %s", sh_file, cache_path)
+            return GeometryCache(arrays["coords"], arrays["offsets"],
+                                 arrays["record_index"], records)
+        except (OSError, ValueError) as cache_error:
+            logging.error("ERROR: Geometry cache: could not load cache %s: %s",
+                          cache_path, str(cache_error))
+
+    geometry = GeometryCache.from_shape_file(sh_file, kind, tolerance)
+    if cache_path is not None:
+        try:
+            save_geometry_cache(cache_path, geometry)
+            logging.info("Geometry cache: saved cache %s", cache_path)
+        except OSError as cache_error:
+            logging.error("ERROR: Geometry cache: could not save cache %s: %s",
+                          cache_path, str(cache_error))
+    return geometry
@@ -0,0 +1,227 @@
+"""
+Assignment solvers used for matching detections across timesteps
+"""
+
+__version__ = '0.2'
+
+import logging
+from collections import deque
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from code_libs.mctrack import constants
+
+
+def solve_exact(cost_matrix):
+    """
+    Solve the minimum cost assignment with the Hungarian algorithm
+
+    Arguments:
+        cost_matrix {[np.array]} -- nxm cost matrix
+
+    Returns:
+        [tuple] -- (row_ind, col_ind) arrays of matched indices
+    """
+    return linear_sum_assignment(cost_matrix)
+
+
+class AuctionSolver:
+    """
+    Auction (epsilon-scaling) solver for the minimum cost assignment.
+
+    Consecutive timesteps produce nearly identical assignment problems. The
+    solver keeps the object prices of the last solution keyed by object id
+    (relative to the largest cost of the problem, so that they carry over to
+    problems of another scale), and uses them to warm-start the next problem
+    for the detections whose ids persist. A warm-started auction skips the
+    coarse epsilon phases. If it does not converge within a bounded number of
+    bids, the auction is restarted cold, and if that does not converge
+    either, the exact solver is used instead (counted in
+    stats["fallbacks"]).
+    """
+
+    def __init__(self, min_eps=constants.AUCTION_MIN_EPS,
+                 eps_scale=constants.AUCTION_EPS_SCALE_FACTOR,
+                 max_bids_factor=constants.AUCTION_MAX_BIDS_FACTOR,
+                 warm_eps=constants.AUCTION_WARM_EPS):
+        """
+        Init method
+
+        Keyword Arguments:
+            min_eps {float} -- The final epsilon, relative to the largest
+                cost. The solution is within n * min_eps of the optimum
+            eps_scale {float} -- The factor by which epsilon is reduced
+                in each scaling phase
+            max_bids_factor {int} -- Bound on number of bids per phase, as a
+                multiple of the problem size. If exceeded, the auction is
+                restarted cold (if warm-started) or the exact solver is used
+            warm_eps {float} -- The first epsilon of a warm-started auction,
+                relative to the largest cost
+        """
+        self.min_eps = min_eps
+        self.eps_scale = eps_scale
+        self.max_bids_factor = max_bids_factor
+        self.warm_eps = warm_eps
+        self.prices = {}  #key: object id, value: price from last solution (relative to its largest cost)
+        self.stats = {"solved": 0, "warmStarted": 0, "coldRestarts": 0,
+                      "fallbacks": 0}
+
+    def get_warm_prices(self, col_keys, num_cols, scale):
+        """
+        Get the initial prices of the columns from the previous solution. The
+        columns without a price (new objects and dummy columns) start at the
+        highest of the prices, so that they do not attract all the first bids
+
+        Arguments:
+            col_keys {list} -- For each column, a list of ids of the object
+            num_cols {int} -- Number of columns (incl. dummy columns)
+            scale {float} -- The largest cost of the problem
+
+        Returns:
+            [tuple] -- (prices array, number of columns warm started)
+        """
+        prices = np.zeros(num_cols)
+        num_warm = 0
+        if col_keys is not None and self.prices:
+            warm = np.zeros(num_cols, dtype=bool)
+            for j, keys in enumerate(col_keys):
+                for key in keys:
+                    price = self.prices.get(key, None)
+                    if price is not None:
+                        prices[j] = price * scale
+                        warm[j] = True
+                        num_warm += 1
+                        break
+            if num_warm:
+                prices[np.logical_not(warm)] = prices[warm].max()
+        return prices, num_warm
+
+    def auction(self, benefit, prices, eps, max_bids):
+        """
+        One forward auction phase (Gauss-Seidel) on a square benefit matrix
+
+        Arguments:
+            benefit {[np.array]} -- nxn benefit matrix (to be maximized)
+            prices {[np.array]} -- prices of the n objects. Updated in place
+            eps {float} -- The bid increment
+            max_bids {int} -- Maximum number of bids before giving up
+
+        Returns:
+            [np.array] -- Object assigned to each person or None if the
+            auction did not converge
+        """
+        num = benefit.shape[0]
+        person_obj = np.full(num, -1, dtype=int)
+        obj_person = np.full(num, -1, dtype=int)
+        unassigned = deque(range(num))
+        num_bids = 0
+        while unassigned:
+            num_bids += 1
+            if num_bids > max_bids:
+                return None
+            i = unassigned.popleft()
+            values = benefit[i] - prices
+            j = int(np.argmax(values))
+            best = values[j]
+            if num > 1:
+                values[j] = -np.inf
+                second = values.max()
+            else:
+                second = best
+            prices[j] += best - second + eps
+            prev_person = obj_person[j]
+            if prev_person >= 0:
+                person_obj[prev_person] = -1
+                unassigned.append(prev_person)
+            obj_person[j] = i
+            person_obj[i] = j
+        return person_obj
+
+    def scaled_auction(self, benefit, prices, eps, final_eps, max_bids):
+        """
+        Run auction phases with decreasing epsilon (by eps_scale), from eps
+        down to final_eps
+
+        Arguments:
+            benefit {[np.array]} -- nxn benefit matrix (to be maximized)
+            prices {[np.array]} -- initial prices of the n objects. Updated
+                in place
+            eps {float} -- The epsilon of the first phase
+            final_eps {float} -- The epsilon of the last phase
+            max_bids {int} -- Maximum number of bids per phase
+
+        Returns:
+            [np.array] -- Object assigned to each person or None if a phase
+            did not converge
+        """
+        while True:
+            person_obj = self.auction(benefit, prices, eps, max_bids)
+            if person_obj is None or eps <= final_eps:
+                return person_obj
+            eps = max(eps / self.eps_scale, final_eps)
+
+    def solve(self, cost_matrix, col_keys=None):
+        """
+        Solve the minimum cost assignment for the nxm cost_matrix
+
+        Arguments:
+            cost_matrix {[np.array]} -- nxm cost matrix
+
+        Keyword Arguments:
+            col_keys {list} -- For each column, a list of ids of the object.
+                Used to warm-start and store the prices (default: {None})
+
+        Returns:
+            [tuple] -- (row_ind, col_ind) arrays of matched indices, same
+            as linear_sum_assignment()
+        """
+        num_rows, num_cols = cost_matrix.shape
+        size = max(num_rows, num_cols)
+        if min(num_rows, num_cols) == 0:
+            return np.array([], dtype=int), np.array([], dtype=int)
+
+        # Pad to a square problem. Dummy entries have the same cost, so
+        # they do not change the optimal assignment of the real entries
+        max_cost = float(cost_matrix.max())
+        benefit = np.full((size, size), -max_cost)
+        benefit[:num_rows, :num_cols] = -cost_matrix
+
+        scale = max(max_cost, 1.0)
+        final_eps = scale * self.min_eps
+        max_bids = self.max_bids_factor * size
+        prices, num_warm = self.get_warm_prices(col_keys, size, scale)
+        person_obj = None
+        if num_warm:
+            # Prices are already close to equilibrium: skip the coarse phases
+            self.stats["warmStarted"] += 1
+            person_obj = self.scaled_auction(
+                benefit, prices, max(scale * self.warm_eps, final_eps),
+                final_eps, max_bids)
+            if person_obj is None:
+                self.stats["coldRestarts"] += 1
+                prices = np.zeros(size)
+        if person_obj is None:
+            person_obj = self.scaled_auction(benefit, prices, scale / 4.0,
+                                             final_eps, max_bids)
+
+        self.stats["solved"] += 1
+        if person_obj is None:
+            self.stats["fallbacks"] += 1
+            logging.warning("AuctionSolver: No convergence for %dx%d problem. "
+                            "Using exact solver (%d of %d problems)", num_rows,
+                            num_cols, self.stats["fallbacks"],
+                            self.stats["solved"])
+            self.prices = {}
+            return solve_exact(cost_matrix)
+
+        if col_keys is not None:
+            self.prices = {}
+            for j, keys in enumerate(col_keys):
+                for key in keys:
+                    self.prices[key] = prices[j] / scale
+
+        row_ind = np.arange(num_rows)
+        col_ind = person_obj[:num_rows]
+        real = col_ind < num_cols
+        return row_ind[real], col_ind[real]
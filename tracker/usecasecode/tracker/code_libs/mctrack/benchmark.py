@@ -0,0 +1,1381 @@
+"""
+Benchmarks for the multicam tracker on replayed (recorded) detections.
+
+The recorded file has one day2 schema json per line (same as the input of
+mctrackbatch). Run as:
+    python3 -m code_libs.mctrack.benchmark --config=<tracker config file>
+        --input=<recorded json file> --bench=<benchmark name>
+"""
+
+__version__ = '0.2'
+
+import argparse
+import copy
+import datetime
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import iso8601
+import numpy as np
+import pandas as pd
+from scipy.spatial import distance_matrix
+
+from code_libs.mctrack import (assignment, camerafov, constants, ioutils,
+                               kernels, mctracker, rawrecord, trackerutils)
+from code_libs.euclidean import euchelper
+from code_libs.geo.core import spatial
+from code_libs.network import mapmatch, networkhelper
+
+SOAK_SIM_HOURS = 2.0      # simulated time of the soak benchmark
+SOAK_NUM_SAMPLES = 50     # gauge samples taken during the soak benchmark
+SOAK_MAX_GROWTH = 1.1     # max memory growth from the first to the second half of the run
+
+
+def replay_windows(schema_json_file, config):
+    """
+    Read recorded detections and split them into time windows, the same
+    way as mctrackbatch.read_schema_and_infer()
+
+    Arguments:
+        schema_json_file {string} -- File with one day2 json per line
+        config {dict} -- The tracker config
+
+    Returns:
+        list -- list of windows, each a list of detections
+    """
+    ignore_poly_dict = ioutils.load_ignore_regions(config)
+    json_list = ioutils.read_json_list(
+        schema_json_file, config.get("timeRange", {}))
+    json_list, _ = ioutils.ignore_false_detections(json_list, ignore_poly_dict)
+    time_indexed_json_dict = trackerutils.create_time_windows(
+        json_list, config.get("resample_time_sec",
+                              constants.RESAMPLE_TIME_IN_SEC))
+    return [recs for recs in time_indexed_json_dict.values() if recs]
+
+
+def record_assignment_problems(windows, config):
+    """
+    Run the tracker (with the exact solver) over the windows, and record
+    each assignment problem it solves
+
+    Returns:
+        list -- list of (cost_matrix, col_keys) tuples
+    """
+    mctracker_obj = mctracker.MulticamTracker(config)
+    problems = []
+
+    def recording_solver(cost_matrix, json_list):
+        col_keys = [mctracker_obj.get_id_list(json_ele)
+                    for json_ele in json_list]
+        problems.append((cost_matrix.copy(), col_keys))
+        return assignment.solve_exact(cost_matrix)
+
+    mctracker_obj.solve_assignment = recording_solver
+    for all_json_list in windows:
+        mctracker_obj.process_batch(all_json_list)
+    return problems
+
+
+def bench_match_solver(windows, config):
+    """
+    Compare solve times and assignment agreement of the auction solver
+    against the exact (Hungarian) solver on the same sequence of
+    assignment problems
+
+    Returns:
+        dict -- benchmark results
+    """
+    problems = record_assignment_problems(windows, config)
+    solver = assignment.AuctionSolver()
+    exact_times = []
+    auction_times = []
+    num_agree = 0
+    cost_deltas = []
+    for cost_matrix, col_keys in problems:
+        start_time = time.perf_counter()
+        row1, col1 = assignment.solve_exact(cost_matrix)
+        exact_times.append(time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        row2, col2 = solver.solve(cost_matrix, col_keys)
+        auction_times.append(time.perf_counter() - start_time)
+
+        if set(zip(row1, col1)) == set(zip(row2, col2)):
+            num_agree += 1
+        cost_deltas.append(float(cost_matrix[row2, col2].sum() -
+                                 cost_matrix[row1, col1].sum()))
+
+    num = len(problems)
+    return {"numProblems": num,
+            "exactTimeSec": float(np.sum(exact_times)),
+            "auctionTimeSec": float(np.sum(auction_times)),
+            "agreement": (num_agree / float(num)) if num else None,
+            "maxCostDelta": max(cost_deltas) if cost_deltas else None,
+            "auctionStats": solver.stats}
+
+
+def get_pair_disagreement(clusters1, clusters2):
+    """
+    Get the number of point pairs that are in the same cluster in one
+    clustering but not in the other
+
+    Arguments:
+        clusters1 {list} -- Cluster number of each point
+        clusters2 {list} -- Cluster number of each point
+
+    Returns:
+        tuple -- (number of disagreeing pairs, total number of pairs)
+    """
+    clusters1 = np.asarray(clusters1)
+    clusters2 = np.asarray(clusters2)
+    same1 = clusters1[:, None] == clusters1[None, :]
+    same2 = clusters2[:, None] == clusters2[None, :]
+    num = len(clusters1)
+    disagree = int(np.triu(same1 != same2, k=1).sum())
+    return disagree, num * (num - 1) // 2
+
+
+def bench_cluster_engine(windows, config):
+    """
+    Compare the approximate ("greedy") clustering engine with the exact
+    clustering on every clustering problem of the replayed windows. The
+    tracker state evolves with the exact clustering
+
+    Returns:
+        dict -- benchmark results
+    """
+    mctracker_obj = mctracker.MulticamTracker(config)
+    results = {"numProblems": 0, "numPoints": 0, "numDisagreeing": 0,
+               "disagreeingPairs": 0, "totalPairs": 0,
+               "exactTimeSec": 0.0, "greedyTimeSec": 0.0}
+
+    def comparing_cluster(json_list, max_d, params):
+        start_time = time.perf_counter()
+        exact = mctracker_obj.get_cluster_exact(json_list, max_d, params)
+        results["exactTimeSec"] += time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        greedy = mctracker_obj.get_cluster_greedy(json_list, max_d, params)
+        results["greedyTimeSec"] += time.perf_counter() - start_time
+
+        disagree, total = get_pair_disagreement(exact, greedy)
+        results["numProblems"] += 1
+        results["numPoints"] += len(json_list)
+        results["numDisagreeing"] += int(disagree > 0)
+        results["disagreeingPairs"] += disagree
+        results["totalPairs"] += total
+        return exact
+
+    mctracker_obj.get_cluster = comparing_cluster
+    for all_json_list in windows:
+        mctracker_obj.process_batch(all_json_list)
+
+    if results["numProblems"]:
+        results["disagreementRate"] = (results["numDisagreeing"] /
+                                       float(results["numProblems"]))
+    if results["totalPairs"]:
+        results["pairDisagreementRate"] = (results["disagreeingPairs"] /
+                                           float(results["totalPairs"]))
+    return results
+
+
+def run_tracker(windows, config, wrap_fn=None):
+    """
+    Run the tracker over (a copy of) the windows
+
+    Keyword Arguments:
+        wrap_fn {function} -- Called with the tracker before the run, to
+            instrument it (default: {None})
+
+    Returns:
+        tuple -- (list of outputs per window, time taken in sec, peak
+        traced memory in bytes)
+    """
+    windows = copy.deepcopy(windows)
+    mctracker_obj = mctracker.MulticamTracker(config)
+    if wrap_fn is not None:
+        wrap_fn(mctracker_obj)
+    outputs = []
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    for all_json_list in windows:
+        mctracker_obj.process_batch(all_json_list)
+        outputs.append(json.dumps(mctracker_obj.state.retval, sort_keys=True,
+                                  default=str))
+        mctracker_obj.state.retval = []
+    time_taken = time.perf_counter() - start_time
+    _, peak_mem = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return outputs, time_taken, peak_mem
+
+
+def bench_buffer_pool(windows, config):
+    """
+    Run the tracker with and without the buffer pool. Checks that the
+    outputs are identical and that the distance matrices are the same as
+    scipy's distance_matrix()
+
+    Returns:
+        dict -- benchmark results
+    """
+    config_no_pool = copy.deepcopy(config)
+    config_no_pool.setdefault("trackerConfig", {})["USE_BUFFER_POOL"] = False
+    config_pool = copy.deepcopy(config)
+    config_pool.setdefault("trackerConfig", {})["USE_BUFFER_POOL"] = True
+    checks = {"numDistMatrices": 0, "numDistMismatches": 0}
+
+    def check_dist_matrix(mctracker_obj):
+        get_distance_matrix = mctracker_obj.get_distance_matrix
+
+        def checked(prev_json_list, json_list, dist_norm_parameters=None,
+                    buffer_name=None):
+            dist_matrix = get_distance_matrix(
+                prev_json_list, json_list, dist_norm_parameters, buffer_name)
+            expected = distance_matrix(
+                [trackerutils.get_xy(ele) for ele in prev_json_list],
+                [trackerutils.get_xy(ele) for ele in json_list])
+            checks["numDistMatrices"] += 1
+            checks["numDistMismatches"] += int(
+                not np.allclose(dist_matrix, expected, rtol=0, atol=1e-9))
+            return dist_matrix
+        mctracker_obj.get_distance_matrix = checked
+
+    outputs1, time1, peak1 = run_tracker(windows, config_no_pool)
+    outputs2, _, _ = run_tracker(windows, config_pool, check_dist_matrix)
+    _, time2, peak2 = run_tracker(windows, config_pool)
+    checks.update({
+        "numWindows": len(windows),
+        "numOutputMismatches": sum(int(out1 != out2) for out1, out2
+                                   in zip(outputs1, outputs2)),
+        "noPoolTimeSec": time1, "poolTimeSec": time2,
+        "noPoolPeakBytes": peak1, "poolPeakBytes": peak2})
+    return checks
+
+
+def bench_kernels(windows, config):
+    """
+    Run the tracker with each kernels backend (see kernels.get_kernels()).
+    Checks that the outputs are identical to those of the per-pair python
+    loops
+
+    Returns:
+        dict -- benchmark results
+    """
+    backends = ["python", "numpy"]
+    if kernels.numba is not None:
+        backends.append("numba")
+    results = {"numWindows": len(windows)}
+    ref_outputs = None
+    for backend in backends:
+        backend_config = copy.deepcopy(config)
+        backend_config.setdefault("trackerConfig", {})["KERNEL_BACKEND"] = backend
+        if backend == "numba":
+            # Warm-up run, so that the jit compile time is not counted
+            run_tracker(windows[:1], backend_config)
+        outputs, time_taken, _ = run_tracker(windows, backend_config)
+        if ref_outputs is None:
+            ref_outputs = outputs
+        results[backend] = {
+            "timeSec": time_taken,
+            "numOutputMismatches": sum(int(out1 != out2) for out1, out2
+                                       in zip(ref_outputs, outputs))}
+    return results
+
+
+def get_traced_bytes(build_fn):
+    """
+    Get the memory held by the object returned by build_fn
+
+    Returns:
+        tuple -- (the object, bytes allocated while building it and still held)
+    """
+    tracemalloc.start()
+    obj = build_fn()
+    held_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, held_bytes
+
+
+def bench_state_memory(windows, config):
+    """
+    Measure the memory of the state carried across timesteps (prev_list and
+    carry_over_list) with and without COMPACT_TRACK_STATE, reported per
+    1000 live tracks (records in prev_list)
+
+    Returns:
+        dict -- benchmark results
+    """
+    results = {"numWindows": len(windows)}
+    for compact in [False, True]:
+        this_config = copy.deepcopy(config)
+        this_config.setdefault("trackerConfig", {})["COMPACT_TRACK_STATE"] = compact
+        state_bytes = []
+        num_tracks = []
+
+        def measure_state(mctracker_obj):
+            process_batch = mctracker_obj.process_batch
+
+            def measured(all_json_list):
+                process_batch(all_json_list)
+                state = mctracker_obj.state
+                state_bytes.append(trackerutils.get_deep_size(
+                    [state.prev_list, state.carry_over_list]))
+                num_tracks.append(len(state.prev_list))
+            mctracker_obj.process_batch = measured
+
+        outputs, _, _ = run_tracker(windows, this_config, measure_state)
+        total_tracks = sum(num_tracks)
+        results["compact" if compact else "dict"] = {
+            "avgLiveTracks": total_tracks / float(max(len(num_tracks), 1)),
+            "stateBytesPer1000Tracks": (1000.0 * sum(state_bytes) /
+                                        max(total_tracks, 1)),
+            "outputs": outputs}
+    results["numOutputMismatches"] = sum(
+        int(out1 != out2) for out1, out2
+        in zip(results["dict"].pop("outputs"), results["compact"].pop("outputs")))
+    return results
+
+
+def bench_trajectory(windows, config):
+    """
+    Run the tracker with and without the trajectory buffer. The outputs
+    should be identical. Also times get_track_motion() for all live
+    tracks after each timestep
+
+    Returns:
+        dict -- benchmark results
+    """
+    results = {"numWindows": len(windows)}
+    all_outputs = {}
+    for use_buffer in [False, True]:
+        this_config = copy.deepcopy(config)
+        this_config.setdefault("trackerConfig", {})["USE_TRAJECTORY_BUFFER"] = use_buffer
+        motion_times = []
+        num_tracks = []
+
+        def measure_motion(mctracker_obj):
+            process_batch = mctracker_obj.process_batch
+
+            def measured(all_json_list):
+                process_batch(all_json_list)
+                start_time = time.perf_counter()
+                mctracker_obj.get_track_motion(mctracker_obj.state.prev_list)
+                motion_times.append(time.perf_counter() - start_time)
+                num_tracks.append(len(mctracker_obj.state.prev_list))
+            mctracker_obj.process_batch = measured
+
+        outputs, time_taken, _ = run_tracker(windows, this_config,
+                                             measure_motion)
+        name = "buffer" if use_buffer else "noBuffer"
+        all_outputs[name] = outputs
+        results[name] = {"timeSec": time_taken,
+                         "motionTimeSec": sum(motion_times),
+                         "avgLiveTracks": (sum(num_tracks) /
+                                           float(max(len(num_tracks), 1)))}
+    results["identical"] = all_outputs["noBuffer"] == all_outputs["buffer"]
+    return results
+
+
+def get_synthetic_regions(json_list, num_regions):
+    """
+    Create num_regions small square ignore regions for each sensor, spread
+    over the extent of the detections of that sensor
+
+    Returns:
+        dict -- key: sensor id, value: list of polygons (list of points)
+    """
+    sensor_points = {}
+    for json_ele in json_list:
+        point = trackerutils.get_xy(json_ele)
+        if point is not None:
+            sensor_points.setdefault(json_ele["sensor"]["id"], []).append(point)
+    rng = np.random.RandomState(0)
+    regions = {}
+    for sensor_id, points in sensor_points.items():
+        points = np.asarray(points, dtype=np.float64)
+        min_xy = points.min(axis=0)
+        max_xy = points.max(axis=0)
+        size = max(float((max_xy - min_xy).max()), 1.0) / 20.0
+        centers = rng.uniform(min_xy, max_xy, size=(num_regions, 2))
+        regions[sensor_id] = [[(x - size, y - size), (x + size, y - size),
+                               (x + size, y + size), (x - size, y + size)]
+                              for x, y in centers.tolist()]
+    return regions
+
+
+def bench_ignore_regions(windows, config, num_regions=50):
+    """
+    Compare ignore-region filtering with the polygon dictionary (per point,
+    per polygon contains()) and with IgnoreRegions (prepared, grouped by
+    sensor, vectorized). Uses the regions of the config, or num_regions
+    synthetic regions per sensor if the config has none
+
+    Returns:
+        dict -- benchmark results
+    """
+    json_list = [json_ele for all_json_list in windows for json_ele in all_json_list]
+    regions = config.get("IGNORE_DETECTION_DICT_MOVING", {})
+    if not regions:
+        regions = get_synthetic_regions(json_list, num_regions)
+    poly_dict = ioutils.create_poly_dict(regions)
+    ignore_regions = ioutils.IgnoreRegions(regions)
+
+    start_time = time.perf_counter()
+    kept1, ignored1 = ioutils.ignore_false_detections(json_list, poly_dict)
+    loop_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    kept2, ignored2 = ioutils.ignore_false_detections(json_list, ignore_regions)
+    vectorized_time = time.perf_counter() - start_time
+
+    return {"numRecords": len(json_list),
+            "numRegions": sum(len(polys) for polys in regions.values()),
+            "numIgnored": len(ignored1),
+            "loopTimeSec": loop_time,
+            "vectorizedTimeSec": vectorized_time,
+            "identical": (all(ele1 is ele2 for ele1, ele2 in zip(kept1, kept2)) and
+                          all(ele1 is ele2 for ele1, ele2 in zip(ignored1, ignored2)) and
+                          len(kept1) == len(kept2) and len(ignored1) == len(ignored2))}
+
+
+def bench_raw_records(windows, config):
+    """
+    Compare decoding and encoding the records fully (json) and lazily
+    (rawrecord: only the changed fields are re-encoded). The tracker is run
+    on the records decoded each way, and the (decoded) outputs should be
+    identical
+
+    Returns:
+        dict -- benchmark results
+    """
+    raw_windows = [[json.dumps(json_ele).encode("utf-8")
+                    for json_ele in all_json_list] for all_json_list in windows]
+    num = float(max(sum(len(raw_list) for raw_list in raw_windows), 1))
+    results = {"numRecords": int(num),
+               "avgRecordBytes": sum(len(rec) for raw_list in raw_windows
+                                     for rec in raw_list) / num}
+    all_outputs = {}
+    modes = [("full", json.loads, lambda rec: json.dumps(rec).encode("utf-8")),
+             ("lazy", rawrecord.RawRecord.from_json_str, rawrecord.encode_record)]
+    for name, decode_fn, encode_fn in modes:
+        mctracker_obj = mctracker.MulticamTracker(config)
+        decode_time = encode_time = 0.0
+        outputs = []
+        for raw_list in raw_windows:
+            start_time = time.perf_counter()
+            all_json_list = [decode_fn(rec) for rec in raw_list]
+            decode_time += time.perf_counter() - start_time
+
+            mctracker_obj.process_batch(all_json_list)
+
+            start_time = time.perf_counter()
+            encoded = [encode_fn(json_ele) for json_ele in mctracker_obj.state.retval]
+            encode_time += time.perf_counter() - start_time
+            outputs.append([json.loads(rec) for rec in encoded])
+            mctracker_obj.state.retval = []
+        all_outputs[name] = outputs
+        results[name] = {"decodeTimeSec": decode_time,
+                         "encodeTimeSec": encode_time,
+                         "decodeUsPerRecord": 1e6 * decode_time / num,
+                         "encodeUsPerRecord": 1e6 * encode_time / num}
+    results["numOutputMismatches"] = sum(
+        int(out1 != out2) for out1, out2
+        in zip(all_outputs["full"], all_outputs["lazy"]))
+    return results
+
+
+def bench_output_path(windows, config):
+    """
+    Compare the allocations per output message of the deep copy of each
+    output batch (as the processor and player did before they rewrite the
+    top level fields of the records) with the copy-on-write copies (top level
+    dicts only, the nested fields are shared with the tracker output)
+
+    Returns:
+        dict -- benchmark results
+    """
+    mctracker_obj = mctracker.MulticamTracker(config)
+    batches = []
+    for all_json_list in copy.deepcopy(windows):
+        mctracker_obj.process_batch(all_json_list)
+        batches.append(mctracker_obj.state.retval)
+        mctracker_obj.state.retval = []
+    num = float(max(sum(len(batch) for batch in batches), 1))
+    results = {"numMessages": int(num)}
+    modes = [("deepcopy", copy.deepcopy),
+             ("copyOnWrite", lambda batch: [dict(json_ele) for json_ele in batch])]
+    for name, copy_fn in modes:
+        held_bytes = 0
+        start_time = time.perf_counter()
+        for batch in batches:
+            _, this_bytes = get_traced_bytes(lambda batch=batch: copy_fn(batch))
+            held_bytes += this_bytes
+        time_taken = time.perf_counter() - start_time
+        results[name] = {"bytesPerMessage": held_bytes / num,
+                         "usPerMessage": 1e6 * time_taken / num}
+    results["bytesRatio"] = (results["deepcopy"]["bytesPerMessage"] /
+                             max(results["copyOnWrite"]["bytesPerMessage"], 1))
+    return results
+
+
+def get_cluster_aggregates_loop(mctracker_obj, json_list, cluster_assocs):
+    """
+    The per-cluster aggregation that MulticamTracker.get_cluster_aggregates()
+    replaces (one pass over all the detections per cluster). The records
+    are not changed
+
+    Returns:
+        list -- (members, x_mean, y_mean, representative record, id list)
+        of each multi-camera cluster
+    """
+    retval = []
+    for k in sorted(set(cluster_assocs)):
+        members = [i for i in range(len(cluster_assocs)) if cluster_assocs[i] == k]
+        rec_list = [json_list[i] for i in members]
+        if len(set(trackerutils.get_camera(rec) for rec in rec_list)) > 1:
+            pts = [(rec['object']['centroid']['x'], rec['object']['centroid']['y'])
+                   for rec in sorted(rec_list, key=lambda rec: rec['@timestamp'])]
+            x_mean, y_mean = trackerutils.get_mean_xy(pts)
+            sel_rec = mctracker_obj.select_rep_member_from_list(rec_list)
+            retval.append((members, x_mean, y_mean, id(sel_rec),
+                           mctracker_obj.concatenate_member_ids(rec_list)))
+    return retval
+
+
+def bench_cluster_aggregation(windows, config, sizes=(100, 1000, 5000)):
+    """
+    Compare the per-cluster aggregation loop with the one-pass aggregation
+    (MulticamTracker.get_cluster_aggregates()) for the given numbers of
+    detections (sampled from the windows), with ~3 detections per cluster
+
+    Returns:
+        dict -- benchmark results
+    """
+    recs = [json_ele for all_json_list in windows for json_ele in all_json_list]
+    if not recs:
+        return {}
+    mctracker_obj = mctracker.MulticamTracker(config)
+    rng = np.random.RandomState(0)
+    results = {}
+    for size in sizes:
+        json_list = [recs[i] for i in rng.randint(0, len(recs), size)]
+        cluster_assocs = rng.randint(1, max(size // 3, 1) + 1, size)
+
+        start_time = time.perf_counter()
+        loop_ret = get_cluster_aggregates_loop(mctracker_obj, json_list,
+                                               cluster_assocs.tolist())
+        loop_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        aggregates = mctracker_obj.get_cluster_aggregates(json_list, cluster_assocs)
+        vectorized_time = time.perf_counter() - start_time
+
+        vectorized_ret = [
+            (aggregates["members"][k].tolist(), aggregates["x_mean"][k],
+             aggregates["y_mean"][k], id(json_list[aggregates["rep"][k]]),
+             aggregates["id_lists"][k])
+            for k in range(len(aggregates["members"])) if aggregates["multi_cam"][k]]
+        results[size] = {"numClusters": len(aggregates["members"]),
+                         "loopTimeSec": loop_time,
+                         "vectorizedTimeSec": vectorized_time,
+                         "identical": loop_ret == vectorized_ret}
+    return results
+
+
+def get_synthetic_map(json_list, num_lines=20):
+    """
+    A grid of num_lines x num_lines roads (lines) over the extent of the
+    detections
+
+    Returns:
+        list -- The lines ([[x1,y1],[x2,y2]])
+    """
+    xy_arr = np.array([trackerutils.get_xy(json_ele) for json_ele in json_list
+                       if trackerutils.get_xy(json_ele) is not None], dtype=float)
+    if not len(xy_arr):
+        xy_arr = np.array([[0.0, 0.0], [100.0, 100.0]])
+    (min_x, min_y), (max_x, max_y) = xy_arr.min(axis=0), xy_arr.max(axis=0)
+    xs = np.linspace(min_x, max_x, num_lines).tolist()
+    ys = np.linspace(min_y, max_y, num_lines).tolist()
+    lines = []
+    for i in range(num_lines):
+        for j in range(num_lines - 1):
+            lines.append([[xs[i], ys[j]], [xs[i], ys[j + 1]]])
+            lines.append([[xs[j], ys[i]], [xs[j + 1], ys[i]]])
+    return lines
+
+
+def bench_road_network(windows, config):
+    """
+    Startup time of the road network (MAP_INFO of the config, or a synthetic
+    grid): densification, cold (built, and saved to an empty cache) and
+    warm (loaded from the cache). The loaded network should be the same as the built one.
+    The build time with the incremental (r-tree) refinement is given for
+    comparison
+
+    Returns:
+        dict -- benchmark results
+    """
+    map_info = config.get("MAP_INFO", None)
+    if map_info is None:
+        map_info = get_synthetic_map(
+            [json_ele for all_json_list in windows for json_ele in all_json_list])
+    start_time = time.perf_counter()
+    dense_lines = euchelper.densify_graph(map_info)
+    densify_time = time.perf_counter() - start_time
+
+    cache_dir = tempfile.mkdtemp(prefix="bench_road_network_")
+    try:
+        start_time = time.perf_counter()
+        _, cold_network = networkhelper.load_road_network(map_info, cache_dir=cache_dir)
+        cold_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        _, warm_network = networkhelper.load_road_network(map_info, cache_dir=cache_dir)
+        warm_time = time.perf_counter() - start_time
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    cold_arrays = cold_network.get_arrays()
+    warm_arrays = warm_network.get_arrays()
+    start_time = time.perf_counter()
+    try:
+        incremental_arrays = networkhelper.Network(
+            dense_lines, max_point_dist=0.1, bulk_refine=False).get_arrays()
+        incremental_time = time.perf_counter() - start_time
+    except TypeError:
+        # The r-tree fails to rebalance when two of its splits have the
+        # same score (it then compares the nodes themselves)
+        incremental_arrays = None
+        incremental_time = None
+    query_pts = cold_arrays["points"][::max(len(cold_arrays["points"]) // 100, 1)] + 0.05
+    return {"numLines": len(map_info),
+            "numDenseSegments": len(dense_lines),
+            "densifySec": densify_time,
+            "numNodes": cold_network.network.number_of_nodes(),
+            "numEdges": cold_network.network.number_of_edges(),
+            "coldStartSec": cold_time,
+            "warmStartSec": warm_time,
+            "incrementalBuildSec": incremental_time,
+            "sameAsIncremental": incremental_arrays is not None and all(
+                np.array_equal(cold_arrays[name], incremental_arrays[name])
+                for name in ("points", "edges")),
+            "identical": (all(np.array_equal(cold_arrays[name], warm_arrays[name])
+                              for name in cold_arrays) and
+                          [cold_network.get_nearest_point_id(pt) for pt in query_pts] ==
+                          [warm_network.get_nearest_point_id(pt) for pt in query_pts])}
+
+
+def get_path_length(network, path):
+    """
+    Returns:
+        float -- Length of the path (of node ids) on the network, None if
+        there is no path
+    """
+    if path is None:
+        return None
+    return sum(network.network[src][dst]["weight"] for src, dst in zip(path, path[1:]))
+
+
+def bench_shortest_path(windows, config, num_pairs=200, num_queries=2000,
+                        num_lines=20):
+    """
+    Shortest path queries on the road network (MAP_INFO of the config, or a
+    synthetic grid): num_queries queries drawn from num_pairs node pairs,
+    with Dijkstra and A* without cache, with A* and the LRU cache, and with
+    the all-pairs table (if the network is small enough). The path lengths
+    should be the same in all modes
+
+    Returns:
+        dict -- benchmark results
+    """
+    map_info = config.get("MAP_INFO", None)
+    if map_info is None:
+        map_info = get_synthetic_map(
+            [json_ele for all_json_list in windows for json_ele in all_json_list],
+            num_lines)
+    _, network = networkhelper.load_road_network(map_info)
+    nodes = list(network.network.nodes)
+    rng = np.random.RandomState(0)
+    pairs = [(nodes[i], nodes[j]) for i, j
+             in rng.randint(0, len(nodes), (num_pairs, 2)).tolist()]
+    queries = [pairs[i] for i in rng.randint(0, num_pairs, num_queries).tolist()]
+
+    modes = [("dijkstra", 0, "dijkstra", False), ("astar", 0, "astar", False),
+             ("astarCached", networkhelper.PATH_CACHE_SIZE, "astar", False),
+             ("allPairs", networkhelper.PATH_CACHE_SIZE, "astar", True)]
+    results = {"numNodes": len(nodes), "numQueries": num_queries,
+               "numPairs": num_pairs}
+    lengths = {}
+    for name, cache_size, algorithm, all_pairs in modes:
+        network.init_path_cache(cache_size, algorithm)
+        start_time = time.perf_counter()
+        if all_pairs and not network.precompute_all_pairs():
+            continue
+        precompute_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        paths = [network.get_shortest_path_bw_id(src, dst) for src, dst in queries]
+        time_taken = time.perf_counter() - start_time
+        lengths[name] = [get_path_length(network, path) for path in paths]
+        results[name] = dict(network.get_path_stats(),
+                             usPerQuery=1e6 * time_taken / num_queries,
+                             precomputeSec=precompute_time)
+    network.init_path_cache()
+    results["sameLengths"] = all(
+        all(length1 is None and length2 is None or
+            (length1 is not None and length2 is not None and
+             abs(length1 - length2) <= 1e-9 * max(1.0, length1))
+            for length1, length2 in zip(lengths["dijkstra"], this_lengths))
+        for this_lengths in lengths.values())
+    return results
+
+
+def get_interpolated_path_loop(network, st_pt, end_pt, ts_arr,
+                               interpolate_time_sec=0.5):
+    """
+    Path interpolation one hop at a time, with the node coordinates read from
+    the graph (as Network.get_interpolated_path() did before it worked on
+    arrays). Same points as Network.get_interpolated_paths()
+
+    Returns:
+        list -- list of [timestamp, x, y, distance from the previous point]
+    """
+    path = network.get_shortest_path_bw_id(st_pt, end_pt)
+    if not path:
+        return path
+    nodes = network.network.nodes
+    path_pts = [np.array([nodes[node]["x"], nodes[node]["y"]]) for node in path]
+    path_lth = 0.0
+    for prev_pt, thept in zip(path_pts, path_pts[1:]):
+        path_lth += np.linalg.norm(thept - prev_pt)
+    total_time_sec = (ts_arr[-1] - ts_arr[0]) / np.timedelta64(1, 's')
+    start_ts = pd.Timestamp(ts_arr[0])
+    if path_lth <= 0 or total_time_sec <= 0:
+        return [[start_ts, pt[0], pt[1], 0.0] for pt in path_pts[:1]]
+
+    step_lth = path_lth * interpolate_time_sec / total_time_sec
+    retval = [[start_ts, path_pts[0][0], path_pts[0][1], 0.0]]
+    hop_start = 0.0
+    prev_arc = 0.0
+    next_step = 1
+    for prev_pt, thept in zip(path_pts, path_pts[1:]):
+        edge_lth = np.linalg.norm(thept - prev_pt)
+        hop_end = hop_start + edge_lth
+        arcs = []
+        while next_step * step_lth <= hop_end:
+            arcs.append(next_step * step_lth)
+            next_step += 1
+        arcs.append(hop_end)
+        for arc in arcs:
+            if arc - prev_arc <= 1e-9 * max(path_lth, 1.0) or arc > path_lth:
+                continue
+            proportion = (arc - hop_start) / edge_lth if edge_lth > 0 else 0.0
+            new_pt = euchelper.interpolate_line(prev_pt, thept, min(proportion, 1.0))
+            retval.append([start_ts + pd.Timedelta(arc / path_lth * total_time_sec,
+                                                   unit='s'),
+                           new_pt[0], new_pt[1], arc - prev_arc])
+            prev_arc = arc
+        hop_start = hop_end
+    return retval
+
+
+def bench_path_interpolation(windows, config, num_requests=500, num_lines=20,
+                             interpolate_time_sec=0.5):
+    """
+    Interpolation of the paths between random pairs of nodes of the road
+    network (MAP_INFO of the config, or a synthetic grid), each traversed in
+    10 to 60 seconds: hop by hop, one request at a time with
+    Network.get_interpolated_path(), and all at once with
+    Network.get_interpolated_paths(). The shortest paths are cached before
+    timing
+
+    Returns:
+        dict -- benchmark results
+    """
+    map_info = config.get("MAP_INFO", None)
+    if map_info is None:
+        map_info = get_synthetic_map(
+            [json_ele for all_json_list in windows for json_ele in all_json_list],
+            num_lines)
+    _, network = networkhelper.load_road_network(map_info)
+    num_nodes = network.network.number_of_nodes()
+    rng = np.random.RandomState(0)
+    start_ts = np.datetime64("2019-06-30T07:40:39.951")
+    requests = [(src, dst, [start_ts, start_ts + np.timedelta64(int(duration_ms), 'ms')])
+                for src, dst, duration_ms
+                in zip(rng.randint(0, num_nodes, num_requests).tolist(),
+                       rng.randint(0, num_nodes, num_requests).tolist(),
+                       rng.randint(10000, 60000, num_requests).tolist())]
+    for src, dst, _ in requests:
+        network.get_shortest_path_bw_id(src, dst)
+
+    results = {"numNodes": num_nodes, "numRequests": num_requests}
+    start_time = time.perf_counter()
+    loop_paths = [get_interpolated_path_loop(network, src, dst, ts_arr,
+                                             interpolate_time_sec)
+                  for src, dst, ts_arr in requests]
+    results["loopSec"] = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    single_paths = [network.get_interpolated_path(src, dst, ts_arr,
+                                                  interpolate_time_sec)
+                    for src, dst, ts_arr in requests]
+    results["perRequestSec"] = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    batch_paths = network.get_interpolated_paths(requests, interpolate_time_sec)
+    results["batchSec"] = time.perf_counter() - start_time
+
+    results["numPoints"] = sum(len(path) for path in batch_paths if path)
+    results["sameAsPerRequest"] = single_paths == batch_paths
+    max_diff = 0.0
+    same_points = True
+    for loop_path, batch_path in zip(loop_paths, batch_paths):
+        if loop_path is None or batch_path is None:
+            same_points &= loop_path is batch_path
+            continue
+        if len(loop_path) != len(batch_path):
+            same_points = False
+            continue
+        for loop_ele, batch_ele in zip(loop_path, batch_path):
+            max_diff = max(max_diff, abs(loop_ele[1] - batch_ele[1]),
+                           abs(loop_ele[2] - batch_ele[2]),
+                           abs(loop_ele[3] - batch_ele[3]),
+                           abs((loop_ele[0] - batch_ele[0]).total_seconds()))
+    results["samePointsAsLoop"] = same_points
+    results["maxDiffFromLoop"] = max_diff
+    network.init_path_cache()
+    return results
+
+
+def bench_geo_conversion(windows, config, num_points=100000,
+                         origin=(-121.97, 37.37)):
+    """
+    Flat earth conversions and distances of num_points random (lng,lat)
+    points around origin: one point at a time (geo.core.spatial scalar
+    functions) and as arrays. The array versions should give the same
+    results (up to rounding)
+
+    Returns:
+        dict -- benchmark results
+    """
+    rng = np.random.RandomState(0)
+    lnglat_arr = np.column_stack([origin[0] + rng.uniform(-0.05, 0.05, num_points),
+                                  origin[1] + rng.uniform(-0.05, 0.05, num_points)])
+    lnglat_list = lnglat_arr.tolist()
+    xy_arr = spatial.get_flat_earth_coords(origin, lnglat_arr)
+    xy_list = xy_arr.tolist()
+    cases = [
+        ("toFlatEarth",
+         lambda: [spatial.get_flat_earth_coord(origin, pt) for pt in lnglat_list],
+         lambda: spatial.get_flat_earth_coords(origin, lnglat_arr)),
+        ("toLngLat",
+         lambda: [spatial.get_lng_lat_coord(origin, pt) for pt in xy_list],
+         lambda: spatial.get_lng_lat_coords(origin, xy_arr)),
+        ("eucDist",
+         lambda: [spatial.get_euc_dist(pt1, pt2) for pt1, pt2 in zip(xy_list, xy_list[1:])],
+         lambda: spatial.get_euc_dists(xy_arr[:-1], xy_arr[1:])),
+        ("radAngle",
+         lambda: [spatial.get_radangle_flat_earth(pt1, pt2)
+                  for pt1, pt2 in zip(xy_list, xy_list[1:])],
+         lambda: spatial.get_radangles_flat_earth(xy_arr[:-1], xy_arr[1:])),
+        ("geoDistKm",
+         lambda: [spatial.geo_distance_in_km(pt1, pt2)
+                  for pt1, pt2 in zip(lnglat_list, lnglat_list[1:])],
+         lambda: spatial.geo_distances_in_km(lnglat_arr[:-1], lnglat_arr[1:])),
+    ]
+    results = {"numPoints": num_points}
+    for name, loop_fn, array_fn in cases:
+        start_time = time.perf_counter()
+        loop_out = np.array(loop_fn(), dtype=np.float64)
+        loop_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        array_out = array_fn()
+        array_time = time.perf_counter() - start_time
+        results[name] = {"loopSec": loop_time, "arraySec": array_time,
+                         "maxRelDiff": float(np.max(np.abs(array_out - loop_out) /
+                                                    np.maximum(np.abs(loop_out), 1e-12)))}
+    return results
+
+
+# Run in a new interpreter by bench_import_time(): imports the module, and
+# creates a tracker with the config (if any)
+IMPORT_TIME_PROG = """
+import json, resource, sys, time
+start_time = time.perf_counter()
+import {module}
+import_time = time.perf_counter() - start_time
+config = json.loads({config!r})
+start_time = time.perf_counter()
+if config is not None:
+    from code_libs.mctrack import ioutils, mctracker
+    mctracker.MulticamTracker(config)
+    ioutils.load_ignore_regions(config)
+print(json.dumps({{"importSec": import_time,
+                  "initSec": time.perf_counter() - start_time,
+                  "maxRssKb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+# Libraries that are only needed by some features (maps, shapefiles, plots, ...)
+IMPORT_TIME_HEAVY = ("pandas", "networkx", "sklearn", "pysal", "libpysal", "shapely",
+                     "matplotlib", "plotly", "shapefile")
+
+
+def get_import_times(module, config, top=8):
+    """
+    Import a module in a new interpreter (python -X importtime)
+
+    Returns:
+        dict -- import and tracker init time, max RSS, the heavy libraries
+        that were loaded, and the import time of the top level packages
+        that took the longest (self time of all their modules)
+    """
+    code_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([code_dir] + sys.path))
+    prog = IMPORT_TIME_PROG.format(module=module, config=json.dumps(config, default=str),
+                                   heavy=IMPORT_TIME_HEAVY)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", prog], cwd=code_dir,
+                          env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1:]}
+    package_us = {}
+    for line in proc.stderr.splitlines():
+        fields = line[len("import time:"):].split("|")
+        if not line.startswith("import time:") or not fields[0].strip().isdigit():
+            continue
+        package = fields[2].strip().split(".")[0]
+        package_us[package] = package_us.get(package, 0) + int(fields[0])
+    results = json.loads(proc.stdout.strip().splitlines()[-1])
+    results["packageMs"] = {package: this_us / 1000.0 for package, this_us
+                            in sorted(package_us.items(), key=lambda ele: -ele[1])[:top]}
+    return results
+
+
+def bench_import_time(windows, config):
+    """
+    Startup cost of the tracker modules, each in a new interpreter: import
+    time (with a per package breakdown), time to create the tracker, max
+    RSS, and which of the feature specific libraries got loaded. The
+    tracker and the ignore regions are created (as at the start of the
+    stream and batch trackers) without MAP_INFO (the common case), and with
+    it if the config has a map
+
+    Returns:
+        dict -- benchmark results
+    """
+    no_map_config = {key: value for key, value in config.items() if key != "MAP_INFO"}
+    results = {
+        "mctracker": get_import_times("code_libs.mctrack.mctracker", no_map_config),
+        "mctrackbatch": get_import_times("code_libs.mctrack.mctrackbatch", no_map_config),
+        "mctrackstream": get_import_times("code_libs.mctrack.mctrackstream", no_map_config),
+    }
+    if config.get("MAP_INFO", None) is not None:
+        results["mctrackerWithMap"] = get_import_times("code_libs.mctrack.mctracker",
+                                                       config)
+    return results
+
+
+def get_synthetic_fov(json_list):
+    """
+    Create a FOV polygon for each sensor: the bounding box of its detections
+
+    Returns:
+        dict -- key: sensor id, value: polygon (list of points)
+    """
+    sensor_points = {}
+    for json_ele in json_list:
+        point = trackerutils.get_xy(json_ele)
+        if point is not None:
+            sensor_points.setdefault(json_ele["sensor"]["id"], []).append(point)
+    fov_dict = {}
+    for sensor_id, points in sensor_points.items():
+        points = np.asarray(points, dtype=np.float64)
+        min_x, min_y = points.min(axis=0).tolist()
+        max_x, max_y = points.max(axis=0).tolist()
+        fov_dict[sensor_id] = [(min_x, min_y), (max_x, min_y),
+                               (max_x, max_y), (min_x, max_y)]
+    return fov_dict
+
+
+def bench_camera_fov(windows, config):
+    """
+    Compare cross-camera clustering with the camera rules only
+    ("dont_match_cameras_adj_list" derived from the FOV polygons) and with the
+    camera FOV registry (per detection FOV check, linkage per connected
+    component). Uses the CAMERA_FOV of the config, or the bounding box of
+    the detections of each sensor if the config has none
+
+    Returns:
+        dict -- benchmark results
+    """
+    json_list = [json_ele for all_json_list in windows for json_ele in all_json_list]
+    fov_dict = config.get("CAMERA_FOV", None)
+    if not fov_dict:
+        fov_dict = get_synthetic_fov(json_list)
+    start_time = time.perf_counter()
+    registry = camerafov.CameraFovRegistry(
+        fov_dict, margin=config.get("CAMERA_FOV_MARGIN_IN_M",
+                                    constants.DEF_CAMERA_FOV_MARGIN_IN_M))
+    dont_match_adj_list = registry.get_dont_match_adj_list()
+    build_time = time.perf_counter() - start_time
+
+    config_rules = copy.deepcopy(config)
+    config_rules.pop("CAMERA_FOV_SHAPEFILE", None)
+    config_rules.pop("CAMERA_FOV", None)
+    config_rules.pop("overlapping_camera_ids", None)
+    config_rules["dont_match_cameras_adj_list"] = dont_match_adj_list
+    config_fov = copy.deepcopy(config_rules)
+    config_fov["CAMERA_FOV"] = fov_dict
+
+    mctracker_obj = mctracker.MulticamTracker(config_fov)
+    results = {"numCameras": len(fov_dict),
+               "numOverlappingPairs": len(registry.get_overlapping_pairs()),
+               "buildTimeSec": build_time,
+               "numProblems": 0, "crossCameraPairs": 0, "feasiblePairs": 0,
+               "disagreeingPairs": 0, "totalPairs": 0,
+               "rulesTimeSec": 0.0, "fovTimeSec": 0.0}
+
+    def comparing_cluster(json_list, max_d, params):
+        start_time = time.perf_counter()
+        fov = mctracker_obj.get_cluster_exact(json_list, max_d, params)
+        results["fovTimeSec"] += time.perf_counter() - start_time
+
+        rules_params = dict(params, camera_fov=None)
+        start_time = time.perf_counter()
+        rules = mctracker_obj.get_cluster_exact(json_list, max_d, rules_params)
+        results["rulesTimeSec"] += time.perf_counter() - start_time
+
+        cameras = np.array([trackerutils.get_camera(json_ele) for json_ele in json_list])
+        cross_camera = np.triu(cameras[:, None] != cameras[None, :], k=1)
+        rows, cols = np.nonzero(cross_camera)
+        feasible = camerafov.CameraFovRegistry.get_feasible_pairs(
+            mctracker_obj.get_fov_visibility(json_list, params), rows, cols)
+        disagree, total = get_pair_disagreement(rules, fov)
+        results["numProblems"] += 1
+        results["crossCameraPairs"] += len(rows)
+        results["feasiblePairs"] += int(feasible.sum())
+        results["disagreeingPairs"] += disagree
+        results["totalPairs"] += total
+        return fov
+
+    mctracker_obj.get_cluster = comparing_cluster
+    for all_json_list in copy.deepcopy(windows):
+        mctracker_obj.process_batch(all_json_list)
+
+    _, results["rulesTrackerTimeSec"], _ = run_tracker(windows, config_rules)
+    _, results["fovTrackerTimeSec"], _ = run_tracker(windows, config_fov)
+    return results
+
+
+def write_synthetic_shapefile(sh_file, num_polygons, num_vertices):
+    """
+    Write a shapefile of num_polygons noisy circles of num_vertices points,
+    with the sensor id in the "sensor" field
+
+    Returns:
+        int -- Number of points written
+    """
+    import shapefile as pyshp
+    rng = np.random.RandomState(0)
+    angles = np.linspace(0.0, 2 * math.pi, num_vertices, endpoint=False)
+    with pyshp.Writer(sh_file, shapeType=pyshp.POLYGON) as writer:
+        writer.field("sensor", "C")
+        for i in range(num_polygons):
+            center = rng.uniform(-1000.0, 1000.0, size=2)
+            radius = 10.0 + rng.uniform(-0.05, 0.05, size=num_vertices)
+            ring = np.stack([center[0] + radius * np.cos(angles),
+                             center[1] + radius * np.sin(angles)], axis=1)
+            writer.poly([ring[::-1].tolist() + [ring[-1].tolist()]])
+            writer.record("{:04d}".format(i % 50))
+    return num_polygons * (num_vertices + 1)
+
+
+def bench_shapefile_cache(windows, config, num_polygons=2000, num_vertices=200,
+                          tolerance=0.1):
+    """
+    Compare reading a polygon shapefile with get_polygons_from_shape_file()
+    and through the geometry cache (first load: parse and save, then
+    memory-mapped loads), with and without simplification. Uses a
+    synthetic shapefile
+
+    Returns:
+        dict -- benchmark results
+    """
+    from code_libs.geo.inout import shapefile
+    tmp_dir = tempfile.mkdtemp(prefix="bench_shapefile_")
+    try:
+        sh_file = os.path.join(tmp_dir, "regions")
+        num_points = write_synthetic_shapefile(sh_file, num_polygons, num_vertices)
+        results = {"numPolygons": num_polygons, "numPoints": num_points}
+
+        start_time = time.perf_counter()
+        features = shapefile.get_polygons_from_shape_file(sh_file,
+                                                          rectangles_only=False)
+        results["parseTimeSec"] = time.perf_counter() - start_time
+
+        for name, this_tolerance in (("", 0.0), ("Simplified", tolerance)):
+            start_time = time.perf_counter()
+            geometry = shapefile.load_geometry_cache(
+                sh_file, "polygon", tolerance=this_tolerance, cache_dir=tmp_dir)
+            results["firstLoad" + name + "TimeSec"] = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            geometry = shapefile.load_geometry_cache(
+                sh_file, "polygon", tolerance=this_tolerance, cache_dir=tmp_dir)
+            geometry.get_polygon_dict("sensor")
+            results["cachedLoad" + name + "TimeSec"] = time.perf_counter() - start_time
+            results["cached" + name + "Points"] = len(geometry.coords)
+
+        geometry = shapefile.load_geometry_cache(sh_file, "polygon",
+                                                 cache_dir=tmp_dir)
+        results["identical"] = (
+            [[list(point) for point in feature["points"]] for feature in features] ==
+            [feature["points"] for feature in geometry.get_features()])
+        results["tolerance"] = tolerance
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return results
+
+
+def get_num_jumps(keys, times, raw_xy, snapped_xy, jump_dist):
+    """
+    Count the jumps of the snapped tracks: steps between two consecutive
+    points of a track where the snapped step is longer than the raw step by
+    more than jump_dist (e.g. the point is snapped to the other lane)
+
+    Returns:
+        int -- Number of jumps
+    """
+    codes = pd.factorize(pd.Series(keys, dtype=object))[0]
+    order = np.lexsort((times, codes))
+    same_track = codes[order][1:] == codes[order][:-1]
+    raw_step = np.hypot(*np.diff(raw_xy[order], axis=0).T)
+    snapped_step = np.hypot(*np.diff(snapped_xy[order], axis=0).T)
+    return int(np.count_nonzero(same_track & (snapped_step - raw_step > jump_dist)))
+
+
+def get_synthetic_lanes(num_tracks=50, num_samples=100, lane_width=3.5,
+                        length=200.0, sigma=1.5, seed=0):
+    """
+    Two parallel lanes (lane_width apart, linked every 50 units) and tracks
+    driving along the first lane, with gaussian position noise
+
+    Returns:
+        tuple -- (lines, keys, times, xy_arr, lane) where lane is the lane
+        (0 or 1) of each point
+    """
+    lines = [[[0.0, 0.0], [length, 0.0]], [[0.0, lane_width], [length, lane_width]]]
+    lines += [[[x, 0.0], [x, lane_width]] for x in np.arange(0.0, length + 1.0, 50.0).tolist()]
+    rng = np.random.RandomState(seed)
+    starts = rng.uniform(0.0, length / 2.0, num_tracks)
+    speeds = rng.uniform(5.0, 15.0, num_tracks)
+    times = np.tile(np.arange(num_samples) * 0.1, num_tracks)
+    keys = np.repeat(np.arange(num_tracks), num_samples).tolist()
+    xs = np.minimum(np.repeat(starts, num_samples) + np.repeat(speeds, num_samples) * times,
+                    length)
+    xy_arr = np.column_stack([xs, np.zeros(len(xs))]) + rng.normal(0.0, sigma, (len(xs), 2))
+    return lines, keys, times, xy_arr, np.zeros(len(xs), dtype=np.int64)
+
+
+def bench_map_matching(windows, config, num_legacy_points=200, jump_dist=2.0):
+    """
+    Snap the replayed detections on the road network (MAP_INFO of the config,
+    or a synthetic grid): each point to the nearest line with
+    MulticamTracker.get_snap_pt() (on num_legacy_points points), each point
+    to the nearest edge (MapMatcher.snap()), and along the tracks
+    (sensor id + object id) with the HMM (MapMatcher.match(), one call per
+    window). Time per point, jumps of the snapped tracks (see
+    get_num_jumps()) and mean snapping distance. The lane switches of
+    nearest-edge and HMM snapping are compared on synthetic parallel lanes
+
+    Returns:
+        dict -- benchmark results
+    """
+    map_info = config.get("MAP_INFO", None)
+    all_json_list = [json_ele for this_json_list in windows for json_ele in this_json_list
+                     if trackerutils.get_xy(json_ele) is not None]
+    if map_info is None:
+        map_info = get_synthetic_map(all_json_list)
+    _, network = networkhelper.load_road_network(map_info)
+    results = {"numPoints": len(all_json_list)}
+    if not all_json_list:
+        return results
+
+    window_data = []
+    for this_json_list in windows:
+        ele_list = [json_ele for json_ele in this_json_list
+                    if trackerutils.get_xy(json_ele) is not None]
+        window_data.append((
+            [trackerutils.get_obj_id_in_sensor(json_ele) for json_ele in ele_list],
+            [iso8601.parse_date(json_ele["@timestamp"]).timestamp()
+             for json_ele in ele_list],
+            np.array([trackerutils.get_xy(json_ele) for json_ele in ele_list],
+                     dtype=np.float64).reshape(-1, 2)))
+    keys = [key for this_keys, _, _ in window_data for key in this_keys]
+    times = np.concatenate([this_times for _, this_times, _ in window_data])
+    raw_xy = np.concatenate([this_xy for _, _, this_xy in window_data])
+
+    mctracker_obj = mctracker.MulticamTracker({})
+    legacy_xy = raw_xy[:num_legacy_points]
+    map_arr = np.array(map_info)
+    start_time = time.perf_counter()
+    for point in legacy_xy.tolist():
+        mctracker_obj.get_snap_pt(point, map_arr)
+    results["legacyNearest"] = {
+        "usPerPoint": 1e6 * (time.perf_counter() - start_time) / len(legacy_xy)}
+
+    for name in ("nearest", "hmm"):
+        matcher = mapmatch.MapMatcher(network, max_dist=constants.MAX_DIST_SNAP_MAP)
+        snapped_list = []
+        start_time = time.perf_counter()
+        for this_keys, this_times, this_xy in window_data:
+            if name == "hmm":
+                snapped, _ = matcher.match(this_keys, this_times, this_xy)
+            else:
+                snapped, _ = matcher.snap(this_xy)
+            snapped_list.append(snapped)
+        time_taken = time.perf_counter() - start_time
+        snapped_xy = np.concatenate(snapped_list)
+        results[name] = dict(
+            matcher.get_stats() if name == "hmm" else {},
+            usPerPoint=1e6 * time_taken / len(raw_xy),
+            numJumps=get_num_jumps(keys, times, raw_xy, snapped_xy, jump_dist),
+            meanSnapDist=float(np.mean(np.hypot(*(snapped_xy - raw_xy).T))))
+
+    lines, lane_keys, lane_times, lane_xy, lanes = get_synthetic_lanes()
+    _, lane_network = networkhelper.load_road_network(lines)
+    matcher = mapmatch.MapMatcher(lane_network, max_dist=constants.MAX_DIST_SNAP_MAP)
+    lane_results = {"numPoints": len(lane_xy)}
+    for name in ("nearest", "hmm"):
+        if name == "hmm":
+            snapped, _ = matcher.match(lane_keys, lane_times, lane_xy)
+        else:
+            snapped, _ = matcher.snap(lane_xy)
+        lane_results[name + "WrongLane"] = int(np.count_nonzero(
+            (snapped[:, 1] > lines[1][0][1] / 2.0) != (lanes == 1)))
+        lane_results[name + "Jumps"] = get_num_jumps(lane_keys, lane_times, lane_xy,
+                                                     snapped, jump_dist)
+    results["lanes"] = lane_results
+    return results
+
+
+def bench_soak(windows, config, sim_hours=SOAK_SIM_HOURS):
+    """
+    Run the tracker for sim_hours of simulated time by replaying the windows
+    over and over (shifted in time). Object ids get a new suffix in each
+    replay, so that old ids never come back (id churn). The state gauges and
+    the traced memory are sampled during the run. The memory should be flat:
+    the largest sample in the second half of the run should not be more than
+    SOAK_MAX_GROWTH times the largest sample in the first half
+
+    Returns:
+        dict -- benchmark results
+    """
+    if not windows:
+        return {"numWindows": 0}
+    first_ts = min(iso8601.parse_date(json_ele["@timestamp"])
+                   for json_ele in windows[0])
+    offsets = [[iso8601.parse_date(json_ele["@timestamp"]) - first_ts
+                for json_ele in all_json_list] for all_json_list in windows]
+    cycle_sec = (max(max(this_offsets) for this_offsets in offsets).total_seconds() +
+                 config.get("resample_time_sec", constants.RESAMPLE_TIME_IN_SEC))
+    num_cycles = max(int(math.ceil(sim_hours * 3600.0 / cycle_sec)), 2)
+    sample_every = max(num_cycles // SOAK_NUM_SAMPLES, 1)
+
+    mctracker_obj = mctracker.MulticamTracker(config)
+    samples = []
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    for cycle in range(num_cycles):
+        cycle_start = first_ts + datetime.timedelta(seconds=cycle * cycle_sec)
+        for all_json_list, this_offsets in zip(windows, offsets):
+            batch = copy.deepcopy(all_json_list)
+            for json_ele, offset in zip(batch, this_offsets):
+                json_ele["@timestamp"] = trackerutils.get_timestamp_str(
+                    cycle_start + offset)
+                obj = json_ele.get("object", {})
+                if obj.get("id", None) is not None:
+                    obj["id"] = "{}-{}".format(obj["id"], cycle)
+            mctracker_obj.process_batch(batch)
+            mctracker_obj.state.retval = []
+        if cycle % sample_every == 0 or cycle == num_cycles - 1:
+            gauges = mctracker_obj.get_state_gauges()
+            traced_bytes, _ = tracemalloc.get_traced_memory()
+            samples.append({
+                "simHours": (cycle + 1) * cycle_sec / 3600.0,
+                "stateBytes": sum(gauge.get("bytes", 0)
+                                  for gauge in gauges.values()),
+                "tracedBytes": traced_bytes,
+                "gauges": gauges})
+    time_taken = time.perf_counter() - start_time
+    tracemalloc.stop()
+
+    half = max(len(samples) // 2, 1)
+    results = {"numWindows": len(windows) * num_cycles,
+               "simHours": num_cycles * cycle_sec / 3600.0,
+               "timeSec": time_taken,
+               "firstSample": samples[0],
+               "lastSample": samples[-1]}
+    for key in ["stateBytes", "tracedBytes"]:
+        first_max = max(sample[key] for sample in samples[:half])
+        second_max = max(sample[key] for sample in samples[half:])
+        results[key + "Growth"] = second_max / float(max(first_max, 1))
+    results["isFlat"] = (results["stateBytesGrowth"] <= SOAK_MAX_GROWTH and
+                         results["tracedBytesGrowth"] <= SOAK_MAX_GROWTH)
+    return results
+
+
+BENCHMARKS = {
+    "match_solver": bench_match_solver,
+    "cluster_engine": bench_cluster_engine,
+    "buffer_pool": bench_buffer_pool,
+    "kernels": bench_kernels,
+    "state_memory": bench_state_memory,
+    "trajectory": bench_trajectory,
+    "ignore_regions": bench_ignore_regions,
+    "raw_records": bench_raw_records,
+    "output_path": bench_output_path,
+    "cluster_aggregation": bench_cluster_aggregation,
+    "road_network": bench_road_network,
+    "shortest_path": bench_shortest_path,
+    "path_interpolation": bench_path_interpolation,
+    "geo_conversion": bench_geo_conversion,
+    "import_time": bench_import_time,
+    "camera_fov": bench_camera_fov,
+    "shapefile_cache": bench_shapefile_cache,
+    "map_matching": bench_map_matching,
+    "soak": bench_soak,
+}
+
+
+def main():
+    """Run a benchmark on a recorded detection file and print the results
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-c", "--config", help="Config file for mctracker",
+                        required=True)
+    parser.add_argument("-i", "--input", help="Recorded json file",
+                        required=True)
+    parser.add_argument("-b", "--bench", help="Benchmark to run",
+                        choices=sorted(BENCHMARKS), required=True)
+    parser.add_argument("--soak-hours", help="Simulated hours (soak benchmark)",
+                        type=float, default=SOAK_SIM_HOURS)
+    args = parser.parse_args()
+
+    config = json.load(open(args.config))
+    windows = replay_windows(args.input, config)
+    if args.bench == "soak":
+        results = bench_soak(windows, config, sim_hours=args.soak_hours)
+    else:
+        results = BENCHMARKS[args.bench](windows, config)
+    print(json.dumps(results, indent=4, default=str))
+
+
+if __name__ == "__main__":
+    main()
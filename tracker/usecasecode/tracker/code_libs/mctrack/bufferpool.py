@@ -0,0 +1,127 @@
+"""
+Reusable work arrays for the per-timestep matrices of the tracker
+"""
+
+__version__ = '0.2'
+
+from collections import OrderedDict
+
+import numpy as np
+
+
+class BufferPool:
+    """
+    A pool of named work arrays. Each name has one flat buffer (per dtype)
+    that grows to the high-water mark of the requested sizes and is reused
+    afterwards, so that computing the distance, cost and mask matrices
+    every timestep does not allocate new arrays.
+
+    NOTE: An array handed out for a name is only valid until the next
+    get() for the same name. Callers that keep a result across timesteps
+    must copy it.
+    """
+
+    def __init__(self, max_triu_sizes=32):
+        """
+        Init method
+
+        Keyword Arguments:
+            max_triu_sizes {int} -- Number of matrix sizes for which the
+                upper triangle indices are kept (least recently used are
+                dropped) (default: {32})
+        """
+        self.buffers = {}  #key: (name, dtype), value: flat np.array
+        self.num_allocs = 0
+        self.num_reuses = 0
+        self.max_triu_sizes = max_triu_sizes
+        self.triu_indices = OrderedDict()  #key: n, value: flat indices
+
+    def get(self, name, shape, dtype=np.float64):
+        """
+        Get a work array with the given shape. The contents are undefined
+
+        Arguments:
+            name {string} -- Name of the buffer
+            shape {tuple} -- Shape of the array
+
+        Keyword Arguments:
+            dtype {np.dtype} -- dtype of the array (default: {np.float64})
+
+        Returns:
+            [np.array] -- Contiguous array view of the buffer
+        """
+        size = int(np.prod(shape))
+        key = (name, np.dtype(dtype))
+        buf = self.buffers.get(key, None)
+        if buf is None or buf.size < size:
+            buf = np.empty(max(size, 1), dtype=dtype)
+            self.buffers[key] = buf
+            self.num_allocs += 1
+        else:
+            self.num_reuses += 1
+        return buf[:size].reshape(shape)
+
+    def get_triu_index(self, num):
+        """
+        Get the flat indices of the upper triangle (without the diagonal)
+        of an nxn matrix. The indices are kept per size, as the number of
+        detections varies between timesteps
+
+        Arguments:
+            num {int} -- Size of the square matrix
+
+        Returns:
+            [np.array] -- flat indices of length n*(n-1)/2
+        """
+        triu_index = self.triu_indices.pop(num, None)
+        if triu_index is None:
+            rows, cols = np.triu_indices(num, k=1)
+            triu_index = rows * num + cols
+            self.num_allocs += 1
+            if len(self.triu_indices) >= self.max_triu_sizes:
+                self.triu_indices.popitem(last=False)
+        else:
+            self.num_reuses += 1
+        self.triu_indices[num] = triu_index  #most recently used last
+        return triu_index
+
+    def get_stats(self):
+        """
+        Get the number of buffers and bytes held by the pool
+
+        Returns:
+            [dict] -- Statistics of the pool
+        """
+        return {"numBuffers": len(self.buffers),
+                "bytes": int(sum(buf.nbytes for buf in self.buffers.values()) +
+                             sum(index.nbytes for index in self.triu_indices.values())),
+                "numTriuSizes": len(self.triu_indices),
+                "numAllocs": self.num_allocs,
+                "numReuses": self.num_reuses}
+
+
+def condensed_dist(dist_matrix, buffer_pool=None, name="condensed"):
+    """
+    Condensed form of the symmetric distance matrix (the upper triangle
+    without the diagonal), same as scipy.spatial.distance.squareform() for
+    a square matrix. The condensed array has the dtype of dist_matrix
+
+    Arguments:
+        dist_matrix {[np.array]} -- nxn symmetric distance matrix
+
+    Keyword Arguments:
+        buffer_pool {BufferPool} -- Pool to take the output array from
+            (default: {None}, a new array is allocated)
+        name {string} -- Name of the buffer (default: {"condensed"})
+
+    Returns:
+        [np.array] -- Condensed distance array of length n*(n-1)/2
+    """
+    num = dist_matrix.shape[0]
+    if buffer_pool is None:
+        rows, cols = np.triu_indices(num, k=1)
+        return dist_matrix[rows, cols]
+    index = buffer_pool.get_triu_index(num)
+    out = buffer_pool.get(name, index.shape, dist_matrix.dtype)
+    np.take(dist_matrix, index, out=out)
+    return out
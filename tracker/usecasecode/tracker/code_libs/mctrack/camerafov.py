@@ -0,0 +1,243 @@
+"""
+Registry of the camera field-of-view (FOV) polygons. It gives which cameras
+do not overlap (the "dont_match_cameras_adj_list" adjacency list of the
+tracker) and, for each detection, which cameras could have seen it
+"""
+
+__version__ = '0.2'
+
+import numpy as np
+
+from code_libs.mctrack import constants
+from code_libs.mctrack import ioutils
+
+
+class CameraFovRegistry:
+    """
+    The FOV polygon of each camera (in the same x,y coordinates as the
+    detections), grown by a margin. The polygons are created and prepared
+    once. Their bounding boxes are kept in one array, which is the spatial
+    index: points (and other polygons) are tested against the bounding boxes
+    of all cameras at once, and only the candidates that fall inside a
+    bounding box are tested against the polygon.
+
+    Cameras that are not in the registry have no FOV constraint
+    """
+
+    def __init__(self, fov_dict, margin=constants.DEF_CAMERA_FOV_MARGIN_IN_M):
+        """
+        Init method
+
+        Arguments:
+            fov_dict {dict} -- dictionary containing
+                key = camera (sensor) id
+                value = list of points (x,y) of the FOV polygon, or the
+                    polygon (shapely geometry, e.g. with holes or several
+                    parts)
+
+        Keyword Arguments:
+            margin {float} -- Distance by which the polygons are grown
+                (default: {constants.DEF_CAMERA_FOV_MARGIN_IN_M})
+        """
+        import shapely
+        from shapely.prepared import prep
+        self.contains_xy = ioutils.get_contains_xy()
+        self.cameras = list(fov_dict)
+        self.index = {camera: i for i, camera in enumerate(self.cameras)}
+        polygons = [ioutils.get_polygon(fov_dict[camera]) for camera in self.cameras]
+        if margin:
+            polygons = [polygon.buffer(margin) for polygon in polygons]
+        self.polygons = np.empty(len(polygons), dtype=object)
+        self.polygons[:] = polygons
+        if self.contains_xy is not None:
+            shapely.prepare(self.polygons)
+            self.prepared = None
+        else:
+            self.prepared = [prep(polygon) for polygon in polygons]
+        self.bounds = np.array([polygon.bounds for polygon in polygons],
+                               dtype=np.float64).reshape(-1, 4)
+
+    @classmethod
+    def from_shapefile(cls, sh_file, id_field=constants.DEF_CAMERA_FOV_ID_FIELD,
+                       margin=constants.DEF_CAMERA_FOV_MARGIN_IN_M,
+                       tolerance=0.0, cache_dir=None):
+        """
+        Load the FOV polygons from a shapefile, through the geometry cache
+        (see geo.inout.shapefile.load_geometry_cache())
+
+        Arguments:
+            sh_file {string} -- The shapefile
+
+        Keyword Arguments:
+            id_field {string} -- Field of the shapefile records that has the
+                camera id (default: {constants.DEF_CAMERA_FOV_ID_FIELD})
+            margin {float} -- Distance by which the polygons are grown
+                (default: {constants.DEF_CAMERA_FOV_MARGIN_IN_M})
+            tolerance {float} -- Simplify the polygons with this tolerance
+                (default: {0.0}, no simplification)
+            cache_dir {string} -- The geometry cache directory (default:
+                {None}, no cache)
+
+        Returns:
+            [CameraFovRegistry] -- The registry
+        """
+        from shapely.ops import unary_union
+        from code_libs.geo.inout import shapefile
+        poly_dict = shapefile.load_geometry_cache(
+            sh_file, "polygon", tolerance=tolerance,
+            cache_dir=cache_dir).get_polygon_dict(id_field)
+        # A camera with several polygons (records or parts) sees their union
+        fov_dict = {camera: (polygons[0] if len(polygons) == 1
+                             else unary_union(polygons))
+                    for camera, polygons in poly_dict.items()}
+        return cls(fov_dict, margin=margin)
+
+    def get_overlapping_pairs(self):
+        """
+        Get the pairs of cameras whose FOV polygons intersect
+
+        Returns:
+            [set] -- (i, j) index pairs (i < j) of the overlapping cameras
+        """
+        bounds = self.bounds
+        in_bbox = ((bounds[:, None, 0] <= bounds[None, :, 2]) &
+                   (bounds[:, None, 1] <= bounds[None, :, 3]) &
+                   (bounds[:, None, 2] >= bounds[None, :, 0]) &
+                   (bounds[:, None, 3] >= bounds[None, :, 1]))
+        return set((i, j) for i, j in zip(*np.nonzero(np.triu(in_bbox, k=1)))
+                   if self.polygons[i].intersects(self.polygons[j]))
+
+    def get_overlap_adj_list(self):
+        """
+        Get the cameras whose FOV polygons intersect
+
+        Returns:
+            [dict] -- Adjacency list (key: camera id, value: list of the
+            cameras that overlap with it), in the format of the
+            "overlapping_camera_ids" config
+        """
+        adj_list = {camera: [] for camera in self.cameras}
+        for i, j in sorted(self.get_overlapping_pairs()):
+            adj_list[self.cameras[i]].append(self.cameras[j])
+            adj_list[self.cameras[j]].append(self.cameras[i])
+        return adj_list
+
+    def get_dont_match_adj_list(self):
+        """
+        Get the cameras whose FOV polygons do not intersect. Unlike
+        "overlapping_camera_ids", this rule leaves the cameras that are not
+        in the registry unconstrained
+
+        Returns:
+            [dict] -- Adjacency list (key: camera id, value: list of the
+            cameras that do not overlap with it), in the format of the
+            "dont_match_cameras_adj_list" config
+        """
+        overlapping = self.get_overlapping_pairs()
+        adj_list = {camera: [] for camera in self.cameras}
+        for i in range(len(self.cameras)):
+            for j in range(i + 1, len(self.cameras)):
+                if (i, j) not in overlapping:
+                    adj_list[self.cameras[i]].append(self.cameras[j])
+        return adj_list
+
+    def get_visible_mask(self, xs, ys):
+        """
+        Check which cameras could have seen each of the points
+
+        Arguments:
+            xs {np.array} -- x of the points
+            ys {np.array} -- y of the points
+
+        Returns:
+            [np.array] -- bool array of shape (number of points, number of
+            cameras in the registry), True if the point is in the FOV of the
+            camera
+        """
+        bounds = self.bounds
+        in_bbox = ((xs[:, None] >= bounds[None, :, 0]) &
+                   (ys[:, None] >= bounds[None, :, 1]) &
+                   (xs[:, None] <= bounds[None, :, 2]) &
+                   (ys[:, None] <= bounds[None, :, 3]))
+        point_ind, poly_ind = np.nonzero(in_bbox)
+        if self.contains_xy is not None:
+            # All (point, polygon) candidate pairs in one call
+            in_bbox[point_ind, poly_ind] = self.contains_xy(
+                self.polygons[poly_ind], xs[point_ind], ys[point_ind])
+            return in_bbox
+        from shapely.geometry import Point
+        in_bbox[point_ind, poly_ind] = [
+            self.prepared[j].contains(Point(xs[i], ys[i]))
+            for i, j in zip(point_ind.tolist(), poly_ind.tolist())]
+        return in_bbox
+
+    def get_visibility(self, xs, ys, cameras):
+        """
+        Get which cameras could have seen each of the detections, for
+        get_feasible_pairs()
+
+        Arguments:
+            xs {np.array} -- x of the detections
+            ys {np.array} -- y of the detections
+            cameras {list} -- camera id of each detection
+
+        Returns:
+            [tuple] -- (visible, cam_index). visible is a bool array of shape
+            (number of detections, number of cameras in the registry + 1),
+            True if the detection is in the FOV of the camera. cam_index is
+            the column of the camera of each detection. Cameras that are not
+            in the registry map to the last column (always True)
+        """
+        visible = np.ones((len(xs), len(self.cameras) + 1), dtype=bool)
+        visible[:, :-1] = self.get_visible_mask(xs, ys)
+        cam_index = np.array([self.index.get(camera, -1) for camera in cameras],
+                             dtype=np.int64)
+        return visible, cam_index
+
+    @staticmethod
+    def get_feasible_pairs(visibility, rows, cols):
+        """
+        Check which pairs of detections could be the same object: each of
+        the two must be in the FOV of the camera of the other one
+
+        Arguments:
+            visibility {tuple} -- (visible, cam_index) of the detections,
+                see get_visibility()
+            rows {np.array} -- index of the first detection of each pair
+            cols {np.array} -- index of the second detection of each pair
+
+        Returns:
+            [np.array] -- bool array, True if the pair is feasible
+        """
+        visible, cam_index = visibility
+        return visible[rows, cam_index[cols]] & visible[cols, cam_index[rows]]
+
+
+def load_camera_fov(config):
+    """
+    Create the camera FOV registry from the config ("CAMERA_FOV" dictionary
+    of camera id to polygon points, or "CAMERA_FOV_SHAPEFILE")
+
+    Arguments:
+        config {dict} -- The tracker config
+
+    Returns:
+        [CameraFovRegistry] -- The registry. None if no FOV is configured
+    """
+    margin = config.get("CAMERA_FOV_MARGIN_IN_M",
+                        constants.DEF_CAMERA_FOV_MARGIN_IN_M)
+    fov_dict = config.get("CAMERA_FOV", None)
+    if fov_dict:
+        return CameraFovRegistry(fov_dict, margin=margin)
+    sh_file = config.get("CAMERA_FOV_SHAPEFILE", None)
+    if sh_file:
+        return CameraFovRegistry.from_shapefile(
+            sh_file,
+            id_field=config.get("CAMERA_FOV_ID_FIELD",
+                                constants.DEF_CAMERA_FOV_ID_FIELD),
+            margin=margin,
+            tolerance=config.get("SHAPEFILE_SIMPLIFY_TOLERANCE",
+                                 constants.DEF_SHAPEFILE_SIMPLIFY_TOLERANCE),
+            cache_dir=config.get("GEOMETRY_CACHE_DIR",
+                                 constants.DEF_GEOMETRY_CACHE_DIR))
+    return None
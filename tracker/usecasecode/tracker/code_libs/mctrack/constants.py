@@ -21,14 +21,103 @@ APPROX_TIME_PERIOD_TO_PRINT_INFO_IN_SEC = 10.0
 
 # Clustering thresholds
 DEF_CLUS_DIST_THRESH_M = 25.0  #default distance threshold for multi-camera clustering
+DEF_CLUSTER_ENGINE = "exact"   #"exact" (complete linkage) or "greedy" (grid-hash leader clustering for dense scenes)
+CLUSTER_COMPONENT_BATCH_SIZE = 256  #get_cluster_by_component(): max detections per linkage when the small components are linked together
 
 # Matching thresholds
 DEF_MATCH_MAX_DIST_IN_M = 20.0
 MATCH_MAX_DIST_FOR_PULLED_CAR = 10.0
 
+# Match detections that carry an id seen in the previous timestep directly
+# (hash lookup) before running the assignment solver on the rest
+DEF_MATCH_BY_ID_FAST_PATH = True
+
+# Assignment solver for matching: "hungarian" (exact) or "auction"
+# (warm-started from the previous timestep, falls back to exact)
+DEF_MATCH_SOLVER = "hungarian"
+AUCTION_MIN_EPS = 1e-6           # final bid increment, relative to the max cost
+AUCTION_EPS_SCALE_FACTOR = 5.0   # epsilon reduction per scaling phase
+AUCTION_MAX_BIDS_FACTOR = 50     # bids per phase (x problem size) before restarting cold / falling back to exact
+AUCTION_WARM_EPS = 0.05          # first bid increment of a warm-started auction, relative to the max cost
+
+# Reuse preallocated work arrays for the distance/cost matrices
+DEF_USE_BUFFER_POOL = True
+
+# Kernels for the pairwise rules: "auto" (numba if installed, else numpy),
+# "numba", "numpy" or "python" (per-pair loops)
+DEF_KERNEL_BACKEND = "auto"
+
+# Intern the (sensor id, object id) pairs as integers inside the tracker
+DEF_INTERN_OBJECT_IDS = True
+
+# Keep only the fields needed for matching in the state carried to the next
+# timestep (trackerutils.get_compact_rec) instead of the json dicts
+DEF_COMPACT_TRACK_STATE = True
+
+# Per-track ring buffer of the last (t, x, y) samples, for the speed and
+# heading of the tracks (MulticamTracker.get_track_motion()). The tracker
+# output does not use it: off by default, as filling it costs time every
+# timestep
+DEF_USE_TRAJECTORY_BUFFER = False
+DEF_TRAJECTORY_HISTORY_LEN = 8    # samples kept per track
+TRAJECTORY_INIT_CAPACITY = 256    # initial number of track slots (grows as needed)
+
 # How long to hold points for matching
 DEF_CARRY_PRUNE_TIME_SEC = 2.5
 
+# Caps on the state kept across timesteps, so that a long running tracker
+# does not grow without bound. 0 (or None) disables a cap
+DEF_MAX_MATCH_STATS = 10000         # match stats kept (newest are kept)
+DEF_MAX_CLUSTERED_OIDS = 50000      # object ids in clustered_oid_map (least recently updated are evicted)
+DEF_MAX_CARRY_OVER_TRACKS = 5000    # tracks in the carry over list (oldest are evicted)
+MAX_REID_TIMINGS = 100000           # time profile records kept by the streaming tracker
+MAX_KAFKA_LOG_RECS = 100000         # kafka consumer log records kept by the streaming tracker
+# Streaming tracker ("lazy_raw_records" in the config): keep the json text of
+# each record, and on output re-encode only the fields that the tracker
+# changed (see rawrecord). Faster for large records (a few kB, e.g. with place
+# details and signatures), slower for small ones
+DEF_LAZY_RAW_RECORDS = False
+# When the clustered_oid_map or carry over cap is exceeded, evict down to
+# (1 - CAP_EVICT_SLACK) * cap, so that the eviction (a sort) runs once every
+# CAP_EVICT_SLACK * cap new entries instead of every timestep
+CAP_EVICT_SLACK = 0.1
+
+# Directory of the on-disk cache of the built road network (MAP_INFO), see
+# networkhelper.load_road_network(). None: no cache. The stream and batch
+# trackers default it to the directory of the config file
+DEF_ROAD_NETWORK_CACHE_DIR = None
+
+# Camera field-of-view polygons (CAMERA_FOV, or CAMERA_FOV_SHAPEFILE with the
+# camera id in the CAMERA_FOV_ID_FIELD field), see camerafov.CameraFovRegistry.
+# The polygons are grown by CAMERA_FOV_MARGIN_IN_M for all the tests (overlap
+# and point-in-fov), to allow for calibration errors
+DEF_CAMERA_FOV_ID_FIELD = "camera"
+DEF_CAMERA_FOV_MARGIN_IN_M = 2.0
+
+# Shapefile inputs: CAMERA_FOV_SHAPEFILE, IGNORE_DETECTION_SHAPEFILE (ignore
+# regions, sensor id in the IGNORE_DETECTION_ID_FIELD field) and
+# MAP_SHAPEFILE (road network polylines, used if there is no MAP_INFO).
+# The geometries are simplified with SHAPEFILE_SIMPLIFY_TOLERANCE (0: not
+# simplified) and cached in GEOMETRY_CACHE_DIR (None: no cache), see
+# geo.inout.shapefile.load_geometry_cache(). The stream and batch trackers
+# default the cache to the directory of the config file
+DEF_GEOMETRY_CACHE_DIR = None
+DEF_SHAPEFILE_SIMPLIFY_TOLERANCE = 0.0
+DEF_IGNORE_DETECTION_ID_FIELD = "sensor"
+
+# Snapping of the detections to the road network (if SNAP_POINTS_TO_GRAPH,
+# a trackerConfig key defaulting to the constant above; the "hmm" matcher
+# turns it on unless the key is set to false):
+# "nearest" (each point to the nearest line of MAP_INFO) or "hmm" (the points
+# of each track are map-matched on the road network, see
+# network.mapmatch.MapMatcher)
+DEF_MAP_MATCHER = "nearest"
+DEF_MAP_MATCH_SIGMA_IN_M = 2.0            # std dev of the position error
+DEF_MAP_MATCH_BETA_IN_M = 3.0             # scale of |route - straight distance| between two points
+DEF_MAP_MATCH_MAX_CANDIDATES = 8          # candidate edges per point
+DEF_MAP_MATCH_MAX_ROUTE_DIST_IN_M = 50.0  # max route distance between two points of a track
+DEF_MAP_MATCH_MAX_GAP_SEC = 2.5           # a track restarts after this long without points
+
 
 # Not so sensitive features to tune
 # ---------------------------------
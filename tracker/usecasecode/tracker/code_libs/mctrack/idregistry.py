@@ -0,0 +1,112 @@
+"""
+Registry that interns the (sensor id, object id) pairs of the detections as
+small integers
+"""
+
+__version__ = '0.2'
+
+
+class IdRegistry:
+    """
+    Maps each (sensor id, object id) pair to a small integer, once. The
+    tracker keeps only the integers in its structures (object ids of the
+    detections, clustered_oid_map, merged ids, etc.). The external id string
+    ("^S<sensor id>_^O<object id>", see trackerutils.get_obj_id_in_sensor())
+    is created only when the output is written.
+
+    Ids are expired when they have not been referenced by the tracker for
+    a while (see touch() and expire()). Integers are never reused, so an
+    expired id can not be confused with a new one.
+    """
+
+    def __init__(self):
+        self.ids = {}        #key: (sensor id, object id), value: int id
+        self.keys = {}       #key: int id, value: (sensor id, object id)
+        self.last_seen = {}  #key: int id, value: timestamp of last reference
+        self.next_id = 0
+        self.num_expired = 0
+
+    def get_id(self, sensor_id, obj_id):
+        """
+        Get the integer id of the object obj_id of sensor sensor_id. A new id
+        is issued if the pair has not been seen (or has expired)
+
+        Arguments:
+            sensor_id {string} -- Sensor id
+            obj_id {string} -- Object id (as sent by the sensor)
+
+        Returns:
+            [int] -- The integer id
+        """
+        key = (sensor_id, obj_id)
+        int_id = self.ids.get(key, None)
+        if int_id is None:
+            int_id = self.next_id
+            self.next_id += 1
+            self.ids[key] = int_id
+            self.keys[int_id] = key
+        return int_id
+
+    def get_str(self, int_id):
+        """
+        Get the external id string of an integer id
+
+        Arguments:
+            int_id {int} -- The integer id
+
+        Returns:
+            [string] -- "^S<sensor id>_^O<object id>". If int_id is not in the
+            registry (e.g. it is already a string), int_id is returned
+        """
+        if isinstance(int_id, str):
+            return int_id
+        key = self.keys.get(int_id, None)
+        if key is None:
+            return int_id
+        return "^S{}_^O{}".format(key[0], key[1])
+
+    def touch(self, int_ids, timestamp):
+        """
+        Mark the ids as referenced at timestamp
+
+        Arguments:
+            int_ids {iterable} -- The integer ids
+            timestamp {datetime} -- Current timestamp
+        """
+        last_seen = self.last_seen
+        keys = self.keys
+        for int_id in int_ids:
+            if int_id in keys:
+                last_seen[int_id] = timestamp
+
+    def expire(self, timestamp, max_age_sec):
+        """
+        Remove the ids that have not been referenced in the last max_age_sec
+        seconds. Ids that have never been referenced are removed as well
+
+        Arguments:
+            timestamp {datetime} -- Current timestamp
+            max_age_sec {float} -- Maximum time since the last reference
+
+        Returns:
+            [int] -- Number of ids removed
+        """
+        expired = []
+        for int_id in self.keys:
+            this_ts = self.last_seen.get(int_id, None)
+            if this_ts is None or (timestamp - this_ts).total_seconds() > max_age_sec:
+                expired.append(int_id)
+        for int_id in expired:
+            del self.ids[self.keys.pop(int_id)]
+            self.last_seen.pop(int_id, None)
+        self.num_expired += len(expired)
+        return len(expired)
+
+    def get_stats(self):
+        """
+        Returns:
+            [dict] -- Number of live ids, ids issued and ids expired
+        """
+        return {"numLive": len(self.keys),
+                "numIssued": self.next_id,
+                "numExpired": self.num_expired}
@@ -3,84 +3,40 @@
 
 __version__ = '0.2'
 
-import json
+import numpy as np
 
-import iso8601
-from shapely.geometry import Point, Polygon
+from code_libs.mctrack import constants, trackerutils
+from commonlib.ioutils import is_within_time_range, read_json_list, remove_inferred
 
-from code_libs.mctrack import trackerutils
 
-
-def remove_inferred(gt_json_list):
-    """Remove all unnecessary records
-    Unnecessary records = ["reset]
-
-    Arguments:
-        gt_json_list {[list]} -- List of Day2 detection dictionaries
-
-    Returns:
-        [list] -- List of Day2 detection dictionaries with relevant records
+def get_contains_xy():
     """
-    json_list = []
-    id_so_far = 0
-    for json_ele in gt_json_list:
-        event = json_ele.get('event', None)
-        if event is not None:
-            if event.get('type', None) not in ['reset']:
-                json_list.append(json_ele)
-        id_so_far += 1
-    return json_list
-
-
-def is_within_time_range(json_ele, start_time, end_time):
-    """Checks if the day2 dict is within the given timerange
-    [start_time, end_time)
-    NOTE: start_time is inclusive, and end_time is exclusive
-    If start_time is None, then start is not checked
-    If end_time is None, then end is not checked
+    Shapely is imported only when ignore regions are used
 
-    Arguments:
-        json_ele {dict} -- Vehicle detection in day2 schema
-        start_time {datetime} -- start_time
-        end_time {datetime} -- end_time
+    Returns:
+        [function] -- shapely's vectorized point-in-polygon test
+        (shapely >= 2.0), None if not available
     """
-    is_in_range = False
-    json_time = iso8601.parse_date(json_ele["@timestamp"])
-    if start_time is None or json_time >= start_time:
-        # We are after start
-        if end_time is None or json_time < end_time:
-            # We are before end
-            is_in_range = True
-    return is_in_range
+    import shapely
+    return getattr(shapely, "contains_xy", None)
 
 
-def read_json_list(schema_json_file, start_end_times):
+def get_polygon(poly):
     """
-    Read jsons from a file. The file is assumed to contain jsons in
-    day2 schema. Each line will have one record, and no empty or invalid
-    lines
+    Get the shapely polygon of a list of points. Geometries (e.g. the
+    polygons with holes of the shapefile geometry cache) are returned as is
 
     Arguments:
-        schema_json_file {[string]} -- File from which to read jsons
+        poly {list or shapely geometry} -- points (x,y) of the polygon, or
+            the polygon itself
 
     Returns:
-        [list] -- List of Day2 detection dictionaries
+        [shapely geometry] -- The polygon
     """
-    gt_json_list = []
-    start_time = start_end_times.get("start", None)
-    end_time = start_end_times.get("end", None)
-    if start_time is not None:
-        start_time = iso8601.parse_date(start_time)
-    if end_time is not None:
-        end_time = iso8601.parse_date(end_time)
-    with open(schema_json_file, 'r') as fileptr:
-        for line in fileptr:
-            line = line.strip()
-            json_ele = json.loads(line)
-            if is_within_time_range(json_ele, start_time, end_time):
-                gt_json_list.append(json_ele)
-    json_list = remove_inferred(gt_json_list)
-    return json_list
+    if hasattr(poly, "geom_type"):
+        return poly
+    from shapely.geometry import Polygon
+    return Polygon(poly)
 
 
 def create_poly_dict(sensor_polypts_dict):
@@ -93,7 +49,8 @@ def create_poly_dict(sensor_polypts_dict):
     Arguments:
         sensor_polypts_dict {dict} -- dictionary containing
             key = some id (e.g., sensor id)
-            value = list of points (x,y) that make the polygon
+            value = list of polygons, each a list of points (x,y) or
+                a shapely polygon
 
     Returns:
         dict -- dictionary containing
@@ -101,12 +58,180 @@ def create_poly_dict(sensor_polypts_dict):
             value = shapely's polygon object
     """
     poly_dict = {sensor:
-                 [Polygon(poly) for poly in sensor_polypts_dict[sensor]]
+                 [get_polygon(poly) for poly in sensor_polypts_dict[sensor]]
                  for sensor in sensor_polypts_dict
                  }
     return poly_dict
 
 
+class IgnoreRegions:
+    """
+    The regions (polygons) inside which detections are ignored, for each
+    sensor. The polygons are created and prepared once (at config load).
+    Points are tested against them in batches: a bounding box test on
+    coordinate arrays first, then a vectorized point-in-polygon test on the
+    points inside the bounding box of a polygon.
+
+    The result is the same as testing polygon.contains(point) for each point
+    """
+
+    def __init__(self, sensor_polypts_dict):
+        """
+        Init method. Shapely is imported only if there is at least one
+        polygon
+
+        Arguments:
+            sensor_polypts_dict {dict} -- dictionary containing
+                key = some id (e.g., sensor id)
+                value = list of polygons, each a list of points (x,y)
+        """
+        self.contains_xy = None
+        self.poly_dict = {}
+        self.prepared_dict = {}
+        self.bounds_dict = {}
+        if not any(len(polygons) for polygons in sensor_polypts_dict.values()):
+            return
+        import shapely
+        from shapely.prepared import prep
+        self.contains_xy = get_contains_xy()
+        self.poly_dict = create_poly_dict(sensor_polypts_dict)
+        for sensor, polygons in self.poly_dict.items():
+            if not polygons:
+                continue
+            if self.contains_xy is not None:
+                polygons = np.array(polygons, dtype=object)
+                shapely.prepare(polygons)
+                self.poly_dict[sensor] = polygons
+            else:
+                self.prepared_dict[sensor] = [prep(polygon) for polygon in polygons]
+            self.bounds_dict[sensor] = np.array(
+                [polygon.bounds for polygon in polygons], dtype=np.float64)
+
+    def get_ignore_mask(self, sensor_id, xs, ys):
+        """
+        Check which points of a sensor fall in its ignore regions
+
+        Arguments:
+            sensor_id {string} -- The sensor id
+            xs {np.array} -- x of the points
+            ys {np.array} -- y of the points
+
+        Returns:
+            [np.array] -- bool array, True if the point is to be ignored
+        """
+        mask = np.zeros(len(xs), dtype=bool)
+        bounds = self.bounds_dict.get(sensor_id, None)
+        if bounds is None or not len(xs):
+            return mask
+        in_bbox = ((xs[:, None] >= bounds[None, :, 0]) &
+                   (ys[:, None] >= bounds[None, :, 1]) &
+                   (xs[:, None] <= bounds[None, :, 2]) &
+                   (ys[:, None] <= bounds[None, :, 3]))
+        if self.contains_xy is not None:
+            # All (point, polygon) candidate pairs in one call
+            point_ind, poly_ind = np.nonzero(in_bbox)
+            inside = self.contains_xy(self.poly_dict[sensor_id][poly_ind],
+                                      xs[point_ind], ys[point_ind])
+            mask[point_ind[inside]] = True
+            return mask
+        from shapely.geometry import Point
+        prepared = self.prepared_dict[sensor_id]
+        for j in np.nonzero(in_bbox.any(axis=0))[0].tolist():
+            candidates = np.nonzero(in_bbox[:, j] & np.logical_not(mask))[0]
+            mask[candidates] = [prepared[j].contains(Point(xs[i], ys[i]))
+                                for i in candidates.tolist()]
+        return mask
+
+    def split(self, json_list):
+        """
+        Split the detections into the ones to keep and the ones that fall
+        into the ignore regions of their sensor. The detections are grouped
+        by sensor and each group is tested at once
+
+        Arguments:
+            json_list {[list]} -- List of Day2 detection dictionaries
+
+        Returns:
+            [tuple] -- (list of detections to keep, list of ignored
+            detections), both in the order of json_list
+        """
+        if not self.bounds_dict:
+            return list(json_list), []
+        sensor_index = {}  #key: sensor id, value: list of indices in json_list
+        for i, ele in enumerate(json_list):
+            sensor_id = ele.get("sensor", {}).get("id", None)
+            if sensor_id in self.bounds_dict:
+                sensor_index.setdefault(sensor_id, []).append(i)
+
+        ignore = np.zeros(len(json_list), dtype=bool)
+        for sensor_id, index in sensor_index.items():
+            points = [trackerutils.get_xy(json_list[i]) for i in index]
+            index = [i for i, point in zip(index, points) if point is not None]
+            points = [point for point in points if point is not None]
+            if not points:
+                continue
+            points = np.asarray(points, dtype=np.float64)
+            ignore[index] = self.get_ignore_mask(sensor_id, points[:, 0],
+                                                 points[:, 1])
+        retval = [ele for ele, this_ignore in zip(json_list, ignore.tolist())
+                  if not this_ignore]
+        ignored_list = [ele for ele, this_ignore in zip(json_list, ignore.tolist())
+                        if this_ignore]
+        return retval, ignored_list
+
+
+def load_shapefile_geometry(sh_file, kind, config):
+    """
+    Read the polygons or polylines of a shapefile through the geometry cache
+    of the config ("GEOMETRY_CACHE_DIR", "SHAPEFILE_SIMPLIFY_TOLERANCE")
+
+    Arguments:
+        sh_file {string} -- The shapefile
+        kind {string} -- "polygon" or "polyline"
+        config {dict} -- The tracker config
+
+    Returns:
+        [GeometryCache] -- The geometries (see
+        geo.inout.shapefile.load_geometry_cache())
+    """
+    from code_libs.geo.inout import shapefile
+    return shapefile.load_geometry_cache(
+        sh_file, kind,
+        tolerance=config.get("SHAPEFILE_SIMPLIFY_TOLERANCE",
+                             constants.DEF_SHAPEFILE_SIMPLIFY_TOLERANCE),
+        cache_dir=config.get("GEOMETRY_CACHE_DIR",
+                             constants.DEF_GEOMETRY_CACHE_DIR))
+
+
+def load_ignore_regions(config):
+    """
+    Create the ignore regions of the config: the polygons of
+    "IGNORE_DETECTION_DICT_MOVING" and, if given, of the shapefile
+    "IGNORE_DETECTION_SHAPEFILE" (sensor id in the
+    "IGNORE_DETECTION_ID_FIELD" field)
+
+    Arguments:
+        config {dict} -- The tracker config
+
+    Returns:
+        [IgnoreRegions] -- The ignore regions. None if there are no
+        polygons (shapely is not imported then)
+    """
+    ignore_dict = config.get("IGNORE_DETECTION_DICT_MOVING", {})
+    sh_file = config.get("IGNORE_DETECTION_SHAPEFILE", None)
+    if sh_file:
+        ignore_dict = {sensor: list(polygons)
+                       for sensor, polygons in ignore_dict.items()}
+        poly_dict = load_shapefile_geometry(sh_file, "polygon", config).get_polygon_dict(
+            config.get("IGNORE_DETECTION_ID_FIELD",
+                       constants.DEF_IGNORE_DETECTION_ID_FIELD))
+        for sensor, polygons in poly_dict.items():
+            ignore_dict.setdefault(sensor, []).extend(polygons)
+    if not any(len(polygons) for polygons in ignore_dict.values()):
+        return None
+    return IgnoreRegions(ignore_dict)
+
+
 def ignore_false_detections(json_list, ignore_dict):
     """
     There might be some areas where vehicle detections are to be ignored
@@ -120,10 +245,16 @@ def ignore_false_detections(json_list, ignore_dict):
                 key = camera name
                 value = list of polygons (shapely.Polygon objects) to be
                     ignored
+            or an IgnoreRegions object (faster for many detections/regions),
+            or None (nothing is ignored)
 
     Returns:
         [list] -- List of json detection dictionaries
     """
+    if not ignore_dict:
+        return list(json_list), []
+    if isinstance(ignore_dict, IgnoreRegions):
+        return ignore_dict.split(json_list)
     retval = []
     ignored_list = []
     for ele in json_list:
@@ -135,6 +266,7 @@ def ignore_false_detections(json_list, ignore_dict):
                 # Check if the point falls within the polygon
                 point = trackerutils.get_xy(ele)
                 if point is not None:
+                    from shapely.geometry import Point
                     point = Point(point)
                     for polygon in ignore_list:
                         if polygon.contains(point):
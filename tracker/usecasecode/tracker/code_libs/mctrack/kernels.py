@@ -0,0 +1,213 @@
+"""
+Kernels for the pairwise rules of the tracker. The kernels work on the
+integer-coded arrays of a batch (camera, class, object and timestamp codes)
+instead of the detection dictionaries.
+
+If Numba is installed, the pair loops are compiled. Otherwise NumPy
+(broadcasting) versions are used. Both produce the same results as the
+per-pair loops in mctracker (the directions may differ from the math module
+in the last bit).
+"""
+
+__version__ = '0.2'
+
+import logging
+import math
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def encode_values(values):
+    """
+    Integer-code a list of hashable values (e.g. camera ids)
+
+    Arguments:
+        values {list} -- The values
+
+    Returns:
+        tuple -- (np.array of codes, dict of value to code)
+    """
+    code_map = {}
+    codes = np.empty(len(values), dtype=np.int64)
+    for i, value in enumerate(values):
+        codes[i] = code_map.setdefault(value, len(code_map))
+    return codes, code_map
+
+
+def cluster_pair_dist_numpy(dist_matrix, cam_codes, class_codes, can_merge,
+                            linked, large_dist):
+    """
+    Apply the inter-camera clustering rules (see
+    MulticamTracker.get_cluster_pair_dist()) to the spatial distance matrix
+    in place
+
+    Arguments:
+        dist_matrix {np.array} -- nxn spatial distance matrix
+        cam_codes {np.array} -- camera code of each detection
+        class_codes {np.array} -- class code of each detection
+        can_merge {np.array} -- bool matrix, [c1, c2] is True if detections
+            from cameras c1 and c2 can be merged (False on the diagonal)
+        linked {np.array} -- bool nxn matrix, True if the two objects have
+            been assigned the same id in the past
+        large_dist {float} -- distance for pairs that should never be
+            clustered
+    """
+    dist_matrix[linked] = 0.0
+    blocked = np.logical_not(can_merge[cam_codes[:, None], cam_codes[None, :]])
+    blocked |= class_codes[:, None] != class_codes[None, :]
+    np.fill_diagonal(blocked, False)
+    dist_matrix[blocked] = large_dist
+
+
+def same_cam_pair_dist_numpy(dist_matrix, obj_codes, ts_codes, class_codes,
+                             merge_same_ts, large_dist):
+    """
+    Apply the single-camera clustering rules (see
+    MulticamTracker.cluster_recs_from_same_cam()) to the spatial distance
+    matrix in place
+
+    Arguments:
+        dist_matrix {np.array} -- nxn spatial distance matrix
+        obj_codes {np.array} -- object id code of each detection
+        ts_codes {np.array} -- timestamp code of each detection
+        class_codes {np.array} -- class code of each detection
+        merge_same_ts {bool} -- constants.MERGE_CLOSE_BBS_FROM_SAME_CAM
+        large_dist {float} -- distance for pairs that should never be
+            clustered
+    """
+    same_id = obj_codes[:, None] == obj_codes[None, :]
+    same_ts = ts_codes[:, None] == ts_codes[None, :]
+    same_ts &= np.logical_not(same_id)
+    diff_class = class_codes[:, None] != class_codes[None, :]
+    diff_class &= np.logical_not(same_id | same_ts)
+    dist_matrix[same_id] = 0.0
+    if not merge_same_ts:
+        dist_matrix[same_ts] = large_dist
+    dist_matrix[diff_class] = large_dist
+
+
+def directions_numpy(first_xy, last_xy, min_dist):
+    """
+    Get the direction of movement (degrees in [0,360)) from the first
+    to the last point of each row
+
+    Arguments:
+        first_xy {np.array} -- kx2 array of first points
+        last_xy {np.array} -- kx2 array of last points
+        min_dist {float} -- The direction is NaN if the points are not more
+            than min_dist apart
+
+    Returns:
+        np.array -- k directions
+    """
+    delta = last_xy - first_xy
+    orientation = np.full(len(delta), np.nan)
+    moved = np.hypot(delta[:, 0], delta[:, 1]) > min_dist
+    angle = np.arctan2(delta[moved, 1], delta[moved, 0])
+    angle[angle < 0.0] += np.pi * 2
+    orientation[moved] = np.degrees(angle)
+    return orientation
+
+if numba is not None:
+
+    @numba.njit(cache=True)
+    def cluster_pair_dist_numba(dist_matrix, cam_codes, class_codes,
+                                can_merge, linked, large_dist):
+        """Numba version of cluster_pair_dist_numpy()"""
+        num = dist_matrix.shape[0]
+        for i in range(num):
+            for j in range(i + 1, num):
+                dist = dist_matrix[i, j]
+                if linked[i, j]:
+                    dist = 0.0
+                if ((not can_merge[cam_codes[i], cam_codes[j]]) or
+                        class_codes[i] != class_codes[j]):
+                    dist = large_dist
+                dist_matrix[i, j] = dist
+                dist_matrix[j, i] = dist
+
+    @numba.njit(cache=True)
+    def same_cam_pair_dist_numba(dist_matrix, obj_codes, ts_codes,
+                                 class_codes, merge_same_ts, large_dist):
+        """Numba version of same_cam_pair_dist_numpy()"""
+        num = dist_matrix.shape[0]
+        for i in range(num):
+            for j in range(i + 1, num):
+                if obj_codes[i] == obj_codes[j]:
+                    dist_matrix[i, j] = 0.0
+                    dist_matrix[j, i] = 0.0
+                elif ts_codes[i] == ts_codes[j]:
+                    if not merge_same_ts:
+                        dist_matrix[i, j] = large_dist
+                        dist_matrix[j, i] = large_dist
+                elif class_codes[i] != class_codes[j]:
+                    dist_matrix[i, j] = large_dist
+                    dist_matrix[j, i] = large_dist
+
+    @numba.njit(cache=True)
+    def directions_numba(first_xy, last_xy, min_dist):
+        """Numba version of directions_numpy()"""
+        num = first_xy.shape[0]
+        orientation = np.empty(num)
+        for k in range(num):
+            delta_x = last_xy[k, 0] - first_xy[k, 0]
+            delta_y = last_xy[k, 1] - first_xy[k, 1]
+            if math.hypot(delta_x, delta_y) > min_dist:
+                angle = math.atan2(delta_y, delta_x)
+                if angle < 0.0:
+                    angle += math.pi * 2
+                orientation[k] = math.degrees(angle)
+            else:
+                orientation[k] = np.nan
+        return orientation
+
+
+class TrackerKernels:
+    """
+    The set of kernels of one backend ("numba" or "numpy")
+    """
+
+    def __init__(self, name, cluster_pair_dist, same_cam_pair_dist,
+                 directions):
+        self.name = name
+        self.cluster_pair_dist = cluster_pair_dist
+        self.same_cam_pair_dist = same_cam_pair_dist
+        self.directions = directions
+
+
+def get_kernels(backend="auto"):
+    """
+    Select the kernels backend
+
+    Arguments:
+        backend {string} -- One of:
+            "auto": numba if installed, numpy otherwise
+            "numba": numba (numpy if numba is not installed)
+            "numpy": numpy
+            "python": None. The per-pair loops in mctracker are used
+
+    Returns:
+        TrackerKernels -- The kernels (None for "python")
+    """
+    if backend == "python":
+        logging.info("Tracker kernels: using python backend")
+        return None
+    if backend not in ["auto", "numba", "numpy"]:
+        logging.error("ERROR: Unknown KERNEL_BACKEND (%s). Using auto", backend)
+        backend = "auto"
+    if backend in ["auto", "numba"]:
+        if numba is not None:
+            logging.info("Tracker kernels: using numba backend (numba %s)",
+                         numba.__version__)
+            return TrackerKernels("numba", cluster_pair_dist_numba,
+                                  same_cam_pair_dist_numba, directions_numba)
+        if backend == "numba":
+            logging.warning("Tracker kernels: numba is not installed")
+    logging.info("Tracker kernels: using numpy backend")
+    return TrackerKernels("numpy", cluster_pair_dist_numpy,
+                          same_cam_pair_dist_numpy, directions_numpy)
@@ -6,6 +6,7 @@ This module is to use Multi-cam tracking in streaming mode
 __version__ = '0.2'
 
 import json
+import os
 from timeit import default_timer as timer
 import logging
 
@@ -21,10 +22,12 @@ def read_schema_and_infer(schema_json_file, config_file="config.json"):
     """
 
     config = json.load(open(config_file))
-    ignore_dict = config.get(
-        "IGNORE_DETECTION_DICT_MOVING", {})
-    # One time creation of polygons
-    ignore_poly_dict = ioutils.create_poly_dict(ignore_dict)
+    config.setdefault("ROAD_NETWORK_CACHE_DIR",
+                      os.path.dirname(os.path.abspath(config_file)))
+    config.setdefault("GEOMETRY_CACHE_DIR",
+                      os.path.dirname(os.path.abspath(config_file)))
+    # One time creation (and preparation) of polygons
+    ignore_poly_dict = ioutils.load_ignore_regions(config)
 
     start_end_times = config.get("timeRange", {})
     resample_time_secs = config.get(
@@ -51,23 +54,17 @@ def read_schema_and_infer(schema_json_file, config_file="config.json"):
             end_time = timer()
 
             state_sizes = {
-                "unidentified_cars": len(mctracker_obj.state.unidentified_cars),
-                "prev_list": len(mctracker_obj.state.prev_list),
-                "carry_over_list": len(mctracker_obj.state.carry_over_list),
-                "retval": len(mctracker_obj.state.retval),
-                "match_stats": len(mctracker_obj.state.match_stats),
-                "possible_parked_cars": len(mctracker_obj.state.possible_parked_cars),
-            }
+                name: gauge["count"] for name, gauge
+                in mctracker_obj.get_state_gauges(with_bytes=False).items()
+                if "count" in gauge}
             logging.info("Re-Id Batch: Time taken: %f: State sizes: %s",
                          float(end_time - start_time), str(state_sizes))
             tmp_ret = mctracker_obj.state.retval
             if tmp_ret is not None:
-                mctracker_obj.remove_all_additional_fields(tmp_ret)
                 retval += tmp_ret
 
             index += 1
 
-    mctracker_obj.remove_all_additional_fields(retval)
     # retval = fix_movement_after_park(retval)
     # retval = super_smooth_end_trajs(retval, prune_dist_thresh=20)
     mctracker_obj.mclogger.close_debug_files()
@@ -7,19 +7,16 @@ __version__ = '0.2'
 import copy
 import logging
 import math
+from collections import deque
 
 import iso8601
 import numpy as np
-import scipy.spatial.distance as ssd
 from scipy.cluster.hierarchy import fcluster, linkage
-from scipy.optimize import linear_sum_assignment
-from scipy.spatial import distance_matrix
-from shapely.geometry import LineString, Point
 
-from code_libs.mctrack import constants, trackerutils, tracklog
+from code_libs.mctrack import (assignment, bufferpool, camerafov, constants,
+                               idregistry, ioutils, kernels, trackerutils,
+                               tracklog, trajectory)
 from code_libs.geo.core import spatial
-from code_libs.euclidean import euchelper
-from code_libs.network import networkhelper
 
 
 class MulticamTrackerConfig:
@@ -37,6 +34,65 @@ class MulticamTrackerConfig:
         self.carry_time_sec = (config
                                .get("CARRY_OVER_LIST_PRUNE_TIME_IN_SEC",
                                     constants.DEF_CARRY_PRUNE_TIME_SEC))
+        self.match_by_id_fast_path = (config
+                                      .get("MATCH_BY_ID_FAST_PATH",
+                                           constants.DEF_MATCH_BY_ID_FAST_PATH))
+        self.cluster_engine = (config
+                               .get("CLUSTER_ENGINE",
+                                    constants.DEF_CLUSTER_ENGINE))
+        self.match_solver = (config
+                             .get("MATCH_SOLVER",
+                                  constants.DEF_MATCH_SOLVER))
+        self.use_buffer_pool = (config
+                                .get("USE_BUFFER_POOL",
+                                     constants.DEF_USE_BUFFER_POOL))
+        self.kernel_backend = (config
+                               .get("KERNEL_BACKEND",
+                                    constants.DEF_KERNEL_BACKEND))
+        self.intern_object_ids = (config
+                                  .get("INTERN_OBJECT_IDS",
+                                       constants.DEF_INTERN_OBJECT_IDS))
+        self.compact_track_state = (config
+                                    .get("COMPACT_TRACK_STATE",
+                                         constants.DEF_COMPACT_TRACK_STATE))
+        self.use_trajectory_buffer = (config
+                                      .get("USE_TRAJECTORY_BUFFER",
+                                           constants.DEF_USE_TRAJECTORY_BUFFER))
+        self.trajectory_history_len = (config
+                                       .get("TRAJECTORY_HISTORY_LEN",
+                                            constants.DEF_TRAJECTORY_HISTORY_LEN))
+        self.max_match_stats = (config
+                                .get("MAX_MATCH_STATS",
+                                     constants.DEF_MAX_MATCH_STATS))
+        self.max_clustered_oids = (config
+                                   .get("MAX_CLUSTERED_OIDS",
+                                        constants.DEF_MAX_CLUSTERED_OIDS))
+        self.max_carry_over_tracks = (config
+                                      .get("MAX_CARRY_OVER_TRACKS",
+                                           constants.DEF_MAX_CARRY_OVER_TRACKS))
+        self.map_matcher = (config
+                            .get("MAP_MATCHER",
+                                 constants.DEF_MAP_MATCHER))
+        # The "hmm" map matcher snaps the points, unless disabled explicitly
+        self.snap_points_to_graph = (config
+                                     .get("SNAP_POINTS_TO_GRAPH",
+                                          constants.SNAP_POINTS_TO_GRAPH or
+                                          self.map_matcher == "hmm"))
+        self.map_match_sigma_m = (config
+                                  .get("MAP_MATCH_SIGMA_IN_M",
+                                       constants.DEF_MAP_MATCH_SIGMA_IN_M))
+        self.map_match_beta_m = (config
+                                 .get("MAP_MATCH_BETA_IN_M",
+                                      constants.DEF_MAP_MATCH_BETA_IN_M))
+        self.map_match_max_candidates = (config
+                                         .get("MAP_MATCH_MAX_CANDIDATES",
+                                              constants.DEF_MAP_MATCH_MAX_CANDIDATES))
+        self.map_match_max_route_dist_m = (config
+                                           .get("MAP_MATCH_MAX_ROUTE_DIST_IN_M",
+                                                constants.DEF_MAP_MATCH_MAX_ROUTE_DIST_IN_M))
+        self.map_match_max_gap_sec = (config
+                                      .get("MAP_MATCH_MAX_GAP_SEC",
+                                           constants.DEF_MAP_MATCH_MAX_GAP_SEC))
 
 
 class MulticamTrackerState:
@@ -82,6 +138,24 @@ class MulticamTrackerState:
                    ignore, or also may be because the detections in those regions
                    are prone to high false-detections (e.g., due to frequent
                    lighting changes)
+                e. "ROAD_NETWORK_CACHE_DIR": Directory where the road-network
+                   built from MAP_INFO is cached, so that it is built only
+                   once per map (see networkhelper.load_road_network()).
+                   "MAP_SHAPEFILE" can be given instead of MAP_INFO: its
+                   polylines are read through the geometry cache
+                   ("GEOMETRY_CACHE_DIR", see ioutils.load_shapefile_geometry())
+                   and split into their 2-point segments
+                f. "CAMERA_FOV" (or "CAMERA_FOV_SHAPEFILE"): The field-of-view
+                   polygon of each camera (see camerafov.load_camera_fov()).
+                   If given, and neither "overlapping_camera_ids" nor
+                   "dont_match_cameras_adj_list" is set, the cameras whose
+                   polygons do not overlap are not matched (cameras without
+                   a polygon are unconstrained). Detections are also only
+                   clustered across cameras if each of them is in the FOV of
+                   the camera of the other. When clustering, neither FOV
+                   rule applies to the detections whose objects were
+                   clustered before (linked by id, see
+                   get_cluster_pair_dist())
 
         Returns: None
         """
@@ -89,6 +163,8 @@ class MulticamTrackerState:
         self.log_config = log_config
 
         #self.unidentified_cars = []
+        # If COMPACT_TRACK_STATE is set, prev_list and carry_over_list hold
+        # compact copies of the json dicts (trackerutils.get_compact_rec)
         self.prev_list = []
         self.prev_timestamp = None
         self.carry_over_list = []   # Unassigned json to be carried  forward to next timestep
@@ -101,10 +177,20 @@ class MulticamTrackerState:
         self.curr_unknown_veh_id = 0
         self.match_id = 0    #indexer for match stats, incremented every process_batch iteration
 
+        self.camera_fov = camerafov.load_camera_fov(config)
+        # True if the camera rules were derived from the FOV polygons. The
+        # detections linked by id are then clustered whatever the FOVs
+        self.camera_rules_from_fov = False
         self.overlapping_camera_ids = config.get("overlapping_camera_ids", {})
         if self.overlapping_camera_ids == {}:  #TJH ADDED
             self.dont_match_cameras_adj_list = config.get(
                 "dont_match_cameras_adj_list", {})
+            if self.dont_match_cameras_adj_list == {} and self.camera_fov is not None:
+                # No camera rules configured: cameras whose FOV polygons do
+                # not overlap are not matched. Cameras without a FOV polygon
+                # are unconstrained
+                self.dont_match_cameras_adj_list = self.camera_fov.get_dont_match_adj_list()
+                self.camera_rules_from_fov = True
             if self.dont_match_cameras_adj_list != {}:
                 self.match_type = 1  # matching everything except cam pairs appearing in this list
             else:
@@ -119,16 +205,34 @@ class MulticamTrackerState:
         self.assume_objs_have_same_id_intra_frame_period = config.get("object_ids_track_across_frames", constants.ASSUME_OBJS_HAVE_SAME_ID_INTRA_FRAME_PERIOD)
             
         self.map_info = config.get("MAP_INFO", None)
+        if self.map_info is None and config.get("MAP_SHAPEFILE", None):
+            self.map_info = ioutils.load_shapefile_geometry(
+                config["MAP_SHAPEFILE"], "polyline", config).get_segments()
         self.dense_map_info = None
         self.road_network = None
 
         self.clustered_oid_map = {}  #key: object_id : {"update_ts": timestamp, "id_set": set(object_ids in this cluster), "id": mctracker cluster id}
         self.curr_cl_obj_id = 0   # current mc tracker cluster id, incremented whenever a new cluster is added
+        # Ids merged into each multi-camera cluster of the current timestep
+        # (key: id() of the representative record of the cluster, value:
+        # list of the object ids of its members), see get_id_list()
+        self.cluster_id_lists = {}
+
+        self.auction_solver = None  # set if the "auction" matching solver is configured
+        self.id_registry = None  # set if INTERN_OBJECT_IDS is configured
+        self.trajectories = None  # set if USE_TRAJECTORY_BUFFER is configured
+        self.map_matcher = None  # set if the "hmm" MAP_MATCHER is configured (with snapping and a map)
+        # Number of entries evicted because a cap (MAX_*) was reached
+        self.num_evicted = {"clusteredOidMap": 0, "carryOverList": 0}
 
         if self.map_info is not None:
-            self.dense_map_info = euchelper.densify_graph(self.map_info)
-            self.road_network = networkhelper.Network(
-                self.dense_map_info, max_point_dist=0.1)
+            # networkx, sklearn, etc. are only loaded if there is a map
+            from code_libs.network import networkhelper
+            self.dense_map_info, self.road_network = networkhelper.load_road_network(
+                self.map_info,
+                cache_dir=config.get("ROAD_NETWORK_CACHE_DIR",
+                                     constants.DEF_ROAD_NETWORK_CACHE_DIR),
+                max_point_dist=0.1)
 
 
 class MulticamTracker:
@@ -185,18 +289,57 @@ class MulticamTracker:
         self.state = MulticamTrackerState(config, verbose_log=verbose_log, log_config=log_config)
         self.mclogger = tracklog.MulticamTrackLogger(config, log_config=log_config)
         self.config = MulticamTrackerConfig(config.get("trackerConfig", {}))
+        if self.config.max_match_stats:
+            # Ring buffer: keep only the newest match stats
+            self.state.match_stats = deque(maxlen=self.config.max_match_stats)
+        if self.config.match_solver == "auction":
+            self.state.auction_solver = assignment.AuctionSolver()
+        elif self.config.match_solver != "hungarian":
+            logging.error("ERROR: Unknown MATCH_SOLVER (%s). Using hungarian",
+                          self.config.match_solver)
+        # Work arrays for the distance/cost matrices, reused across timesteps
+        self.buffer_pool = None
+        if self.config.use_buffer_pool:
+            self.buffer_pool = bufferpool.BufferPool()
+        # Kernels for the pair rules (None: per-pair python loops)
+        self.kernels = kernels.get_kernels(self.config.kernel_backend)
+        if self.config.intern_object_ids:
+            self.state.id_registry = idregistry.IdRegistry()
+            self.mclogger.id_registry = self.state.id_registry
+        if self.config.use_trajectory_buffer:
+            self.state.trajectories = trajectory.TrajectoryBuffer(
+                self.config.trajectory_history_len)
+        if self.config.map_matcher == "hmm":
+            if (self.config.snap_points_to_graph and
+                    self.state.road_network is not None):
+                from code_libs.network import mapmatch
+                self.state.map_matcher = mapmatch.MapMatcher(
+                    self.state.road_network,
+                    sigma=self.config.map_match_sigma_m,
+                    beta=self.config.map_match_beta_m,
+                    max_dist=constants.MAX_DIST_SNAP_MAP,
+                    max_candidates=self.config.map_match_max_candidates,
+                    max_route_dist=self.config.map_match_max_route_dist_m,
+                    max_gap_sec=self.config.map_match_max_gap_sec)
+        elif self.config.map_matcher != "nearest":
+            logging.error("ERROR: Unknown MAP_MATCHER (%s). Using nearest",
+                          self.config.map_matcher)
 
     def init_transforms(self, json_list):
         """
         This method is called as an init method before passing the json schema.
         Some of the work done by this method is:
-        1. Change the object id as a combination of sensor id and object id
+        1. Change the object id as a combination of sensor id and object id.
+           If INTERN_OBJECT_IDS is set, the combination is the integer id
+           from the id registry (see get_obj_id_str())
         2. If the detected object is a "vehicle", and if the license and
            licenseState is "None", then we convert them to empty strings
-        3. If SNAP_POINTS_TO_GRAPH is True, then it will also change the (x,y)
+        3. If SNAP_POINTS_TO_GRAPH is set (trackerConfig, on by default with
+           the "hmm" MAP_MATCHER), then it will also change the (x,y)
            of each vehicle. The (x,y) will be snapped to the road-network edge.
            Snapping is done by projecting the original (x,y) to the nearest
-           point on the nearest edge
+           point on the nearest edge, or with the "hmm" MAP_MATCHER, to the
+           edge that fits the track of the object best
 
         Arguments:
             json_list {[list]} -- [Transformed dictionaries of detections in day2 schema]
@@ -206,7 +349,11 @@ class MulticamTracker:
             if ((json_ele.get("sensor", {}).get("id", None) is not None) and
                     (json_ele.get("object", {}).get("id", None) is not None)):
 
-                json_ele["object"]["id"] = trackerutils.get_obj_id_in_sensor(json_ele)  #make id into sensor id + object id
+                if self.state.id_registry is not None:
+                    json_ele["object"]["id"] = self.state.id_registry.get_id(
+                        json_ele["sensor"]["id"], json_ele["object"]["id"])
+                else:
+                    json_ele["object"]["id"] = trackerutils.get_obj_id_in_sensor(json_ele)  #make id into sensor id + object id
 #            if json_ele.get("object", {}).get("vehicle", None) is not None:
 #                veh = json_ele["object"]["vehicle"]
 #                if veh.get("license", None) is None:
@@ -219,9 +366,9 @@ class MulticamTracker:
             if subplace_rec is not None:
                 subplace_rec['level'] = subplace_rec['level'].upper()
 
-        if constants.SNAP_POINTS_TO_GRAPH:
+        if self.config.snap_points_to_graph:
             self.match_moving_points_to_map(
-                json_list, map_info=self.state.map_info)
+                json_list, map_info=self.state.map_info, track_points=True)
 
     def match_point_to_map(self, json_ele, map_info):
         """
@@ -248,20 +395,66 @@ class MulticamTracker:
                 # -- logging.debug("\tJson ele: {}: Snapping pt  {} to {}"
                 # .format(get_vehicle_string(json_ele), xy, projected_pt))
 
-    def match_moving_points_to_map(self, json_list, map_info):
+    def match_moving_points_to_map(self, json_list, map_info, track_points=False):
         """This method maps all points in the json_list to the nearest points
-        on the map_info
+        on the map_info. If the "hmm" MAP_MATCHER is configured, the points
+        are matched on the road network instead (see match_points_to_network())
 
         Arguments:
             json_list {[list]} -- The list of json schema dictionaries of
             vehicle detection
             map_info {[type]} -- road-network graph as a list of line-strings
+
+        Keyword Arguments:
+            track_points {bool} -- The object ids of json_list are the ids of
+                the single camera tracks (used by the "hmm" MAP_MATCHER)
+                (default: {False})
         """
+        if self.state.map_matcher is not None:
+            self.match_points_to_network(json_list, track_points)
+            return
         map_info = np.array(map_info)
         if map_info is not None:
             for json_ele in json_list:
                 self.match_point_to_map(json_ele, map_info)
 
+    def match_points_to_network(self, json_list, track_points):
+        """
+        Snap the points in the json_list on the road network with the map
+        matcher (network.mapmatch.MapMatcher). The points are map-matched
+        along their tracks (the object id is the track) if track_points,
+        otherwise each point is snapped to the nearest edge. Note that the
+        json_ele are overwritten with the new (x,y)
+
+        Arguments:
+            json_list {[list]} -- The list of json schema dictionaries of
+            vehicle detection
+            track_points {bool} -- Map-match the points along their tracks
+        """
+        ele_list = []
+        xy_list = []
+        for json_ele in json_list:
+            varxy = trackerutils.get_xy(json_ele)
+            if varxy is not None:
+                ele_list.append(json_ele)
+                xy_list.append(varxy)
+        if not ele_list:
+            return
+        map_matcher = self.state.map_matcher
+        if track_points:
+            snapped, matched = map_matcher.match(
+                [trackerutils.get_obj_id(json_ele) for json_ele in ele_list],
+                [iso8601.parse_date(json_ele["@timestamp"]).timestamp()
+                 for json_ele in ele_list],
+                np.array(xy_list, dtype=np.float64))
+        else:
+            snapped, matched = map_matcher.snap(np.array(xy_list, dtype=np.float64))
+        for json_ele, (varx, vary), is_matched in zip(ele_list, snapped.tolist(),
+                                                     matched.tolist()):
+            if is_matched:
+                json_ele["object"]["centroid"]["x"] = varx
+                json_ele["object"]["centroid"]["y"] = vary
+
     # Clustering functions
     def merge_cluster_id_sets(self, merge_obj_id_list):
         """
@@ -309,6 +502,23 @@ class MulticamTracker:
             if delta_time > constants.CLUSTERED_OBJ_ID_PRUNETIME_SEC:
                 del self.state.clustered_oid_map[obj_id]
 
+        # Evict the least recently updated ids if there are too many (high
+        # id churn), down to the cap less the slack (see
+        # constants.CAP_EVICT_SLACK)
+        max_oids = self.config.max_clustered_oids
+        num_evict = len(self.state.clustered_oid_map) - (max_oids or 0)
+        if max_oids and num_evict > 0:
+            num_evict += int(max_oids * constants.CAP_EVICT_SLACK)
+            obj_keys = sorted(
+                self.state.clustered_oid_map,
+                key=lambda obj_id: self.state.clustered_oid_map[obj_id]["update_ts"])
+            for obj_id in obj_keys[:num_evict]:
+                this_dict = self.state.clustered_oid_map.pop(obj_id)
+                this_dict["id_set"].discard(obj_id)
+            self.state.num_evicted["clusteredOidMap"] += num_evict
+            logging.warning("ID list: MAX_CLUSTERED_OIDS (%d) reached. "
+                            "Evicted %d ids", max_oids, num_evict)
+
     def maintain_matched_ids(self, clustered_json_list):
         """Maintain the object ids of the clustered objects
         
@@ -407,31 +617,30 @@ class MulticamTracker:
             retval = []
             # cluster objects across cameras according to the overlapping cameras or non-matching cameras rules
             cluster_assocs = self.get_cluster(json_list, dist_thresh, params)  #cluster_assocs = [len(json_list)] with elements indicating cluster number
-            clusters = set(cluster_assocs)  # unique cluster numbers
+            # Aggregate all clusters at once (members, cameras, mean x/y,
+            # representative and merged ids), see get_cluster_aggregates()
+            clusters = self.get_cluster_aggregates(json_list, cluster_assocs)
 
             final_cid = 0
-            # Create hash for clusters
-            for k in clusters:
-                members = [i for i in range(
-                    len(cluster_assocs)) if cluster_assocs[i] == k]  #get indices of members of cluster
-
-                cluster_cameras = set()
-                for mem in members:
-                    cam_name = trackerutils.get_camera(json_list[mem])
-                    cluster_cameras.add(cam_name)
-
+            for k, members in enumerate(clusters["members"]):
                 rec_list = [json_list[i] for i in members]  # get jsons for cluster members
                 if self.state.assume_objs_have_same_id_intra_frame_period:  # TJH set by config.get("object_ids_track_across_frames", constants.ASSUME_OBJS_HAVE_SAME_ID_INTRA_FRAME_PERIOD)
                     self.maintain_matched_ids(rec_list)  #build/maintain a dict of clustered objects over timesteps
                 # If points from more than one camera is in the same cluster, they are the same
-                if len(cluster_cameras) > 1:  #merge jsons
+                if clusters["multi_cam"][k]:  #merge jsons
                     self.mclogger.log_cluster_points(timestamp, rec_list,
                                                      "C_{}".format(final_cid))
-                    self.smooth_x_y_in_list(rec_list, reason="Clustering points from multiple cameras")
+                    # Same as smooth_x_y_in_list(), with the mean computed for
+                    # all clusters at once
+                    x_rep = clusters["x_mean"][k]
+                    y_rep = clusters["y_mean"][k]
+                    for rec in rec_list:
+                        rec['object']['centroid']['x'] = x_rep
+                        rec['object']['centroid']['y'] = y_rep
                     #self.xfer_attrb_for_1valid_veh(rec_list)  #TJH No specific 'vehicle' processing needed
-                    sel_rec = self.select_rep_member_from_list(rec_list)  # rec_list[len(rec_list) - 1]
-                    
-                    sel_rec["object"]["id_list"] = self.concatenate_member_ids(rec_list)  #used in match_points id_dist_matrix generation: returns/saves list of ids in this cluster that were merged into sel_rec
+                    sel_rec = json_list[clusters["rep"][k]]  # see select_rep_member_from_list()
+
+                    self.state.cluster_id_lists[id(sel_rec)] = clusters["id_lists"][k]  #used in match_points id_dist_matrix generation: list of ids in this cluster that were merged into sel_rec
                     retval.append(sel_rec)
                     final_cid += 1
                 else:
@@ -473,11 +682,97 @@ class MulticamTracker:
              will be substituted with a single point for each cluster
         """
         # Merge points which detections or adjusted detections, ignore 'others' types
+        self.state.cluster_id_lists = {}
         detection_recs = state_recs['detection']
         state_recs['detection'] = self.prune_nearby_points_in_list(timestamp, detection_recs, params)
         return state_recs
     
 
+    def get_cluster_aggregates(self, json_list, cluster_assocs):
+        """
+        Aggregate the clusters of the detections in one pass over the sorted
+        cluster numbers (instead of one pass over all the detections per
+        cluster). For each cluster (in ascending cluster number):
+            members: indices of the members in json_list (in index order)
+            multi_cam: True if the members are from more than one camera
+            x_mean, y_mean: the smoothed location (see smooth_x_y_in_list())
+            rep: index of the representative member
+                (see select_rep_member_from_list())
+            id_lists: ids of the members (see concatenate_member_ids())
+        The smoothed location, representative and ids are computed only for
+        the multi-camera clusters (None for the others)
+
+        Arguments:
+            json_list {[list]} -- The list of json schema dictionaries of
+            vehicle detection
+            cluster_assocs {[list]} -- Cluster number of each detection
+
+        Returns:
+            [dict] -- key: aggregate name (above), value: list with one
+            entry per cluster
+        """
+        order, starts, counts = trackerutils.group_by_label(cluster_assocs)
+        members = np.split(order, starts[1:])
+        cam_codes, _ = kernels.encode_values(
+            [trackerutils.get_camera(json_ele) for json_ele in json_list])
+        cam_codes = cam_codes[order]
+        multi_cam = (np.minimum.reduceat(cam_codes, starts) !=
+                     np.maximum.reduceat(cam_codes, starts))
+        num_clusters = len(starts)
+        aggregates = {"members": members,
+                      "multi_cam": multi_cam.tolist(),
+                      "x_mean": [None] * num_clusters,
+                      "y_mean": [None] * num_clusters,
+                      "rep": [None] * num_clusters,
+                      "id_lists": [None] * num_clusters}
+        if not multi_cam.any():
+            return aggregates
+
+        # Only the members of the multi-camera clusters from here on
+        merged = np.flatnonzero(multi_cam)
+        sel = np.concatenate([members[k] for k in merged])
+        sel_labels = np.repeat(np.arange(len(merged)), counts[merged])
+        recs = [json_list[i] for i in sel]
+
+        # Mean x/y, summed in timestamp order (as smooth_x_y_in_list())
+        ts_order, ts_starts, ts_counts = trackerutils.group_by_label(
+            sel_labels, [rec['@timestamp'] for rec in recs])
+        x_mean = trackerutils.get_group_means(
+            [rec['object']['centroid']['x'] for rec in recs],
+            ts_order, ts_starts, ts_counts)
+        y_mean = trackerutils.get_group_means(
+            [rec['object']['centroid']['y'] for rec in recs],
+            ts_order, ts_starts, ts_counts)
+
+        # Representative (as select_rep_member_from_list()): the last
+        # "detection", else the last one with a videoPath, else the one with
+        # the smallest object id
+        is_det = np.array([rec["event"]["type"] == "detection" for rec in recs],
+                          dtype=bool)
+        has_video = np.array([rec.get("videoPath", "") != "" for rec in recs],
+                             dtype=bool)
+        pref = np.where(is_det, 2, has_video.astype(np.int64))
+        sel_starts = np.concatenate(([0], np.cumsum(counts[merged])[:-1]))
+        best_pref = np.maximum.reduceat(pref, sel_starts)
+        is_best = pref == np.repeat(best_pref, counts[merged])
+        last_best = np.maximum.reduceat(
+            np.where(is_best, np.arange(len(sel)), -1), sel_starts)
+
+        obj_ids = [rec["object"]["id"] for rec in recs]
+        for j, k in enumerate(merged.tolist()):
+            start = sel_starts[j]
+            end = start + counts[k]
+            if best_pref[j] > 0:
+                rep = sel[last_best[j]]
+            else:
+                rep = min(members[k],
+                          key=lambda i: self.get_obj_id_str(json_list[i]))
+            aggregates["x_mean"][k] = x_mean[j]
+            aggregates["y_mean"][k] = y_mean[j]
+            aggregates["rep"][k] = int(rep)
+            aggregates["id_lists"][k] = obj_ids[start:end]
+        return aggregates
+
     def smooth_x_y_in_list(self, rec_list, reason="No reason"):
         """
         This method replaces a vehicle detections in a list by a representative
@@ -485,9 +780,7 @@ class MulticamTracker:
             computed (x,y) = (mean(x_i), mean(y_i)) for all (xi,yi) in rec_list
 
         All the records in the rec_list are updated with the new (x,y)
-        computed. The original (xi, yi) are stored in
-        rec['object']['centroid']['origPoints']
-        where rec is a dict in rec_list
+        computed. The original (xi, yi) are not kept
 
         Arguments:
             rec_list {[list]} -- The list of day2 schema dictionaries of
@@ -518,15 +811,8 @@ class MulticamTracker:
         #        ) for rec in rec_list]
         #x_rep, y_rep = trackerutils.get_max_camy_xy(pts)
 
+        logging.debug("Smoothing %d points: %s", len(rec_list), reason)
         for rec in rec_list:
-            if rec['object']['centroid'].get('origPoints', None) is None:
-                rec['object']['centroid']['origPoints'] = []
-            rec['object']['centroid']['origPoints'].append({
-                "x": rec['object']['centroid']['x'],
-                "y": rec['object']['centroid']['y'],
-                "reason": reason
-            })
-            # rec['object']['centroid']['orig_y'] = rec['object']['centroid']['y']
             rec['object']['centroid']['x'] = x_rep
             rec['object']['centroid']['y'] = y_rep
             
@@ -555,20 +841,22 @@ class MulticamTracker:
                     retval = ele
                     pref = 2
                 elif (pref > 2) and (min_obj_id is None or
-                                    min_obj_id > ele["object"]["id"]):
+                                    min_obj_id > self.get_obj_id_str(ele)):
                     retval = ele
-                    min_obj_id = ele["object"]["id"]
+                    min_obj_id = self.get_obj_id_str(ele)
                     pref = 3
         return retval
 
 
     def get_cluster(self, json_list, max_d, params):
         """
-        This method clusters all detections in the json_list. Currently
-        it:
+        This method clusters all detections in the json_list. With the
+        default "exact" CLUSTER_ENGINE it:
         1. computes distance matrix between detections
         2. hierarchical aggregation
         3. Cuts the dendrogram at max_d
+        With the "greedy" CLUSTER_ENGINE, an approximate grid-hash clustering
+        is used instead (see get_cluster_greedy())
 
         Arguments:
             json_list {[list]} -- The list of json schema dictionaries of
@@ -593,53 +881,429 @@ class MulticamTracker:
                 since this lane is divided, we would not want the detections
                 from both cameras to be merged even though their detections
                 are closeby.
+            c. camera_fov: The camera FOV registry (camerafov.CameraFovRegistry)
+                or None. If given, two detections from different cameras are
+                only clustered if each of them is in the FOV of the camera of
+                the other (see get_fov_visibility()), or if they are linked
+                by id
+            d. camera_rules_from_fov: True if dont_match_cameras_adj_list was
+                derived from the camera FOV polygons. It then does not apply
+                to the detections linked by id
 
         Returns:
             [list] -- Cluster number of each of points in json_list
         """
-        dist_matrix = self.get_distance_matrix(json_list, json_list)
-        rows = cols = dist_matrix.shape[0]
+        if self.config.cluster_engine == "greedy":
+            return self.get_cluster_greedy(json_list, max_d, params)
+        return self.get_cluster_exact(json_list, max_d, params)
+
+    def is_linked(self, ele1, ele2):
+        """
+        Returns if the objects of two detections have been assigned the same
+        id in the past (clustered_oid_map), i.e. if they are linked by id
+
+        Arguments:
+            ele1 {[dict]} -- first detection (in day2 schema)
+            ele2 {[dict]} -- second detection (in day2 schema)
+
+        Returns:
+            [boolean] -- True if the two detections are linked by id
+        """
+        if not self.state.assume_objs_have_same_id_intra_frame_period:  # TJH config.get("object_ids_track_across_frames", constants.ASSUME_OBJS_HAVE_SAME_ID_INTRA_FRAME_PERIOD)
+            return False
+        obj_1_id = trackerutils.get_obj_id(ele1)
+        obj_2_id = trackerutils.get_obj_id(ele2)
+        obj_1_set = (self.state.clustered_oid_map.get(obj_1_id, {}).get("id_set", set()))
+        obj_2_set = (self.state.clustered_oid_map.get(obj_2_id, {}).get("id_set", set()))
+        return obj_1_id in obj_2_set or obj_2_id in obj_1_set
+
+    def get_cluster_pair_dist(self, ele1, ele2, dist, max_d, params):
+        """
+        Get the clustering distance between two detections ele1 and ele2
+        given their spatial distance (dist). The rules are:
+        1. If two objects have been assigned same id in the past (linked
+           by id), then distance = 0
+        2. Detections from the same camera, of different classes, or from
+           cameras that should not be merged (see get_cluster()) get a
+           large distance so that they are never clustered. The camera rule
+           derived from the FOV polygons (params["camera_rules_from_fov"])
+           does not apply to the detections linked by id: the FOV polygons
+           may not cover all of the area where a camera sees an object
+
+        Arguments:
+            ele1 {[dict]} -- first detection (in day2 schema)
+            ele2 {[dict]} -- second detection (in day2 schema)
+            dist {[float]} -- spatial distance between ele1 and ele2
+            max_d {[double]} -- The cut-off distance for clustering
+            params {[dict]} -- Parameters for clustering (see get_cluster())
+
+        Returns:
+            [float] -- The clustering distance
+        """
+        large_dist = max_d * constants.CLUSTER_DIFFT_CAMERAS_LARGE_SCALE_FACTOR
         match_type = params['match_type']
-        for i in range(0, rows):
-            for j in range(i + 1, cols):
-
-                if self.state.assume_objs_have_same_id_intra_frame_period:  # TJH config.get("object_ids_track_across_frames", constants.ASSUME_OBJS_HAVE_SAME_ID_INTRA_FRAME_PERIOD)
-                    # If two objects have been assigned same id in the past, then distance = 0
-                    obj_1_id = trackerutils.get_obj_id(json_list[i])
-                    obj_2_id = trackerutils.get_obj_id(json_list[j])
-                    obj_1_set = (self.state.clustered_oid_map.get(obj_1_id, {}).get("id_set", set()))
-                    obj_2_set = (self.state.clustered_oid_map.get(obj_2_id, {}).get("id_set", set()))
-                    if obj_1_id in obj_2_set or obj_2_id in obj_1_set:
-                        dist_matrix[i][j] = dist_matrix[j][i] = 0.0
-                #cameras_overlap = False when no "overlap" entry covers this camera pair
-                #dont_match_cameras = True when a "dont match" entry covers this camera pair 
-                if trackerutils.get_camera(json_list[i]) == trackerutils.get_camera(json_list[j]):
-                    # same camera, so set dist large to force no matching
-                    dist_matrix[i][j] = dist_matrix[j][i] = max_d * \
-                        constants.CLUSTER_DIFFT_CAMERAS_LARGE_SCALE_FACTOR
-                elif json_list[i]["object"]["classid"] != json_list[j]["object"]["classid"]: #difft classes detected so can't be a match        
-                    dist_matrix[i][j] = dist_matrix[j][i] = max_d * \
-                        constants.CLUSTER_DIFFT_CAMERAS_LARGE_SCALE_FACTOR
-                else:   #not same camera
-                    if match_type == 0:  #   use overlapping cameras rule
-                        if (self.cameras_overlap(json_list[i], json_list[j], params) == False):
-                            # Overlapping cameras = False. Dist so set distance large  to force no matching
-                            dist_matrix[i][j] = dist_matrix[j][i] = max_d * \
-                                constants.CLUSTER_DIFFT_CAMERAS_LARGE_SCALE_FACTOR
-                    elif match_type == 1:  # non-matching cameras rule
-                        if self.dont_match_cameras(json_list[i], json_list[j], params):  #if true, overlapping cameras = {}
-                            # dont match = true for these 2 cameras, so set dist large to force no matching
-                            dist_matrix[i][j] = dist_matrix[j][i] = max_d * \
-                                constants.CLUSTER_DIFFT_CAMERAS_LARGE_SCALE_FACTOR
-                    else: #match_type == 2  No rules so set dist large to force no matching
-                        dist_matrix[i][j] = dist_matrix[j][i] = max_d * \
-                            constants.CLUSTER_DIFFT_CAMERAS_LARGE_SCALE_FACTOR                        
-
-        dist_array = ssd.squareform(dist_matrix)
+        linked = self.is_linked(ele1, ele2)
+        if linked:
+            # If two objects have been assigned same id in the past, then distance = 0
+            dist = 0.0
+        #cameras_overlap = False when no "overlap" entry covers this camera pair
+        #dont_match_cameras = True when a "dont match" entry covers this camera pair
+        if trackerutils.get_camera(ele1) == trackerutils.get_camera(ele2):
+            # same camera, so set dist large to force no matching
+            dist = large_dist
+        elif ele1["object"]["classid"] != ele2["object"]["classid"]: #difft classes detected so can't be a match
+            dist = large_dist
+        elif linked and params.get("camera_rules_from_fov", False):
+            pass  # the FOV derived camera rule does not apply
+        else:   #not same camera
+            if match_type == 0:  #   use overlapping cameras rule
+                if (self.cameras_overlap(ele1, ele2, params) == False):
+                    # Overlapping cameras = False. Dist so set distance large  to force no matching
+                    dist = large_dist
+            elif match_type == 1:  # non-matching cameras rule
+                if self.dont_match_cameras(ele1, ele2, params):  #if true, overlapping cameras = {}
+                    # dont match = true for these 2 cameras, so set dist large to force no matching
+                    dist = large_dist
+            else: #match_type == 2  No rules so set dist large to force no matching
+                dist = large_dist
+        return dist
+
+    def get_cluster_exact(self, json_list, max_d, params):
+        """
+        Cluster all detections in the json_list with hierarchical
+        agglomerative clustering (complete linkage) on the distance matrix
+        given by get_cluster_pair_dist(), cut at max_d
+
+        Arguments:
+            json_list {[list]} -- The list of json schema dictionaries of
+            vehicle detection
+            max_d {[double]} -- The cut-off distance
+            params {[dict]} -- Parameters for clustering (see get_cluster())
+
+        Returns:
+            [list] -- Cluster number of each of points in json_list
+        """
+        dist_matrix = self.get_distance_matrix(json_list, json_list,
+                                               buffer_name="cluster_dist")
+        visibility = self.get_fov_visibility(json_list, params)
+        if visibility is not None:
+            return self.get_cluster_exact_fov(json_list, dist_matrix, max_d,
+                                              params, visibility)
+
+        if self.kernels is not None:
+            cam_codes, class_codes, can_merge, linked = self.get_cluster_codes(
+                json_list, params)
+            self.kernels.cluster_pair_dist(
+                dist_matrix, cam_codes, class_codes, can_merge, linked,
+                max_d * constants.CLUSTER_DIFFT_CAMERAS_LARGE_SCALE_FACTOR)
+        else:
+            rows = cols = dist_matrix.shape[0]
+            for i in range(0, rows):
+                for j in range(i + 1, cols):
+                    dist_matrix[i][j] = dist_matrix[j][i] = self.get_cluster_pair_dist(
+                        json_list[i], json_list[j], dist_matrix[i][j], max_d, params)
+
+        dist_array = bufferpool.condensed_dist(dist_matrix, self.buffer_pool,
+                                               "cluster_condensed")
         z_val = linkage(dist_array, 'complete')
         clusters = fcluster(z_val, max_d, criterion='distance')
         return clusters
 
+    def get_cluster_exact_fov(self, json_list, dist_matrix, max_d, params,
+                              visibility):
+        """
+        get_cluster_exact() with a camera FOV registry. Only the pairs that
+        can end up in the same cluster (within max_d, or linked through the
+        clustered object ids) and that pass the FOV check (or are linked)
+        get the clustering distance (get_cluster_pair_dist()). The other
+        pairs get the large distance, which gives the same clusters once cut
+        at max_d. Large problems are linked per connected component (see
+        get_cluster_by_component())
+
+        Arguments:
+            json_list {[list]} -- The list of json schema dictionaries of
+            vehicle detection
+            dist_matrix {[np.array]} -- nxn spatial distance matrix (it is
+            overwritten)
+            max_d {[double]} -- The cut-off distance
+            params {[dict]} -- Parameters for clustering (see get_cluster())
+            visibility {tuple} -- The visibility of the detections (see
+            get_fov_visibility())
+
+        Returns:
+            [np.array] -- Cluster number of each of points in json_list
+        """
+        large_dist = max_d * constants.CLUSTER_DIFFT_CAMERAS_LARGE_SCALE_FACTOR
+        cam_codes, class_codes, can_merge, linked = self.get_cluster_codes(
+            json_list, params)
+        rows, cols = np.nonzero(np.triu((dist_matrix <= max_d) | linked, k=1))
+        feasible = camerafov.CameraFovRegistry.get_feasible_pairs(
+            visibility, rows, cols)
+        feasible |= linked[rows, cols]
+        rows = rows[feasible]
+        cols = cols[feasible]
+        if self.kernels is not None:
+            # Same rules as kernels.cluster_pair_dist_numpy(), on the pairs
+            pair_dist = np.where(linked[rows, cols], 0.0, dist_matrix[rows, cols])
+            blocked = np.logical_not(can_merge[cam_codes[rows], cam_codes[cols]])
+            if params.get("camera_rules_from_fov", False):
+                blocked &= np.logical_not(linked[rows, cols])
+                blocked |= cam_codes[rows] == cam_codes[cols]
+            blocked |= class_codes[rows] != class_codes[cols]
+            pair_dist[blocked] = large_dist
+        else:
+            pair_dist = np.array(
+                [self.get_cluster_pair_dist(json_list[i], json_list[j],
+                                            dist_matrix[i][j], max_d, params)
+                 for i, j in zip(rows.tolist(), cols.tolist())],
+                dtype=np.float64)
+        dist_matrix.fill(large_dist)
+        np.fill_diagonal(dist_matrix, 0.0)
+        dist_matrix[rows, cols] = dist_matrix[cols, rows] = pair_dist
+        if len(json_list) <= constants.CLUSTER_COMPONENT_BATCH_SIZE:
+            # Would be one batch of get_cluster_by_component() anyway
+            dist_array = bufferpool.condensed_dist(dist_matrix, self.buffer_pool,
+                                                   "cluster_condensed")
+            return fcluster(linkage(dist_array, 'complete'), max_d,
+                            criterion='distance')
+        within = pair_dist <= max_d
+        return self.get_cluster_by_component(
+            dist_matrix, max_d, rows[within], cols[within])
+
+    def get_fov_visibility(self, json_list, params):
+        """
+        Get which cameras could have seen each of the detections, according
+        to the camera FOV polygons (params["camera_fov"]). Two detections
+        from different cameras are only clustered if each of them is in the
+        FOV of the camera of the other (see
+        camerafov.CameraFovRegistry.get_feasible_pairs())
+
+        Arguments:
+            json_list {[list]} -- The list of json schema dictionaries of
+            vehicle detection
+            params {[dict]} -- Parameters for clustering (see get_cluster())
+
+        Returns:
+            [tuple] -- The visibility of the detections (see
+            camerafov.CameraFovRegistry.get_visibility()). None if no camera
+            FOV is configured
+        """
+        camera_fov = params.get("camera_fov", None)
+        if camera_fov is None:
+            return None
+        xy_arr = np.array([trackerutils.get_xy(json_ele) for json_ele in json_list],
+                          dtype=float).reshape(-1, 2)
+        return camera_fov.get_visibility(
+            xy_arr[:, 0], xy_arr[:, 1],
+            [trackerutils.get_camera(json_ele) for json_ele in json_list])
+
+    def get_cluster_by_component(self, dist_matrix, max_d, rows, cols):
+        """
+        Same clusters as one complete linkage of dist_matrix cut at max_d
+        (up to the order in which tied distances are merged), but the linkage
+        is run on the connected components of the graph of pairs within
+        max_d. A cluster never spans two components, so the pairs across
+        components (most of them, when the camera FOV rules split the scene)
+        need not be linked. Small components are linked together, up to
+        constants.CLUSTER_COMPONENT_BATCH_SIZE detections per linkage, to
+        save the per call overhead. The cluster numbers are assigned batch
+        by batch
+
+        Arguments:
+            dist_matrix {[np.array]} -- nxn clustering distance matrix
+            max_d {[double]} -- The cut-off distance
+            rows {[np.array]} -- first detection of each pair within max_d
+            cols {[np.array]} -- second detection of each pair within max_d
+
+        Returns:
+            [np.array] -- Cluster number of each of the detections
+        """
+        from scipy.sparse import coo_matrix
+        from scipy.sparse.csgraph import connected_components
+        num = dist_matrix.shape[0]
+        graph = coo_matrix((np.ones(len(rows), dtype=bool), (rows, cols)),
+                           shape=(num, num))
+        _, comp_labels = connected_components(graph, directed=False)
+        comp_sizes = np.bincount(comp_labels)
+        # Detections that are alone in their component are clusters of
+        # their own. The others are linked in batches of components
+        comp_batch = np.full(len(comp_sizes), -1, dtype=np.int64)
+        batch_size = max(constants.CLUSTER_COMPONENT_BATCH_SIZE,
+                         int(comp_sizes.max()))
+        num_batches = 0
+        num_in_batch = batch_size
+        for comp in np.nonzero(comp_sizes > 1)[0].tolist():
+            if num_in_batch + comp_sizes[comp] > batch_size:
+                num_batches += 1
+                num_in_batch = 0
+            comp_batch[comp] = num_batches - 1
+            num_in_batch += comp_sizes[comp]
+
+        det_batch = comp_batch[comp_labels]
+        clusters = np.zeros(num, dtype=np.int64)
+        singles = np.nonzero(det_batch < 0)[0]
+        clusters[singles] = np.arange(1, len(singles) + 1)
+        next_cluster = len(singles) + 1
+        if not num_batches:
+            return clusters
+        index = np.argsort(det_batch, kind="mergesort")[len(singles):]
+        splits = np.cumsum(np.bincount(det_batch[index]))[:-1]
+        for members in np.split(index, splits):
+            dist_array = bufferpool.condensed_dist(
+                dist_matrix[np.ix_(members, members)])
+            z_val = linkage(dist_array, 'complete')
+            batch_clusters = fcluster(z_val, max_d, criterion='distance')
+            clusters[members] = batch_clusters + (next_cluster - 1)
+            next_cluster += int(batch_clusters.max())
+        return clusters
+
+    def get_cluster_codes(self, json_list, params):
+        """
+        Integer-code the detections for the clustering kernels (see
+        kernels.cluster_pair_dist_numpy())
+
+        Arguments:
+            json_list {[list]} -- The list of json schema dictionaries of
+            vehicle detection
+            params {[dict]} -- Parameters for clustering (see get_cluster())
+
+        Returns:
+            [tuple] -- (camera codes, class codes, camera pair can_merge
+            matrix, linked object matrix)
+        """
+        cam_codes, can_merge = self.get_camera_pair_rules(json_list, params)
+        np.fill_diagonal(can_merge, False)  #same camera: never merged
+        class_codes, _ = kernels.encode_values(
+            [json_ele["object"]["classid"] for json_ele in json_list])
+
+        # Objects that have been assigned the same id in the past
+        num = len(json_list)
+        linked = np.zeros((num, num), dtype=bool)
+        if self.state.assume_objs_have_same_id_intra_frame_period:
+            obj_ids = [trackerutils.get_obj_id(json_ele) for json_ele in json_list]
+            obj_index = {}
+            for i, obj_id in enumerate(obj_ids):
+                obj_index.setdefault(obj_id, []).append(i)
+            # The detections that share a clustered_oid_map entry share its
+            # id_set: each id_set is resolved once, and linked by blocks
+            groups = {}  #key: id() of the entry, value: (id_set, rows)
+            for i, obj_id in enumerate(obj_ids):
+                entry = self.state.clustered_oid_map.get(obj_id, None)
+                if entry:
+                    groups.setdefault(id(entry), (entry.get("id_set", ()), []))[1].append(i)
+            for id_set, rows in groups.values():
+                cols = [j for linked_id in id_set for j in obj_index.get(linked_id, ())]
+                if cols:
+                    linked[np.ix_(rows, cols)] = True
+            linked |= linked.T
+        return cam_codes, class_codes, can_merge, linked
+
+    def get_camera_pair_rules(self, json_list, params):
+        """
+        Evaluate the camera rules (cameras_overlap() if match_type is 0,
+        dont_match_cameras() if it is 1, nothing allowed if it is 2) once per
+        pair of the cameras of the detections
+
+        Arguments:
+            json_list {[list]} -- The list of json schema dictionaries of
+            vehicle detection
+            params {[dict]} -- Parameters for clustering or matching (see
+            get_cluster())
+
+        Returns:
+            [tuple] -- (camera code of each detection, bool matrix: [c1, c2]
+            is True if the rules allow detections from cameras c1 and c2 to
+            be matched. The diagonal (same camera) follows the rules too)
+        """
+        cam_codes, cam_map = kernels.encode_values(
+            [trackerutils.get_camera(json_ele) for json_ele in json_list])
+        cam_rep = {}
+        for json_ele, code in zip(json_list, cam_codes.tolist()):
+            cam_rep.setdefault(code, json_ele)
+        num_cams = len(cam_map)
+        allowed = np.zeros((num_cams, num_cams), dtype=bool)
+        match_type = params['match_type']
+        if match_type in (0, 1):
+            for cam1 in range(num_cams):
+                for cam2 in range(cam1, num_cams):
+                    if match_type == 0:
+                        allow = self.cameras_overlap(cam_rep[cam1], cam_rep[cam2], params)
+                    else:
+                        allow = not self.dont_match_cameras(cam_rep[cam1], cam_rep[cam2], params)
+                    allowed[cam1, cam2] = allowed[cam2, cam1] = allow
+        return cam_codes, allowed
+
+    def get_cluster_greedy(self, json_list, max_d, params):
+        """
+        Approximate version of get_cluster_exact() for dense scenes. Points
+        are hashed into a grid of max_d sized cells. Each point joins the
+        cluster (found in its own or neighbouring cells, or linked through
+        the clustered object ids) for which the largest distance
+        (get_cluster_pair_dist()) to all members is smallest and within max_d.
+        Otherwise it starts a new cluster. The same camera, class and
+        max distance constraints as the exact clustering hold for every
+        pair in a cluster. The clusters are the same as the exact ones if no
+        pair across two exact clusters is within max_d. Otherwise they depend
+        on the order of the detections and may differ (e.g. a detection
+        within max_d of two clusters joins the closest one, which complete
+        linkage may not do)
+
+        Arguments:
+            json_list {[list]} -- The list of json schema dictionaries of
+            vehicle detection
+            max_d {[double]} -- The cut-off distance
+            params {[dict]} -- Parameters for clustering (see get_cluster())
+
+        Returns:
+            [np.array] -- Cluster number (starting at 1) of each of points
+            in json_list
+        """
+        xy_arr = np.array([trackerutils.get_xy(json_ele) for json_ele in json_list],
+                          dtype=float)
+        visibility = self.get_fov_visibility(json_list, params)
+        large_dist = max_d * constants.CLUSTER_DIFFT_CAMERAS_LARGE_SCALE_FACTOR
+        cells = np.floor(xy_arr / max_d).astype(int)
+        clusters = np.zeros(len(json_list), dtype=int)
+        cluster_members = []
+        grid = {}  #key: cell, value: set of clusters with a member in the cell
+        obj_id_clusters = {}  #key: object id, value: cluster
+        for i, json_ele in enumerate(json_list):
+            cell_x, cell_y = cells[i]
+            candidates = set()
+            for delta_x in (-1, 0, 1):
+                for delta_y in (-1, 0, 1):
+                    candidates.update(grid.get((cell_x + delta_x, cell_y + delta_y), ()))
+            obj_id = trackerutils.get_obj_id(json_ele)
+            if self.state.assume_objs_have_same_id_intra_frame_period:
+                for linked_id in (self.state.clustered_oid_map
+                                  .get(obj_id, {}).get("id_set", ())):
+                    if linked_id in obj_id_clusters:
+                        candidates.add(obj_id_clusters[linked_id])
+
+            best_cluster = None
+            best_dist = None
+            for cluster in candidates:
+                dist = max(self.get_cluster_pair_dist(
+                    json_ele, json_list[k],
+                    float(np.hypot(*(xy_arr[i] - xy_arr[k]))), max_d, params)
+                           if visibility is None or
+                           camerafov.CameraFovRegistry.get_feasible_pairs(
+                               visibility, i, k) or
+                           self.is_linked(json_ele, json_list[k]) else large_dist
+                           for k in cluster_members[cluster])
+                if dist <= max_d and (best_dist is None or dist < best_dist):
+                    best_cluster = cluster
+                    best_dist = dist
+
+            if best_cluster is None:
+                best_cluster = len(cluster_members)
+                cluster_members.append([])
+            cluster_members[best_cluster].append(i)
+            clusters[i] = best_cluster + 1
+            grid.setdefault((cell_x, cell_y), set()).add(best_cluster)
+            obj_id_clusters[obj_id] = best_cluster
+        return clusters
+
 
     def cluster_recs_from_same_cam(self, json_list):
         """
@@ -664,8 +1328,19 @@ class MulticamTracker:
         """
 
         if len(json_list) > 1:
-            dist_matrix = self.get_distance_matrix(json_list, json_list)  #numpy [len(json), len(json)] values euclidean distance
+            dist_matrix = self.get_distance_matrix(json_list, json_list,
+                                                   buffer_name="same_cam_dist")  #numpy [len(json), len(json)] values euclidean distance
             rows = cols = dist_matrix.shape[0]
+            if self.kernels is not None:
+                rows = cols = 0  # Pair rules are applied by the kernel
+                self.kernels.same_cam_pair_dist(
+                    dist_matrix,
+                    kernels.encode_values([rec["object"]["id"] for rec in json_list])[0],
+                    kernels.encode_values([rec["@timestamp"] for rec in json_list])[0],
+                    kernels.encode_values([rec["object"]["classid"] for rec in json_list])[0],
+                    constants.MERGE_CLOSE_BBS_FROM_SAME_CAM,
+                    constants.INTRA_FRAME_PERIOD_CLUST_DIST_IN_M *
+                    constants.INTRA_FRAME_CLUSTER_LARGE_SCALE_FACTOR)
             for i in range(0, rows):
                 for j in range(i + 1, cols):
                     if json_list[i]["object"]["id"] == json_list[j]["object"]["id"]:  #TJH changed second [i]->[j] otherwise sets all dist_matrix elements to zero!
@@ -682,7 +1357,8 @@ class MulticamTracker:
                                 constants.INTRA_FRAME_PERIOD_CLUST_DIST_IN_M *
                                 constants.INTRA_FRAME_CLUSTER_LARGE_SCALE_FACTOR)
 
-            dist_array = ssd.squareform(dist_matrix)  #flattens distance matrix without reverse entries, seems to remove diagonal entries / 2 ie shape = (dist_matrix.size / 2) - (386/2)
+            dist_array = bufferpool.condensed_dist(dist_matrix, self.buffer_pool,
+                                                   "same_cam_condensed")  #same as ssd.squareform(): flattens distance matrix without reverse entries, seems to remove diagonal entries / 2 ie shape = (dist_matrix.size / 2) - (386/2)
             # z_val = The hierarchical clustering encoded as a linkage matrix.
             z_val = linkage(dist_array, 'complete') #Perform hierarchical/agglomerative clustering.
             #cluster_assocs = [len(json_list)] with each element= the cluster number ie assigns each json to a cluster
@@ -760,7 +1436,7 @@ class MulticamTracker:
                  (xy[1] - miny) / float(rangey))
                 for xy in xy_list]
 
-    def merge_costs(self, dist_matrix, id_dist_matrix):
+    def merge_costs(self, dist_matrix, id_dist_matrix, buffer_name=None):
         """
         This method inputs two distance matrices:
         a. spatial distance matrix (dist_matrix): This is a matrix with
@@ -781,13 +1457,18 @@ class MulticamTracker:
             dist_matrix {[np.array]} -- Spatial distance matrix
             id_dist_matrix {[np.array]} -- ID distance matrix
 
+        Keyword Arguments:
+            buffer_name {string} -- If given, the output is written into the
+            work array of this name (see get_work_array()) (default: {None})
+
         Returns:
             [np.array] -- Merged distance matrix
         """
 
         if dist_matrix is not None and id_dist_matrix is not None:
             assert dist_matrix.shape == id_dist_matrix.shape
-            cost_matrix = dist_matrix * id_dist_matrix  #TJH changed to this from loop below..
+            cost_matrix = np.multiply(dist_matrix, id_dist_matrix,
+                                      out=self.get_work_array(buffer_name, dist_matrix.shape))  #TJH changed to this from loop below..
             #cost_matrix = dist_matrix.copy()
             #for i in range(dist_matrix.shape[0]):
             #    for j in range(dist_matrix.shape[1]):
@@ -803,7 +1484,7 @@ class MulticamTracker:
 
 
     def get_distance_matrix(self, prev_json_list, json_list,
-                            dist_norm_parameters=None):
+                            dist_norm_parameters=None, buffer_name=None):
         """
         This method computes the eucledian distance between the detections at
         timestep (t-1) (indicated by prev_json_list) [or could be t json_list repeated] and detections at
@@ -824,6 +1505,8 @@ class MulticamTracker:
             c. "xrange": range of x
             d. "yrange": range of y
             (default: None)
+            buffer_name {string} -- If given, the output is written into the
+            work array of this name (see get_work_array()) (default: {None})
             
         Note: No calls to this fn in mctracker.py include dist_norm_parameters
               Hence the normalise_dist routine defaults to constants.py values which are set to cause no normalisation 
@@ -836,11 +1519,23 @@ class MulticamTracker:
         xy1 = self.normalize_dist(xy1, dist_norm_parameters)
         xy2 = [trackerutils.get_xy(json_ele) for json_ele in json_list]  # [[centroid1], [centroid2],..[centroidn]]
         xy2 = self.normalize_dist(xy2, dist_norm_parameters)
-        dist_matrix = distance_matrix(xy1, xy2)  #computes euclidean dist, shape: [len(xy2), len(xy1)]
+        xy1 = np.array(xy1, dtype=np.float64).reshape(-1, 2)
+        xy2 = np.array(xy2, dtype=np.float64).reshape(-1, 2)
+        # euclidean dist (same as scipy distance_matrix), shape: [len(xy1), len(xy2)]
+        shape = (xy1.shape[0], xy2.shape[0])
+        dist_matrix = self.get_work_array(buffer_name, shape)
+        tmp_matrix = self.get_work_array(
+            None if buffer_name is None else buffer_name + "_tmp", shape)
+        np.subtract.outer(xy1[:, 0], xy2[:, 0], out=dist_matrix)
+        np.square(dist_matrix, out=dist_matrix)
+        np.subtract.outer(xy1[:, 1], xy2[:, 1], out=tmp_matrix)
+        np.square(tmp_matrix, out=tmp_matrix)
+        np.add(dist_matrix, tmp_matrix, out=dist_matrix)
+        np.sqrt(dist_matrix, out=dist_matrix)
         return dist_matrix
 
 
-    def get_obj_id_dist_matrix(self, prev_json_list, json_list):
+    def get_obj_id_dist_matrix(self, prev_json_list, json_list, buffer_name=None):
         """
         This method computes the ID distance between the detections at
         timestep (t-1) (indicated by prev_json_list) and detections at
@@ -861,6 +1556,10 @@ class MulticamTracker:
             json_list {[list]} -- List of json schema based dictionaries
             for detections at timestep (t).
 
+        Keyword Arguments:
+            buffer_name {string} -- If given, the output is written into the
+            work array of this name (see get_work_array()) (default: {None})
+
         Returns:
             [np.array] -- ID distance matrix
         """
@@ -868,16 +1567,24 @@ class MulticamTracker:
         id1 = [self.get_id_list(json_ele) for json_ele in prev_json_list]
         id2 = [self.get_id_list(json_ele) for json_ele in json_list]
 
-        dist_matrix = np.ones((len(id1), len(id2)), dtype=np.int)
-
-        for i in range(len(id1)):
-            iset = set(id1[i])
-            for j in range(len(id2)):
-                jset = set(id2[j])
-                int_set = iset.intersection(jset)
-                # If there is at-least one id common in both
-                if int_set:
-                    dist_matrix[i, j] = 0.0
+        dist_matrix = self.get_work_array(buffer_name, (len(id1), len(id2)),
+                                          dtype=np.int_)
+        dist_matrix.fill(1)
+
+        # Join on the ids: the pairs with at-least one id common in both
+        prev_rows = {}  #key: id, value: rows of prev_json_list with the id
+        for i, ids in enumerate(id1):
+            for obj_id in ids:
+                prev_rows.setdefault(obj_id, []).append(i)
+        rows = []
+        cols = []
+        for j, ids in enumerate(id2):
+            for obj_id in ids:
+                matched = prev_rows.get(obj_id, None)
+                if matched is not None:
+                    rows.extend(matched)
+                    cols.extend([j] * len(matched))
+        dist_matrix[rows, cols] = 0
         return dist_matrix
 
     def match_points(self, prev_json_list, json_list, prev_timestamp,
@@ -923,47 +1630,26 @@ class MulticamTracker:
         match_stats = []
         assigned = []
         assigned_prev = []
-        match_type = params['match_type']  #0=overlapping cameras, 1=non-overlapping cameras, 2=none specified
         # -- logging.debug("\tMatching={},{}".format(num_rows, num_cols))
         if num_rows > 0 and num_cols > 0:
-            dist_matrix = self.get_distance_matrix(prev_json_list, json_list)
-            id_dist_matrix = self.get_obj_id_dist_matrix(prev_json_list, json_list)  #set to 0 where object ids match, 1 otherwise
-            cost_matrix = self.merge_costs(dist_matrix, id_dist_matrix)
-            # Infeasible matchings (all distances more than 'x',
-            # conflicting cameras) should be removed
-            max_val = max(cost_matrix.max(), self.config.match_max_dist_m * 1.1)  # max_val larger than self.config.match_max_dist_m 
-            for i in range(cost_matrix.shape[0]):
-                for j in range(cost_matrix.shape[1]):
-                    if cost_matrix[i][j] > self.config.match_max_dist_m:
-                        cost_matrix[i][j] = max_val
-                    elif trackerutils.get_classid_string(prev_json_list[i]) != trackerutils.get_classid_string(json_list[j]):
-                        cost_matrix[i][j] = max_val
-                    elif match_type == 0:  #overlapping cameras  TJH ADDED, used to just work on dont_match_cameras
-                        if (self.cameras_overlap(prev_json_list[i], json_list[j], params) == False):                        
-                            cost_matrix[i][j] = max_val
-                    elif match_type == 1:  # dont match cameras                  
-                        if self.dont_match_cameras(prev_json_list[i], json_list[j], params):
-                            cost_matrix[i][j] = max_val
-                    else:  #match_type = 2, no matching rules
-                         cost_matrix[i][j] = max_val    
-            final_dist_matrix = copy.deepcopy(cost_matrix)
-            cost_matrix = np.square(cost_matrix)
-            row_ind, col_ind = linear_sum_assignment(cost_matrix) 
-            # linear_sum_assignment: cost_matrix[row_ind, col_ind] is the set of matches ie row_ind[n], col_ind[n] is a match
-
-            # Take away all matchings which exceed certain distance
-            i = 0
-            while i < row_ind.shape[0]:
-                if (final_dist_matrix[row_ind[i]][col_ind[i]] > self.config.match_max_dist_m):
-                    row_ind = np.delete(row_ind, i)    #delete index
-                    col_ind = np.delete(col_ind, i)
-                else:
-                    i += 1
+            # Detections that continue an id seen at (t-1) are matched by
+            # hash lookup. Only the rest go to the assignment solver
+            id_rows, id_cols = [], []
+            if self.config.match_by_id_fast_path:
+                id_rows, id_cols = self.match_points_by_id(
+                    prev_json_list, json_list, params)
+            res_rows = sorted(unassigned_row_indices.difference(id_rows))
+            res_cols = sorted(unassigned_col_indices.difference(id_cols))
+            row_ind, col_ind = self.match_points_by_cost(
+                [prev_json_list[i] for i in res_rows],
+                [json_list[j] for j in res_cols], params)
+            row_ind = id_rows + [res_rows[i] for i in row_ind]
+            col_ind = id_cols + [res_cols[j] for j in col_ind]
 
             for i in range(len(row_ind)):
                 #self.xfer_attrb_for_1valid_veh([prev_json_list[row_ind[i]], json_list[col_ind[i]]])
                 json_list[col_ind[i]]['object']['trackerid'] = trackerutils.get_tracker_string(prev_json_list[row_ind[i]])
-                json_list[col_ind[i]]['object']['id'] = prev_json_list[row_ind[i]]['object']['id']
+                json_list[col_ind[i]]['object']['id'] = trackerutils.get_obj_id(prev_json_list[row_ind[i]])
 
                 self.mclogger.log_match_points(
                     prev_timestamp, prev_json_list[row_ind[i]], timestamp,
@@ -990,7 +1676,7 @@ class MulticamTracker:
                      "isError": error,
                      "rowInd": row_ind[i], "colInd": col_ind[i],
                      "vehicle1": object_t_1,
-                     "time1": prev_json_list[row_ind[i]]['@timestamp'],
+                     "time1": prev_json_list[row_ind[i]]["@timestamp"],
                      "x1": varx1, "y1": vary1, "x2": varx2, "y2": vary2,
                      "cam1": trackerutils.get_camera(
                          prev_json_list[row_ind[i]]),
@@ -1021,17 +1707,254 @@ class MulticamTracker:
                 "carryOver": carry_over_list,
                 "stats": match_stats}
 
+    def is_infeasible_match(self, prev_json_ele, json_ele, params):
+        """
+        Returns if a detection at timestep (t-1) can never be matched with a
+        detection at timestep (t) because of the class or camera rules
+
+        Arguments:
+            prev_json_ele {[dict]} -- detection at timestep (t-1)
+            json_ele {[dict]} -- detection at timestep (t)
+            params {dict} -- Parameters for matching
+
+        Returns:
+            [boolean] -- True if the two detections should not be matched
+        """
+        match_type = params['match_type']
+        if trackerutils.get_classid_string(prev_json_ele) != trackerutils.get_classid_string(json_ele):
+            return True
+        if match_type == 0:  #overlapping cameras
+            return not self.cameras_overlap(prev_json_ele, json_ele, params)
+        if match_type == 1:  # dont match cameras
+            return self.dont_match_cameras(prev_json_ele, json_ele, params)
+        return True  #match_type = 2, no matching rules
+
+    def get_infeasible_matches(self, prev_json_list, json_list, params):
+        """
+        Array version of is_infeasible_match(), for all the pairs of
+        detections at timestep (t-1) and (t)
+
+        Arguments:
+            prev_json_list {[list]} -- The n detections at timestep (t-1)
+            json_list {[list]} -- The m detections at timestep (t)
+            params {dict} -- Parameters for matching
+
+        Returns:
+            [np.array] -- nxm bool matrix, True if the two detections should
+            not be matched
+        """
+        all_json_list = prev_json_list + json_list
+        num_prev = len(prev_json_list)
+        cam_codes, allowed = self.get_camera_pair_rules(all_json_list, params)
+        class_codes, _ = kernels.encode_values(
+            [trackerutils.get_classid_string(json_ele) for json_ele in all_json_list])
+        infeasible = np.logical_not(
+            allowed[cam_codes[:num_prev, None], cam_codes[None, num_prev:]])
+        infeasible |= class_codes[:num_prev, None] != class_codes[None, num_prev:]
+        return infeasible
+
+    def match_points_by_id(self, prev_json_list, json_list, params):
+        """
+        Fast path of match_points(). A detection at timestep (t) is matched
+        to a detection at timestep (t-1) by a hash lookup of its ids (see
+        get_id_list()) when:
+        1. exactly one detection at (t-1) shares an id with it, and no
+           other detection at (t) shares an id with that (t-1) detection
+        2. the two points are within MATCH_MAX_DIST_IN_M
+        3. the class and camera rules allow the match
+
+        Such pairs would get a zero cost in match_points_by_cost(), so
+        removing them leaves the solver with only new or ambiguous objects
+
+        Arguments:
+            prev_json_list {[list]} -- List of json schema based dictionaries
+            for detections at timestep (t-1).
+            json_list {[list]} -- List of json schema based dictionaries
+            for detections at timestep (t).
+            params {dict} -- Parameters for matching
+
+        Returns:
+            [tuple] -- (row_ind, col_ind) lists of matched indices in
+            prev_json_list and json_list
+        """
+        prev_id_map = {}  #key: object id, value: set of indices in prev_json_list
+        for i, prev_json_ele in enumerate(prev_json_list):
+            for obj_id in self.get_id_list(prev_json_ele):
+                prev_id_map.setdefault(obj_id, set()).add(i)
+
+        col_to_row = {}
+        row_hits = {}  #key: index in prev_json_list, value: no. of detections at t sharing an id
+        for j, json_ele in enumerate(json_list):
+            rows = set()
+            for obj_id in self.get_id_list(json_ele):
+                rows.update(prev_id_map.get(obj_id, ()))
+            for i in rows:
+                row_hits[i] = row_hits.get(i, 0) + 1
+            if len(rows) == 1:
+                col_to_row[j] = rows.pop()
+
+        pairs = []
+        prev_pts = []
+        this_pts = []
+        for j, i in col_to_row.items():
+            if row_hits[i] != 1:
+                continue
+            prev_xy = trackerutils.get_xy(prev_json_list[i])
+            this_xy = trackerutils.get_xy(json_list[j])
+            if prev_xy is None or this_xy is None:
+                continue
+            pairs.append((i, j))
+            prev_pts.append(prev_xy)
+            this_pts.append(this_xy)
+
+        row_ind = []
+        col_ind = []
+        if not pairs:
+            return row_ind, col_ind
+        # Distances of all the pairs at once
+        dists = spatial.get_euc_dists(prev_pts, this_pts).tolist()
+        for (i, j), dist in zip(pairs, dists):
+            if dist > self.config.match_max_dist_m:
+                continue
+            if self.is_infeasible_match(prev_json_list[i], json_list[j], params):
+                continue
+            row_ind.append(i)
+            col_ind.append(j)
+        return row_ind, col_ind
+
+    def match_points_by_cost(self, prev_json_list, json_list, params):
+        """
+        Match detections at timestep (t-1) (prev_json_list) with detections
+        at timestep (t) (json_list) by minimum cost bipartite matching
+        (Hungarian algorithm) on the spatial and id distances. Matches
+        further apart than MATCH_MAX_DIST_IN_M are dropped
+
+        Arguments:
+            prev_json_list {[list]} -- List of json schema based dictionaries
+            for detections at timestep (t-1).
+            json_list {[list]} -- List of json schema based dictionaries
+            for detections at timestep (t).
+            params {dict} -- Parameters for matching
+
+        Returns:
+            [tuple] -- (row_ind, col_ind) lists of matched indices in
+            prev_json_list and json_list
+        """
+        if not prev_json_list or not json_list:
+            return [], []
+        dist_matrix = self.get_distance_matrix(prev_json_list, json_list,
+                                               buffer_name="match_dist")
+        id_dist_matrix = self.get_obj_id_dist_matrix(prev_json_list, json_list,
+                                                     buffer_name="match_id_dist")  #set to 0 where object ids match, 1 otherwise
+        cost_matrix = self.merge_costs(dist_matrix, id_dist_matrix,
+                                       buffer_name="match_cost")
+        # Infeasible matchings (all distances more than 'x',
+        # conflicting cameras) should be removed
+        max_val = max(cost_matrix.max(), self.config.match_max_dist_m * 1.1)  # max_val larger than self.config.match_max_dist_m
+        infeasible = self.get_work_array("match_infeasible", cost_matrix.shape,
+                                         dtype=bool)
+        np.greater(cost_matrix, self.config.match_max_dist_m, out=infeasible)
+        infeasible |= self.get_infeasible_matches(prev_json_list, json_list, params)
+        cost_matrix[infeasible] = max_val
+        sq_cost_matrix = np.square(cost_matrix, out=self.get_work_array(
+            "match_sq_cost", cost_matrix.shape))
+        row_ind, col_ind = self.solve_assignment(sq_cost_matrix, json_list)
+        # linear_sum_assignment: cost_matrix[row_ind, col_ind] is the set of matches ie row_ind[n], col_ind[n] is a match
+
+        # Take away all matchings which exceed certain distance
+        keep = cost_matrix[row_ind, col_ind] <= self.config.match_max_dist_m
+        return list(row_ind[keep]), list(col_ind[keep])
+
+    def solve_assignment(self, cost_matrix, json_list):
+        """
+        Solve the minimum cost assignment with the configured solver
+        (trackerConfig "MATCH_SOLVER")
+
+        Arguments:
+            cost_matrix {[np.array]} -- nxm cost matrix
+            json_list {[list]} -- The m detections at timestep (t). Their
+            ids are used to warm-start the auction solver
+
+        Returns:
+            [tuple] -- (row_ind, col_ind) arrays of matched indices
+        """
+        if self.state.auction_solver is not None:
+            col_keys = [self.get_id_list(json_ele) for json_ele in json_list]
+            return self.state.auction_solver.solve(cost_matrix, col_keys)
+        return assignment.solve_exact(cost_matrix)
+
     # Util functions
+    def get_work_array(self, buffer_name, shape, dtype=np.float64):
+        """
+        Get an array with undefined contents for the per-timestep
+        matrices. If buffer_name is given and USE_BUFFER_POOL is True, the
+        array is taken from the tracker's buffer pool (and is only valid
+        until the next call with the same name). Otherwise a new array is
+        allocated
+
+        Arguments:
+            buffer_name {string} -- Name of the work array (or None)
+            shape {tuple} -- Shape of the array
+
+        Keyword Arguments:
+            dtype {np.dtype} -- dtype of the array (default: {np.float64})
+
+        Returns:
+            [np.array] -- The array
+        """
+        if buffer_name is None or self.buffer_pool is None:
+            return np.empty(shape, dtype=dtype)
+        return self.buffer_pool.get(buffer_name, shape, dtype)
+
     def get_id_list(self, json_ele):
-        """Get the list of ids associated with a given detection
+        """Get the list of ids associated with a given detection: the ids
+        merged into it if it represents a multi-camera cluster of the current
+        timestep (see prune_nearby_points_in_list()), else its own id
 
         Arguments:
             json_ele {[dict]} -- json schema dictionary
 
         Returns:
-            [list] -- List of string IDs
+            [list] -- List of IDs (integers if INTERN_OBJECT_IDS is set)
         """
-        return json_ele["object"].get("id_list", [json_ele["object"]["id"]])
+        id_list = self.state.cluster_id_lists.get(id(json_ele), None)
+        if id_list is None:
+            return [json_ele["object"]["id"]]
+        return id_list
+
+    def get_obj_id_str(self, json_ele):
+        """Get the external (string) object id of a detection. The object id
+        is an integer from the id registry if INTERN_OBJECT_IDS is set
+
+        Arguments:
+            json_ele {[dict]} -- json schema dictionary
+
+        Returns:
+            [string] -- "^S<sensor id>_^O<object id>"
+        """
+        obj_id = trackerutils.get_obj_id(json_ele)
+        if self.state.id_registry is not None:
+            obj_id = self.state.id_registry.get_str(obj_id)
+        return obj_id
+
+    def expire_obj_ids(self, json_list, timestamp):
+        """Expire the interned object ids that are no longer referenced. The
+        ids in json_list (the output and the list carried to the next
+        timestep, incl. the merged ids of clusters) and in clustered_oid_map
+        are live. The others expire after CARRY_OVER_LIST_PRUNE_TIME_IN_SEC,
+        i.e. when the track can no longer be continued
+
+        Arguments:
+            json_list {[list]} -- List of detections in json schema
+            timestamp {datetime} -- current timestamp
+        """
+        id_registry = self.state.id_registry
+        if id_registry is None:
+            return
+        for json_ele in json_list:
+            id_registry.touch(self.get_id_list(json_ele), timestamp)
+        id_registry.touch(self.state.clustered_oid_map, timestamp)
+        id_registry.expire(timestamp, self.config.carry_time_sec)
 
 
     def xfer_attr_from_1vehicle(self, act_record, json_list):
@@ -1104,89 +2027,82 @@ class MulticamTracker:
             [list] -- List of json schema based dictionaries
             for detections with same objects having same attributes
         """
-        # 1. First detect if two objects have been detected too close within the camera
-        obj_in_cam_list = {}  #key = sensor id, value = [jsons]
-        for rec in json_list:
-            cam_id = rec['sensor']['id']
-            key = cam_id
-            curr_obj_rec = obj_in_cam_list.get(key, None)
-            if curr_obj_rec is None:
-                obj_in_cam_list[key] = [rec]  # This is the first
-            else:
-                obj_in_cam_list[key].append(rec)
+        if not json_list:
+            return []
+        # The records are grouped with one sort of their integer codes
+        # (trackerutils.group_by_label()). Codes are issued in the order of
+        # first appearance, so the groups keep the order of the records
 
+        # 1. First detect if two objects have been detected too close within the camera
+        cam_codes, _ = kernels.encode_values(
+            [rec['sensor']['id'] for rec in json_list])
+        cam_order, cam_starts, _ = trackerutils.group_by_label(cam_codes)
         new_json_list = []
-        for key in obj_in_cam_list:
-            recs = obj_in_cam_list[key]
+        for members in np.split(cam_order, cam_starts[1:]):
+            recs = [json_list[i] for i in members]
             # Cluster with very small threshold
             recs = self.cluster_recs_from_same_cam(recs)  # set object_id of duplicate objects to same - below only one json per camera/objectid will then be kept per time window
             new_json_list += recs
         json_list = new_json_list
 
         # 2. Now single-camera tracker and/or cluster_recs_from_same_cam() has tried to put a tracker for each object by assigning the same object id to same object. Use that to now only take a single instance of each object from across the period
-        obj_in_cam_list = {}  #key: #sensor__ + sensor + id  value = [jsons]
-        for rec in json_list:
-            cam_id = rec['sensor']['id']
-            #obj_id = ""
-            #if self.state.assume_objs_have_same_id_intra_frame_period:  
-            obj_id = rec['object']['id']   #sensor + id
-
-            key = cam_id + "__" + obj_id  #sensor__ + sensor + id  or just sensor__
-            curr_obj_rec = obj_in_cam_list.get(key, None)
-            if curr_obj_rec is None:
-                obj_in_cam_list[key] = [rec]  # This is the first
-            else:
-                obj_in_cam_list[key].append(rec)
+        obj_codes, _ = kernels.encode_values(
+            [(rec['sensor']['id'], rec['object']['id']) for rec in json_list])
 
         if constants.TAKE_ONE_FRAME_PER_PERIOD:  #was True in constants.py, now false to allow merging below vs just taking one record here
-            new_json_list = []
-            for key in obj_in_cam_list:
-                recs = obj_in_cam_list[key]
-                if (recs is not None) and recs:
-                    new_json_list.append(recs[len(recs) - 1])  #takes only last json per camera + objectid
-            json_list = new_json_list  #takes only last json per camera + object id
-
-            # Now re-key the records after transferring the attributes
-            obj_in_cam_list = {}
-            for rec in json_list:
-                cam_id = rec['sensor']['id']
-                obj_id = rec['object']['id']
-                key = cam_id + "__" + obj_id
-                curr_obj_rec = obj_in_cam_list.get(key, None)
-                if curr_obj_rec is None:
-                    # This is the first
-                    obj_in_cam_list[key] = [rec]
-                else:
-                    obj_in_cam_list[key].append(rec)
-                    
-        retval = []
-        for key in obj_in_cam_list:
-            rec_list = obj_in_cam_list[key]
-            if rec_list:
-                if len(rec_list) > 1:  # never true if constants.TAKE_ONE_FRAME_PER_PERIOD
-                    # Get direction if more than one point
-                    rec_list = sorted(rec_list, key=lambda k: k['@timestamp'])
-                    rec = rec_list[0]
-                    first_pt = (rec['object']['centroid']['x'],
-                                rec['object']['centroid']['y'])
-                    last_rec = rec_list[len(rec_list) - 1]
-                    last_pt = (last_rec['object']['centroid']['x'], last_rec['object']['centroid']['y'])
-                    self.smooth_x_y_in_list(rec_list, reason="Collating multiple points within frame time period")
-
-                    # Compute direction only if dist beween two points is more than x
-                    dist_in_m = spatial.get_euc_dist(first_pt, last_pt)
-
-                    if dist_in_m > constants.MIN_THRESHOLD_DIST_IN_M_WITHIN_RESAMPLE_TIME:
-                        orientation_rad = spatial.get_radangle_flat_earth(
-                            first_pt, last_pt)
-                        orientation = math.degrees(orientation_rad)
-                        last_rec['object']['direction'] = orientation
-                        last_rec['object']['orientation'] = orientation
-
-                    #logging.debug(
-                    #    "SAME TIME-CAM-OBJ: Transferring attributes: %d", len(rec_list))
-                    #self.xfer_attrb_for_1valid_veh(rec_list)
-                retval.append(rec_list[len(rec_list) - 1])  #add last instance of object
+            order, starts, counts = trackerutils.group_by_label(obj_codes)
+            return [json_list[i] for i in order[starts + counts - 1]]  #takes only last json per camera + objectid
+
+        # Members of each object in timestamp order
+        order, starts, counts = trackerutils.group_by_label(
+            obj_codes, [rec['@timestamp'] for rec in json_list])
+        retval = [json_list[i] for i in order[starts + counts - 1]]  #add last instance of object
+
+        multi = counts > 1
+        if not multi.any():
+            return retval
+
+        # Objects with more than one point: smooth the points (as
+        # smooth_x_y_in_list()) and get the direction from the first and
+        # the last point
+        multi_counts = counts[multi]
+        multi_starts = np.concatenate(([0], np.cumsum(multi_counts)[:-1]))
+        recs = [json_list[i] for i in order[np.repeat(multi, counts)]]
+        pts = [(rec['object']['centroid']['x'], rec['object']['centroid']['y'])
+               for rec in recs]
+        first_pts = [pts[i] for i in multi_starts]
+        last_pts = [pts[i] for i in multi_starts + multi_counts - 1]
+        dir_recs = [recs[i] for i in multi_starts + multi_counts - 1]
+        all_members = np.arange(len(recs))
+        x_mean = trackerutils.get_group_means([pt[0] for pt in pts], all_members,
+                                              multi_starts, multi_counts)
+        y_mean = trackerutils.get_group_means([pt[1] for pt in pts], all_members,
+                                              multi_starts, multi_counts)
+        group_ids = np.repeat(np.arange(len(multi_counts)), multi_counts).tolist()
+        for rec, k in zip(recs, group_ids):
+            rec['object']['centroid']['x'] = x_mean[k]
+            rec['object']['centroid']['y'] = y_mean[k]
+
+        if self.kernels is not None:
+            # NaN if the dist between the two points is not more than the threshold
+            orientations = self.kernels.directions(
+                np.array(first_pts, dtype=np.float64),
+                np.array(last_pts, dtype=np.float64),
+                constants.MIN_THRESHOLD_DIST_IN_M_WITHIN_RESAMPLE_TIME).tolist()
+        else:
+            orientations = []
+            for first_pt, last_pt in zip(first_pts, last_pts):
+                # Compute direction only if dist beween two points is more than x
+                dist_in_m = spatial.get_euc_dist(first_pt, last_pt)
+                orientation = math.nan
+                if dist_in_m > constants.MIN_THRESHOLD_DIST_IN_M_WITHIN_RESAMPLE_TIME:
+                    orientation = math.degrees(spatial.get_radangle_flat_earth(
+                        first_pt, last_pt))
+                orientations.append(orientation)
+        for last_rec, orientation in zip(dir_recs, orientations):
+            if not math.isnan(orientation):
+                last_rec['object']['direction'] = orientation
+                last_rec['object']['orientation'] = orientation
         return retval
 
 
@@ -1286,6 +2202,7 @@ class MulticamTracker:
             min_dist = minimum distance from point to the line
             min_projected_pt = Projected point on the line
         """
+        from shapely.geometry import LineString, Point
         point = Point(point[0], point[1])
         min_dist = np.inf
         min_line = None
@@ -1374,10 +2291,8 @@ class MulticamTracker:
         Returns:
             [type] -- The direction in degrees [0,360)
         """
-        first_pt = (ele1['object']['centroid']['x'],
-                    ele1['object']['centroid']['y'])
-        last_pt = (ele2['object']['centroid']['x'],
-                   ele2['object']['centroid']['y'])
+        first_pt = trackerutils.get_xy(ele1)
+        last_pt = trackerutils.get_xy(ele2)
 
         # Compute direction only if dist beween two points is more than x
         dist_in_m = spatial.get_euc_dist(first_pt, last_pt)
@@ -1387,10 +2302,58 @@ class MulticamTracker:
                 first_pt, last_pt)
             orientation = math.degrees(orientation_rad)
         else:
-            orientation = ele1['object']['direction']
+            orientation = trackerutils.get_obj_direction(ele1)
         return orientation
 
 
+    def update_trajectories(self, json_list):
+        """
+        Append the detections at timestep (t) to the trajectories of their
+        tracks
+
+        Arguments:
+            json_list {[list]} -- Detections at timestep (t), after matching
+            (the object id is the id of the track)
+        """
+        if self.state.trajectories is None or not json_list:
+            return
+        xy_list = [trackerutils.get_xy(json_ele) for json_ele in json_list]
+        self.state.trajectories.append(
+            [trackerutils.get_obj_id(json_ele) for json_ele in json_list],
+            [iso8601.parse_date(json_ele["@timestamp"]).timestamp()
+             for json_ele in json_list],
+            [np.nan if xy is None else xy[0] for xy in xy_list],
+            [np.nan if xy is None else xy[1] for xy in xy_list])
+
+    def get_track_motion(self, json_list, num_samples=None):
+        """
+        Get the speed and heading of the tracks of the detections from the
+        trajectory buffer (over the last num_samples samples of each track)
+
+        Arguments:
+            json_list {[list]} -- Detections
+
+        Keyword Arguments:
+            num_samples {int} -- Number of samples (default: {None}, the
+                whole history)
+
+        Returns:
+            [tuple] -- (speed, heading) arrays. Speed is in m/s, heading in
+            degrees [0,360). NaN if unknown
+        """
+        num = len(json_list)
+        speed = np.full(num, np.nan)
+        heading = np.full(num, np.nan)
+        if self.state.trajectories is None or not num:
+            return speed, heading
+        slots = self.state.trajectories.get_slots(
+            [trackerutils.get_obj_id(json_ele) for json_ele in json_list],
+            create=False)
+        known = slots >= 0
+        speed[known], heading[known] = self.state.trajectories.get_motion(
+            slots[known], num_samples=num_samples)
+        return speed, heading
+
     def update_direction(self, ele, direction):
         """[summary]
         Update the direction of the detection in ele by the given direction
@@ -1447,10 +2410,79 @@ class MulticamTracker:
                 del carry_over_list[i]
             else:
                 i += 1
+
+        # Evict the oldest tracks if too many are carried over, down to the
+        # cap less the slack (see constants.CAP_EVICT_SLACK)
+        max_tracks = self.config.max_carry_over_tracks
+        num_evict = len(carry_over_list) - (max_tracks or 0)
+        if max_tracks and num_evict > 0:
+            num_evict += int(max_tracks * constants.CAP_EVICT_SLACK)
+            ordered = sorted(range(len(carry_over_list)),
+                             key=lambda j: carry_over_list[j]["@timestamp"])
+            evict = set(ordered[:num_evict])
+            removed_cars += [carry_over_list[j] for j in sorted(evict)]
+            carry_over_list[:] = [ele for j, ele in enumerate(carry_over_list)
+                                  if j not in evict]
+            self.state.num_evicted["carryOverList"] += num_evict
+            logging.warning("ProcessBatch: MAX_CARRY_OVER_TRACKS (%d) reached. "
+                            "Evicted %d tracks", max_tracks, num_evict)
         return carry_over_list, removed_cars
 
 
     # Functions visible to outside
+    def get_state_gauges(self, with_bytes=True):
+        """
+        Get the size of each structure of the tracker state that is kept
+        across timesteps. Use this to monitor the memory of a long running
+        tracker
+
+        Keyword Arguments:
+            with_bytes {bool} -- Also compute the memory held by each
+                structure (walks the structures; default: {True})
+
+        Returns:
+            [dict] -- key: structure name, value: {"count": number of
+            entries, "bytes": memory in bytes (if with_bytes)}. The key
+            "numEvicted" has the number of entries evicted by the caps
+        """
+        state = self.state
+        structures = {
+            "prevList": (len(state.prev_list or []), state.prev_list),
+            "carryOverList": (len(state.carry_over_list),
+                              state.carry_over_list),
+            "retval": (len(state.retval or []), state.retval),
+            "matchStats": (len(state.match_stats), state.match_stats),
+            "possibleParkedCars": (len(state.possible_parked_cars),
+                                   state.possible_parked_cars),
+            "clusteredOidMap": (len(state.clustered_oid_map),
+                                state.clustered_oid_map),
+        }
+        if state.id_registry is not None:
+            structures["idRegistry"] = (len(state.id_registry.keys),
+                                        state.id_registry)
+        if state.trajectories is not None:
+            structures["trajectories"] = (len(state.trajectories.slots),
+                                          state.trajectories)
+        if state.map_matcher is not None:
+            structures["mapMatchTracks"] = (len(state.map_matcher.tracks),
+                                            state.map_matcher.tracks)
+            structures["mapMatchDistCache"] = (len(state.map_matcher.dist_cache),
+                                               state.map_matcher.dist_cache)
+        if state.auction_solver is not None:
+            structures["auctionPrices"] = (len(state.auction_solver.prices),
+                                           state.auction_solver.prices)
+        if self.buffer_pool is not None:
+            structures["bufferPool"] = (len(self.buffer_pool.buffers),
+                                        self.buffer_pool)
+
+        gauges = {}
+        for name, (count, obj) in structures.items():
+            gauges[name] = {"count": count}
+            if with_bytes:
+                gauges[name]["bytes"] = trackerutils.get_deep_size(obj)
+        gauges["numEvicted"] = dict(state.num_evicted)
+        return gauges
+
     def process_batch(self, all_json_list):
         """"
         This is the main method that will be called for multicam tracking. The
@@ -1484,7 +2516,9 @@ class MulticamTracker:
             "dont_match_cameras_adj_list":
                 self.state.dont_match_cameras_adj_list,
             "match_type": self.state.match_type,    
-            "dist_thresh": self.config.cl_dist_thresh_m
+            "dist_thresh": self.config.cl_dist_thresh_m,
+            "camera_fov": self.state.camera_fov,
+            "camera_rules_from_fov": self.state.camera_rules_from_fov
         }
 
         # cluster points across cameras in current timestep:
@@ -1492,7 +2526,7 @@ class MulticamTracker:
 
         json_list = state_recs['detection']
 
-        if constants.SNAP_POINTS_TO_GRAPH:
+        if self.config.snap_points_to_graph:
             self.match_moving_points_to_map(
                 json_list, map_info=self.state.map_info)
 
@@ -1530,15 +2564,29 @@ class MulticamTracker:
             # then add them syn ids
             self.add_synthetic_attr(json_list)
 
+        self.update_trajectories(json_list)
+
         carry_over_list, _ = self.prune_carry_over_list(carry_over_list, timestamp)
+        if self.state.trajectories is not None:
+            self.state.trajectories.prune(timestamp.timestamp(),
+                                          self.config.carry_time_sec)
 
         # Prune the object ids that are mapped to same clusters (mc tracker ids)
         self.prune_cluster_id_sets(timestamp)
+        self.expire_obj_ids(retval + json_list + carry_over_list, timestamp)
 
-        self.state.retval = retval
+        self.state.retval = self.build_output_records(retval)
         if self.state.verbose_log:
             logging.info("ProcessBatch: Retval=%d", len(self.state.retval))
 
+        if self.config.compact_track_state:
+            # Keep only the fields needed for matching. The json dicts of
+            # this timestep are then only referenced by the output (retval)
+            json_list = [trackerutils.get_compact_rec(json_ele)
+                         for json_ele in json_list]
+            carry_over_list = [trackerutils.get_compact_rec(ele)
+                               for ele in carry_over_list]
+
         self.state.carry_over_list = carry_over_list
 
         prev_json_list = json_list + carry_over_list
@@ -1550,11 +2598,39 @@ class MulticamTracker:
         self.mclogger.flush_files()
 
 
+    def build_output_records(self, json_list):
+        """
+        Build the output records of a timestep. The tracker keeps its own
+        fields (merged ids, interned ids) outside the records, and the
+        tracked records are held for the next timestep, so each output record
+        is a copy (copy-on-write: the top level and "object" dicts only, the
+        other fields are shared). If INTERN_OBJECT_IDS is set, the copy gets
+        the external id string
+
+        Arguments:
+            json_list {[list]} -- List of tracked detections in json schema
+
+        Returns:
+            [list] -- List of output detections in json schema
+        """
+        retval = []
+        for json_ele in json_list:
+            # copy.copy() keeps the record type (rawrecord.RawRecord)
+            out_ele = copy.copy(json_ele)
+            if json_ele.get('object', None) is not None:
+                out_ele['object'] = dict(json_ele['object'])
+                if isinstance(out_ele['object'].get('id', None), int):
+                    out_ele['object']['id'] = self.get_obj_id_str(json_ele)
+            retval.append(out_ele)
+        return retval
+
     def remove_all_additional_fields(self, json_list):
         """
         The tracker adds additional fields to the detection dictionaries that
         are passed. This will violate the json schema. Use this method to
-        remove all additional fields that might be added by the tracker
+        remove all additional fields that might be added by the tracker.
+        The output records of process_batch() (see build_output_records())
+        do not need it
 
         Arguments:
             json_list {[list]} -- List of detections in json schema
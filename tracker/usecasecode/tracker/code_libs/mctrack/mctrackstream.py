@@ -5,15 +5,17 @@ and puts it back into another kafka topic
 __version__ = '0.2'
 
 import json
+import os
 import logging
 import time
+from collections import deque
 from timeit import default_timer as timer
 from datetime import datetime
 
-import pandas as pd
 from kafka import KafkaConsumer, KafkaProducer, errors
 
-from code_libs.mctrack import constants, ioutils, mctracker, validation
+from code_libs.mctrack import constants, ioutils, mctracker, rawrecord
+from commonlib import validation
 
 DEFAULT_KAFKA_LOGS_FILE = "consumerlog.csv"
 
@@ -60,10 +62,14 @@ class McTrackerStream:
         self.log_profile_file = log_profile_file
         self.log_config = log_config        
         self.config = json.load(open(config_file))
+        self.config.setdefault("ROAD_NETWORK_CACHE_DIR",
+                               os.path.dirname(os.path.abspath(config_file)))
+        self.config.setdefault("GEOMETRY_CACHE_DIR",
+                               os.path.dirname(os.path.abspath(config_file)))
         self.ignore_dict = self.config.get(
             "IGNORE_DETECTION_DICT_MOVING", {})
-        # One time creation of polygons
-        self.ignore_poly_dict = ioutils.create_poly_dict(self.ignore_dict)
+        # One time creation (and preparation) of polygons
+        self.ignore_poly_dict = ioutils.load_ignore_regions(self.config)
 
         # Schema validation
         self.schema = None
@@ -82,6 +88,14 @@ class McTrackerStream:
                     "ERROR: Schema file (%s) has invalid json. "
                     "No validation will be performed", self.schema_file_name)
 
+        # Keep the json text of the records, and re-encode only the fields
+        # that the tracker changes (see rawrecord)
+        self.lazy_raw_records = self.config.get("lazy_raw_records", constants.DEF_LAZY_RAW_RECORDS)
+        if self.lazy_raw_records:
+            decode_fn = rawrecord.RawRecord.from_json_str
+        else:
+            decode_fn = json.loads
+
         # time to wait between reads of the input queue
         self.sleep_time_sec = self.config.get("resample_time_sec", constants.RESAMPLE_TIME_IN_SEC)
         # time to wait on kafka input queue
@@ -89,8 +103,10 @@ class McTrackerStream:
         
         self.mctracker_obj = mctracker.MulticamTracker(self.config, verbose_log=self.verbose_log, log_config = self.log_config)
 
-        # Debug related
-        self.reid_timings = []
+        # Debug related. Only the newest records are kept
+        self.max_reid_timings = self.config.get("max_reid_timings", constants.MAX_REID_TIMINGS)
+        self.reid_timings = deque(maxlen=self.max_reid_timings)
+        self.max_kafka_log_recs = self.config.get("max_kafka_log_recs", constants.MAX_KAFKA_LOG_RECS)
 
         # Instantiate kafka producer/consumer
         self.consumer = None
@@ -99,7 +115,8 @@ class McTrackerStream:
             self.consumer = KafkaConsumer(self.in_kafkatopics,
                                           bootstrap_servers=self.in_kafkaservers,
                                           value_deserializer=lambda m:
-                                          validation.schema_validate(m, self.schema))
+                                          validation.schema_validate(m, self.schema,
+                                                                     decode_fn=decode_fn))
         except errors.NoBrokersAvailable:
             err_msg = "ERROR: Consumer broker not available: {}".format(
                 self.in_kafkaservers)
@@ -120,9 +137,9 @@ class McTrackerStream:
             exit()
 
         try:
+            # Re-uses the json text of the RawRecords
             self.producer = KafkaProducer(bootstrap_servers=self.out_kafkaservers,
-                                          value_serializer=lambda m:
-                                          json.dumps(m).encode('utf-8'))
+                                          value_serializer=rawrecord.encode_record)
         except errors.NoBrokersAvailable:
             err_msg = "ERROR: Producer broker not available: {}".format(
                 self.out_kafkaservers)
@@ -154,7 +171,7 @@ class McTrackerStream:
 
         iters = 0
         num_msgs_received = 0
-        recs = []
+        recs = deque(maxlen=self.max_kafka_log_recs)
         # Debugging-related objects
         start_time = tstart_time = ptime_taken = ttime_taken = None
         num_iters_to_print = int(
@@ -178,7 +195,7 @@ class McTrackerStream:
                         kafka_ts = msg.timestamp
                         recs.append({'currTime': curr_time, 'kafkaTs': kafka_ts})
                     if self.add_timestamps:
-                        msg.value['object']['signature'].append(time.time())  #3rd signature item  = tracker read from kafka
+                        msg.value['object']['signature'] = msg.value['object']['signature'] + [time.time()]  #3rd signature item  = tracker read from kafka
                     json_list.append(msg.value)
 
             if self.time_prof_flag:
@@ -209,6 +226,10 @@ class McTrackerStream:
             if (iters % num_iters_to_print) == 0:
                 logging.info(
                     "Mc-Tracker Stream: %s: Num msgs received = %d", str(datetime.now()), num_msgs_received)
+                logging.info(
+                    "Mc-Tracker Stream: State gauges: %s",
+                    json.dumps(self.mctracker_obj.get_state_gauges(
+                        with_bytes=self.verbose_log)))
             if retval:
                 self.write_to_kafka(retval)
 
@@ -219,7 +240,8 @@ class McTrackerStream:
 
         if self.time_prof_flag:
             if recs:
-                recs_pd = pd.DataFrame(recs)
+                import pandas as pd
+                recs_pd = pd.DataFrame(list(recs))
                 recs_pd['kafkaTsDelayMs'] = recs_pd["currTime"] - \
                     recs_pd["kafkaTs"]
                 recs_pd.to_csv(DEFAULT_KAFKA_LOGS_FILE, index=False)
@@ -235,7 +257,8 @@ class McTrackerStream:
         self.log_profile_file
         """
         if self.reid_timings:
-            recs_pd = pd.DataFrame(self.reid_timings)
+            import pandas as pd
+            recs_pd = pd.DataFrame(list(self.reid_timings))
             recs_pd.to_csv(self.log_profile_file, index=False)
             logging.info("%s Dumping Stats:", str(datetime.now()))
             logging.info("%s", str(recs_pd.describe(percentiles=[
@@ -279,7 +302,6 @@ class McTrackerStream:
 
             tmp_ret = self.mctracker_obj.state.retval
             if tmp_ret is not None:
-                self.mctracker_obj.remove_all_additional_fields(tmp_ret)
                 retval += tmp_ret
                 self.mctracker_obj.state.retval = []
 
@@ -295,5 +317,5 @@ class McTrackerStream:
         if self.producer is not None:
             for json_ele in json_list:
                 if self.add_timestamps:
-                    json_ele['object']['signature'].append(time.time())  # 4th signature item = tracker write to kafka topic
+                    json_ele['object']['signature'] = json_ele['object']['signature'] + [time.time()]  # 4th signature item = tracker write to kafka topic
                 self.producer.send(self.out_kafkatopics, json_ele)
@@ -0,0 +1,243 @@
+"""
+Day2 schema records that keep their original json text. Used by the
+streaming tracker (McTrackerStream) if "lazy_raw_records" is set in the
+config.
+
+A record is decoded by the C json scanner, one top level field at a time,
+so the position of each field value in the text is known (the fields in
+SPLIT_FIELDS are split one level further). On output, the fields that the
+tracker did not change are copied from the original text, and only the
+changed or added ones are encoded and spliced in. An object is re-encoded
+as a whole only if fields were removed from it.
+
+A field is unchanged if the record still holds the very value that was
+decoded (the tracker replaces the values it changes, e.g. object id,
+trackerid, direction). The sub fields in MUTABLE_FIELDS are changed in place
+by the tracker, so they are compared with a (shallow) copy of their decoded
+value instead
+"""
+
+__version__ = '0.2'
+
+import json
+import re
+import math
+from json.encoder import encode_basestring_ascii
+
+# Top level fields whose sub fields are kept one by one (the fields with the
+# large payloads, of which the tracker changes a few sub fields)
+SPLIT_FIELDS = frozenset(["object", "place"])
+
+# Sub fields that the tracker changes in place (object centroid: snapped or
+# averaged, place subplace: level upper cased)
+MUTABLE_FIELDS = {
+    "object": frozenset(["centroid"]),
+    "place": frozenset(["subplace"]),
+}
+
+_SCAN_ONCE = json.JSONDecoder().scan_once
+_WS_RE = re.compile(r'[ \t\n\r]*')
+# The start of an object up to the value of its first field, and the end of
+# a field value up to the value of the next field (or the end of the object).
+# Field names with escapes do not match
+_FIRST_FIELD_RE = re.compile(r'[ \t\n\r]*\{[ \t\n\r]*"([^"\\]*)"[ \t\n\r]*:[ \t\n\r]*')
+_NEXT_FIELD_RE = re.compile(
+    r'[ \t\n\r]*(?:,[ \t\n\r]*"([^"\\]*)"[ \t\n\r]*:[ \t\n\r]*|\})')
+_MISSING = object()
+
+
+def encode_value(value):
+    """
+    json.dumps(), with a fast path for the strings and finite floats (the
+    values that the tracker changes)
+
+    Arguments:
+        value {object} -- The value
+
+    Returns:
+        [string] -- The json text of the value
+    """
+    if isinstance(value, str):
+        return encode_basestring_ascii(value)
+    if type(value) is float and math.isfinite(value):
+        return float.__repr__(value)
+    return json.dumps(value)
+
+
+def scan_fields(text, pos, split_fields=None, mutable_fields=frozenset()):
+    """
+    Decode the json object that starts at pos, one field at a time (the
+    values are decoded by the C scanner of the json module)
+
+    Arguments:
+        text {string} -- json text
+        pos {int} -- start of the object
+
+    Keyword Arguments:
+        split_fields {frozenset} -- fields (json objects) whose sub fields
+            are scanned too (default: {None})
+        mutable_fields {frozenset} -- fields whose value is kept as a
+            shallow copy (default: {frozenset()})
+
+    Returns:
+        [tuple] -- (decoded dict, list of (field, value start, value end,
+        value or its copy, sub field list or None), position after the
+        object). None if
+        the object is empty, has a field name with escapes or is not valid
+        json
+    """
+    match = _FIRST_FIELD_RE.match(text, pos)
+    if match is None:
+        return None
+    result = {}
+    fields = []
+    while True:
+        key = match.group(1)
+        start = match.end()
+        scanned = None
+        if split_fields is not None and key in split_fields and text[start] == "{":
+            # Not split if it can not be scanned (e.g. empty)
+            scanned = scan_fields(text, start,
+                                  mutable_fields=MUTABLE_FIELDS.get(key, frozenset()))
+        if scanned is not None:
+            value, sub_fields, end = scanned
+        else:
+            sub_fields = None
+            try:
+                value, end = _SCAN_ONCE(text, start)
+            except StopIteration:
+                return None
+        result[key] = value
+        if key in mutable_fields and isinstance(value, dict):
+            fields.append((key, start, end, dict(value), sub_fields))
+        else:
+            fields.append((key, start, end, value, sub_fields))
+
+        match = _NEXT_FIELD_RE.match(text, end)
+        if match is None:
+            return None
+        if match.group(1) is None:
+            return result, fields, match.end()
+
+
+def get_changed_spans(value, fields, mutable_fields, replaced):
+    """
+    Find the fields of a json object (value) that were changed or added
+    since it was decoded
+
+    Arguments:
+        value {dict} -- The current value of the object
+        fields {list} -- The fields that were decoded (see scan_fields())
+        mutable_fields {frozenset} -- Fields that are compared with the copy
+            of their decoded value (the others are compared by identity)
+        replaced {list} -- The (start, end, new text) of the changed fields
+            are appended to it (added fields are inserted after the last
+            field)
+
+    Returns:
+        [bool] -- False if fields were removed (the object has to be
+        re-encoded as a whole)
+    """
+    for key, start, end, orig_value, sub_fields in fields:
+        this_value = value.get(key, _MISSING)
+        if this_value is _MISSING:
+            return False
+        if sub_fields is not None and isinstance(this_value, dict):
+            num_replaced = len(replaced)
+            if not get_changed_spans(this_value, sub_fields,
+                                     MUTABLE_FIELDS.get(key, frozenset()),
+                                     replaced):
+                del replaced[num_replaced:]
+                replaced.append((start, end, encode_value(this_value)))
+        elif key in mutable_fields:
+            if this_value != orig_value:
+                replaced.append((start, end, encode_value(this_value)))
+        elif this_value is not orig_value:
+            replaced.append((start, end, encode_value(this_value)))
+    if len(value) > len(fields):
+        orig_keys = set(field[0] for field in fields)
+        end = fields[-1][2]
+        replaced.append((end, end, "".join(
+            ", {}: {}".format(encode_value(key), encode_value(this_value))
+            for key, this_value in value.items() if key not in orig_keys)))
+    return True
+
+
+class RawRecord(dict):
+    """
+    A decoded day2 schema record (a dictionary) that keeps its original json
+    text and the position of its fields in the text (see to_json_str()).
+    copy.copy() keeps the text, so a shallow copy of the record (with copies
+    of its sub dictionaries) is encoded the same way
+    """
+
+    @classmethod
+    def from_json_str(cls, text):
+        """
+        Decode a record
+
+        Arguments:
+            text {string or bytes} -- The json text of the record (utf-8 if
+                bytes)
+
+        Returns:
+            [RawRecord] -- The record
+
+        Raises:
+            ValueError -- if the text is not valid json
+        """
+        if isinstance(text, bytes):
+            text = text.decode("utf-8")
+        scanned = scan_fields(text, 0, split_fields=SPLIT_FIELDS)
+        if scanned is None or _WS_RE.match(text, scanned[2]).end() != len(text):
+            # Decoded as a whole (and encoded with json.dumps()). Raises the
+            # error if the text is not valid json
+            values = json.loads(text)
+            if not isinstance(values, dict):
+                raise ValueError("Expecting a json object")
+            record = cls(values)
+            record.raw = text
+            record.fields = None
+            return record
+        record = cls(scanned[0])
+        record.raw = text
+        record.fields = scanned[1]
+        return record
+
+    def to_json_str(self):
+        """
+        Encode the record: the original text, with the changed fields
+        re-encoded
+
+        Returns:
+            [string] -- The json text of the record
+        """
+        replaced = []  #list of (start, end, new text), in text order
+        if self.fields is None or not get_changed_spans(self, self.fields, frozenset(), replaced):
+            return json.dumps(self)
+        if not replaced:
+            return self.raw
+        pieces = []
+        pos = 0
+        for start, end, new_text in replaced:
+            pieces.append(self.raw[pos:start])
+            pieces.append(new_text)
+            pos = end
+        pieces.append(self.raw[pos:])
+        return "".join(pieces)
+
+
+def encode_record(json_ele):
+    """
+    Encode a record (kafka value serializer). RawRecords re-use their
+    original text, other records are encoded with json.dumps()
+
+    Arguments:
+        json_ele {dict} -- The record
+
+    Returns:
+        [bytes] -- The utf-8 json record
+    """
+    if isinstance(json_ele, RawRecord):
+        return json_ele.to_json_str().encode("utf-8")
+    return json.dumps(json_ele).encode("utf-8")
@@ -1,22 +1,29 @@
 """
-This module has utility functions for multi-cam tracker. Most of the functions
-are related to get/set json schema parameters
+This module has utility functions for multi-cam tracker. The accessors of the
+json schema records are shared with the processor and the player
+(commonlib.detection), and are imported here
 """
 
 __version__ = '0.2'
 
-import random
-import string
-from collections import OrderedDict
+import sys
+from collections import OrderedDict, deque
 import copy
 
 import numpy as np
-import pandas as pd
 
 import json
 import datetime
 import iso8601
 
+from commonlib.detection import (get_camera, get_classid_string, get_obj_classid,
+                                 get_obj_id, get_obj_id_in_sensor, get_obj_id_str,
+                                 get_tracker_string, get_vehicle_string, get_xy,
+                                 is_aisle_rec, is_empty_spot_rec, is_parked_rec,
+                                 is_pulled_rec, is_spot_rec)
+from commonlib.trackerutils import (get_max_camy_xy, get_mean_xy, get_median_xy,
+                                    get_random_lp, get_timestamp_str)
+
 
 def load_json_for_test(json_input_file='/media/tim/dl3storage/Datasets/virat/json/virat_json_fps_5.0_Tracker_False_sorted_secs_900.json'):
     """ Used in testing - returns a list of dicts from a file of json of form {json1}\n{json2}\n...{json3}
@@ -53,25 +60,6 @@ def get_json_timewindow_for_test(total_all_json_list, start_idx=0 , window_time_
     return all_json_list
 
 
-def get_timestamp_str(datetime_obj):
-    """Return the string formatted timestamp for a given datetime object.
-    We assume that the datetime object is in the UTC timezone
-    Return format = '<YYYY>-<mm>-<dd>T<HH>:<MM>:<SS.SSS>Z'
-    where YYYY = 4 digit year
-        mm = 2 digit month
-        dd = 2 digit date
-        HH = 2 digit hour ( 0  to 23 )
-        HH = 2 digit minute ( 0  to 59 )
-        SS.SSS = Seconds (upto millisecond accuracy, 00.000 to 59.999)
-        Z signifies the UTC time-zone
-    Returns:
-        [string] -- Timestamp string
-    """
-    (dtobj, micro) = datetime_obj.strftime('%Y-%m-%dT%H:%M:%S.%f').split('.')
-    dtobj = "%s.%03dZ" % (dtobj, int(micro) / 1000)
-    return dtobj
-
-
 def create_time_windows(json_list, window_time_in_secs=0.5):
     """
     This method will input a json list and resample the json list by timestamp
@@ -86,6 +74,7 @@ def create_time_windows(json_list, window_time_in_secs=0.5):
     time_indexed_json_list = [
         {'timestamp': json_ele['@timestamp'], 'json': json_ele}
         for json_ele in json_list]
+    import pandas as pd
     time_indexed_json_pd = pd.DataFrame(time_indexed_json_list)
     time_indexed_json_pd['timestamp'] = pd.to_datetime(
         time_indexed_json_pd['timestamp'], utc=True)
@@ -98,287 +87,134 @@ def create_time_windows(json_list, window_time_in_secs=0.5):
     return time_indexed_json_dict
 
 
-def get_xy(json_ele):
+def group_by_label(labels, *keys):
     """
-    Get the x and y values of a detected vehicle
+    Group the elements by label, with one sort of the labels
 
     Arguments:
-        json_ele {[dict]} -- Detection record in json schema
-
-    Returns:
-        [list] -- A list comprised of [x,y]
-    """
-    if json_ele.get("object", {}).get("centroid", None) is not None:
-        (varx, vary) = (json_ele['object']['centroid']
-                        ['x'], json_ele['object']['centroid']['y'])
-        return [varx, vary]
+        labels {list} -- Label (e.g. cluster number) of each element
+        keys {list} -- Optional keys to sort the elements of a group by
+        (most significant first). By default, the elements of a group are
+        in index order
+
+    Returns:
+        [tuple] -- (order, starts, counts). order {np.array} has the element
+        indices, grouped by label (groups in ascending label order). Group k
+        is order[starts[k]:starts[k] + counts[k]]
+    """
+    labels = np.asarray(labels)
+    if not len(labels):
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    if keys:
+        order = np.lexsort(tuple(np.asarray(key) for key in reversed(keys)) +
+                           (labels,))
     else:
-        return None
-
-
-def get_obj_id_in_sensor(json_ele):
-    """
-    Get the object id value of a detected vehicle. The object id is a
-    combination of the sensor id and the object id
-
-    Arguments:
-        json_ele {[dict]} -- Detection record in json schema
-
-    Returns:
-        [string] -- Object ID
-    """
-    return "^S{}_^O{}".format(json_ele['sensor']['id'],
-                              json_ele['object']['id'])
-
-
-def get_mean_xy(pts):
-    """
-    Return the mean xy point (x_mean, y_mean) from the set of points
-
-    Arguments:
-        pts {list} -- List of (x,y) points
-
-    Returns:
-        [tuple] -- Mean (x,y) point
-    """
-
-    x_list = [p[0] for p in pts]
-    y_list = [p[1] for p in pts]
-    x_rep = np.mean(x_list)
-    y_rep = np.mean(y_list)
-    return (x_rep, y_rep)
-
-
-def get_median_xy(pts):
-    """
-    Return the median xy point (x_median, y_median) from the set of points
-
-    Arguments:
-        pts {list} -- List of (x,y) points
-
-    Returns:
-        [tuple] -- Median (x,y) point
-    """
-
-    x_list = [p[0] for p in pts]
-    y_list = [p[1] for p in pts]
-    # Use mean. Its faster
-    x_rep = np.median(x_list)
-    y_rep = np.median(y_list)
-    return (x_rep, y_rep)
-
-
-def get_max_camy_xy(pts):
-    """
-    Return the xy point with maximum y from the set of points
-
-    Arguments:
-        pts {list} -- List of (global_x,global_y, cam_x, cam_y) points
-
-    Returns:
-        [tuple] -- (x,y) point
-    """
-    x_rep = None
-    y_rep = None
-    best_camy = None
-    for point in pts:
-        if best_camy is None or best_camy < point[3]:
-            best_camy = point[3]
-            x_rep = point[0]
-            y_rep = point[1]
-    return (x_rep, y_rep)
-
-
-def get_obj_classid(json_ele):
-    """
-    Not used in favour of get_classid_string below that returns '' instead of None on lookup failure
-    Get the class id value of a detected object. 
-    
-    Arguments:
-        json_ele {[dict]} -- Detection record in json schema
-
-    Returns:
-        [string] -- Object ID
-    """
-    return json_ele.get('object', {}).get('classid', None)
-
-
-
-def get_obj_id(json_ele):
-    """
-    Get the object id value of a detected object. The object id returned
-    in this function is a string of the the object id
+        order = np.argsort(labels, kind="mergesort")
+    sorted_labels = labels[order]
+    starts = np.flatnonzero(np.concatenate(
+        ([True], sorted_labels[1:] != sorted_labels[:-1])))
+    counts = np.diff(np.append(starts, len(labels)))
+    return order, starts, counts
 
-    Arguments:
-        json_ele {[dict]} -- Detection record in json schema
-
-    Returns:
-        [string] -- Object ID
-    """
-    return json_ele.get('object', {}).get('id', None)
-
-
-def get_obj_id_str(json_ele):
-    """
-    Get the object id value of a detected vehicle. The object id returned
-    in this function is a string of the the object id (prefixed by some
-    unique chars)
-
-    Arguments:
-        json_ele {[dict]} -- Detection record in json schema
-
-    Returns:
-        [string] -- Object ID
-    """
-    return "^^O{}".format(get_obj_id(json_ele))
 
-
-def get_camera(json_ele):
+def get_group_means(values, order, starts, counts):
     """
-    Get the sensor/camera id of the detection
+    Mean of the values of each group (see group_by_label()). The values are
+    summed in the order of the elements in the group
 
     Arguments:
-        json_ele {[dict]} -- Detection record in json schema
+        values {list} -- Value of each element
+        order, starts, counts {np.array} -- The groups
 
     Returns:
-        [string] -- Sensor ID
+        [np.array] -- Mean of each group
     """
-    return json_ele['sensor']['id']
+    values = np.asarray(values, dtype=np.float64)[order]
+    # bincount sums sequentially (np.add.reduceat may not), which is what
+    # np.mean() does for less than 8 values. Larger groups (rare) use
+    # np.mean(), so that the result is the same as get_mean_xy()
+    group_ids = np.repeat(np.arange(len(starts)), counts)
+    means = np.bincount(group_ids, weights=values, minlength=len(starts)) / counts
+    for k in np.flatnonzero(counts >= 8):
+        means[k] = np.mean(values[starts[k]:starts[k] + counts[k]])
+    return means
 
 
-def is_spot_rec(json_ele):
+def get_deep_size(obj, seen=None):
     """
-    Is the given detection a parking spot record? The record is a parking spot
-    record if the "place" has a "parkingSpot" element, and if the event type
-    is either ["parked", "pulled", "empty"]
+    Get the memory held by obj and everything it references (dicts, lists,
+    deques, sets, tuples, numpy arrays and __slots__ objects)
 
     Arguments:
-        json_ele {[dict]} -- Detection record in json schema
-
-    Returns:
-        [boolean] -- True if the record is a parking spot record
-    """
-    if ((json_ele.get("place", {}).get("parkingSpot", None) is not None) and
-        (json_ele.get("event", {}).get("type", None) in
-         ["parked", "pulled", "empty"])):
-        return True
-    return False
-
+        obj {object} -- The object
 
-def is_parked_rec(json_ele):
-    """
-    Returns if the given detection is of a vehicle parked record. The record
-    is a parking spot record if the "place" has a "parkingSpot" element, and
-    if the event type is "parked"
-
-    Arguments:
-        json_ele {[dict]} -- Detection record in json schema
+    Keyword Arguments:
+        seen {set} -- ids of the objects already counted (default: {None})
 
     Returns:
-        [boolean] -- True if the record is of a parked car
+        int -- size in bytes
     """
-    if ((json_ele.get("place", {}).get("parkingSpot", None) is not None) and
-            (json_ele.get("event", {}).get("type", None) == "parked")):
-        return True
-    return False
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(get_deep_size(key, seen) + get_deep_size(value, seen)
+                    for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, deque)):
+        size += sum(get_deep_size(ele, seen) for ele in obj)
+    elif isinstance(obj, np.ndarray):
+        if obj.base is not None:
+            size += obj.nbytes
+    elif hasattr(obj, "__slots__"):
+        size += sum(get_deep_size(getattr(obj, slot), seen)
+                    for slot in obj.__slots__ if hasattr(obj, slot))
+    elif hasattr(obj, "__dict__"):
+        size += get_deep_size(vars(obj), seen)
+    return size
 
 
-def is_empty_spot_rec(json_ele):
+def get_obj_direction(json_ele):
     """
-    Returns if the given detection is of a parking spot that is empty. The
-    record is a parking spot record if the "place" has a "parkingSpot"
-    element, and if the event type is "empty"
+    Get the direction of a detected object
 
     Arguments:
         json_ele {[dict]} -- Detection record in json schema
 
     Returns:
-        [boolean] -- True if the record is of a empty spot
+        [float] -- Direction in degrees
     """
-    if ((json_ele.get("place", {}).get("parkingSpot", None) is not None) and
-            (json_ele.get("event", {}).get("type", None) == "empty")):
-        return True
-    return False
+    return json_ele['object']['direction']
 
 
-def is_pulled_rec(json_ele):
+def get_compact_rec(json_ele):
     """
-    Returns if the given detection is of a vehicle that has pulled
-    from a parking spot. The record is a parking spot record if the
-    "place" has a "parkingSpot" element, and if the event type is
-    "pulled"
+    Get a copy of a detection with only the fields that the tracker reads
+    from the detections it keeps for the next timesteps (location, ids,
+    class, direction, timestamp, and the license and place id for the logs).
+    The copy has the same layout as the day2 schema, so all the accessors
+    above work on it. It does not reference json_ele
 
     Arguments:
         json_ele {[dict]} -- Detection record in json schema
 
     Returns:
-        [boolean] -- True if the record is of a pulled ar
-    """
-    if ((json_ele.get("place", {}).get("parkingSpot", None) is not None) and
-            (json_ele.get("event", {}).get("type", None) == "pulled")):
-        return True
-    return False
-
-
-def is_aisle_rec(json_ele):
-    """
-    Returns if the given detection is of a vehicle is for a vehicle on aisle.
-    The record is a aisle record if the "place" has a "aisle", "entrace" or
-    "exit" element, and if the event type is one among
-    ["entry",  "exit", "moving", "stopped"]
-
-    Arguments:
-        json_ele {[dict]} -- Detection record in json schema
-
-    Returns:
-        [boolean] -- True if the record is of a pulled ar
-    """
-    if(((json_ele.get("place", {}).get("entrance", None) is not None) or
-        (json_ele.get("place", {}).get("exit", None) is not None) or
-        (json_ele.get("place", {}).get("aisle", None) is not None)) and
-        (json_ele.get("event", {}).get("type", None)
-         in ["entry", "exit", "moving", "stopped"])):
-        return True
-    return False
-
-
-def get_random_lp():
-    """Generate a random license plate string (in standard California
-    state style)
-
-    Returns:
-        [string] -- Random license plate string
-    """
-    retval = str(random.choice([5] * 1 + [6]*2 + [7] * 2 + [8] * 1))
-    retval += ''.join(random.choice(string.ascii_uppercase)
-                      for _ in range(3))
-    retval += ''.join(random.choice(string.digits) for _ in range(3))
-    return retval
-
-
-def get_vehicle_string(json_ele):
-    """
-    Get a string that describes a vehicle (in terms of its attributes).
-    Currently it just returns the license plate. It can be extended
-    to return other attributes
-
-    Arguments:
-        json_ele {[dict]} -- Detection record in json schema
-
-    Returns:
-        [string] -- Vehicle description string
-    """
-    vehicle = json_ele['object'].get('vehicle',{})
-    veh_string = vehicle.get('license', "")
-    return veh_string
-
-
-def get_tracker_string(json_ele):
-    return json_ele.get('object', {}).get('trackerid', '')
-
-
-def get_classid_string(json_ele):
-    """ 
-    """
-    return json_ele.get('object', {}).get('classid', '')
-
+        [dict] -- The compact detection record
+    """
+    obj = json_ele.get('object', {})
+    compact_obj = {key: obj[key] for key in ('id', 'classid', 'trackerid', 'direction')
+                   if key in obj}
+    if obj.get('centroid', None) is not None:
+        compact_obj['centroid'] = {'x': obj['centroid']['x'],
+                                   'y': obj['centroid']['y']}
+    if 'license' in obj.get('vehicle', {}):
+        compact_obj['vehicle'] = {'license': obj['vehicle']['license']}
+    compact_rec = {'@timestamp': json_ele['@timestamp'],
+                   'sensor': {'id': json_ele['sensor']['id']},
+                   'object': compact_obj}
+    if 'id' in json_ele.get('place', {}):
+        compact_rec['place'] = {'id': json_ele['place']['id']}
+    return compact_rec
@@ -53,6 +53,7 @@ class MulticamTrackLogger:
         else:
             DEBUG_INP_POINTS_FILE = os.path.join(log_dir, DEBUG_INP_POINTS_FILE)
             
+        self.id_registry = None  # set by the tracker if object ids are interned
         self.debug_cluster_fp = None
         self.debug_match_fp = None
         self.debug_input_points_fp = None
@@ -76,6 +77,16 @@ class MulticamTrackLogger:
                 "objid1,placeid1,x2,y2,cam2,veh2,objid2,placeid2\n")
             
 
+    def get_obj_id(self, rec):
+        """
+        Get the object id of a record as written in the logs (the external id
+        string if the object ids are interned)
+        """
+        obj_id = rec["object"]["id"]
+        if self.id_registry is not None:
+            obj_id = self.id_registry.get_str(obj_id)
+        return obj_id
+
     def close_debug_files(self):
         """
         This method closes all the open debug files. This function has to be
@@ -143,7 +154,7 @@ class MulticamTrackLogger:
                 self.debug_cluster_fp.write(
                     "Cluster,{},{},{},{},{},{},{},{}\n".format(
                         timestamp, cid, varx, vary, cam, veh_str,
-                        rec["object"]["id"], rec["place"]["id"]))
+                        self.get_obj_id(rec), rec["place"]["id"]))
 
     def log_input_points(self, json_list, ignored_list, id_start):
         """
@@ -281,14 +292,14 @@ class MulticamTrackLogger:
                 varx1, vary1 = trackerutils.get_xy(json_ele1)
                 cam1 = trackerutils.get_camera(json_ele1)
                 veh1 = trackerutils.get_vehicle_string(json_ele1)
-                objid1 = json_ele1["object"]["id"]
+                objid1 = self.get_obj_id(json_ele1)
                 placeid1 = json_ele1["place"]["id"]
 
             if json_ele2 is not None:
                 varx2, vary2 = trackerutils.get_xy(json_ele2)
                 cam2 = trackerutils.get_camera(json_ele2)
                 veh2 = trackerutils.get_vehicle_string(json_ele2)
-                objid2 = json_ele2["object"]["id"]
+                objid2 = self.get_obj_id(json_ele2)
                 placeid2 = json_ele2["place"]["id"]
 
             self.debug_match_fp.write("Match,{},{},{},{},{},{},{},{},{},{},{},{},"
@@ -0,0 +1,178 @@
+"""
+Short per-track history of (t, x, y) samples, used for the direction,
+speed and heading of the tracked objects
+"""
+
+__version__ = '0.2'
+
+import math
+
+import numpy as np
+
+from code_libs.mctrack import constants
+
+
+class TrajectoryBuffer:
+    """
+    Fixed-length ring buffer of (t, x, y) samples for each track. The samples
+    of all tracks are stored in one preallocated array of shape
+    (capacity, history_len, 3), indexed by the slot of the track, so that
+    velocity and heading can be computed for all tracks at once.
+
+    Tracks are keyed by their (internal) object id. The slot of a track is
+    released when the track has not been updated for a while (see prune())
+    """
+
+    def __init__(self, history_len=constants.DEF_TRAJECTORY_HISTORY_LEN,
+                 capacity=constants.TRAJECTORY_INIT_CAPACITY):
+        """
+        Init method
+
+        Keyword Arguments:
+            history_len {int} -- Number of samples kept per track
+            capacity {int} -- Initial number of track slots. The buffer
+                doubles when it is full
+        """
+        self.history_len = max(int(history_len), 2)
+        self.points = np.full((capacity, self.history_len, 3), np.nan)
+        self.num_points = np.zeros(capacity, dtype=np.int64)  # samples stored per slot
+        self.next_pos = np.zeros(capacity, dtype=np.int64)    # ring position of the next sample
+        self.last_time = np.full(capacity, -np.inf)           # time of the newest sample
+        self.slots = {}  #key: track key (object id), value: slot
+        self.slot_keys = [None] * capacity
+        self.free_slots = list(range(capacity - 1, -1, -1))
+
+    def grow(self):
+        """Double the number of slots"""
+        capacity = self.points.shape[0]
+        self.points = np.concatenate(
+            [self.points, np.full((capacity, self.history_len, 3), np.nan)])
+        self.num_points = np.concatenate(
+            [self.num_points, np.zeros(capacity, dtype=np.int64)])
+        self.next_pos = np.concatenate(
+            [self.next_pos, np.zeros(capacity, dtype=np.int64)])
+        self.last_time = np.concatenate(
+            [self.last_time, np.full(capacity, -np.inf)])
+        self.slot_keys += [None] * capacity
+        self.free_slots = (list(range(2 * capacity - 1, capacity - 1, -1)) +
+                           self.free_slots)
+
+    def get_slots(self, keys, create=True):
+        """
+        Get the slots of the tracks
+
+        Arguments:
+            keys {list} -- Track keys
+
+        Keyword Arguments:
+            create {bool} -- Allocate slots for new tracks (default: {True}).
+                If False, the slot of an unknown track is -1
+
+        Returns:
+            [np.array] -- The slots
+        """
+        slots = np.empty(len(keys), dtype=np.int64)
+        for i, key in enumerate(keys):
+            slot = self.slots.get(key, None)
+            if slot is None:
+                if not create:
+                    slot = -1
+                else:
+                    if not self.free_slots:
+                        self.grow()
+                    slot = self.free_slots.pop()
+                    self.slots[key] = slot
+                    self.slot_keys[slot] = key
+            slots[i] = slot
+        return slots
+
+    def append(self, keys, times, xs, ys):
+        """
+        Append one sample to each of the tracks. If a key is repeated, the
+        last sample is used
+
+        Arguments:
+            keys {list} -- Track keys
+            times {list} -- Time of the samples (seconds)
+            xs {list} -- x of the samples
+            ys {list} -- y of the samples
+
+        Returns:
+            [np.array] -- The slots of the tracks
+        """
+        slots = self.get_slots(keys)
+        if not len(slots):
+            return slots
+        # Keep the last sample of repeated keys
+        _, last_index = np.unique(slots[::-1], return_index=True)
+        index = len(slots) - 1 - last_index
+        upd_slots = slots[index]
+        pos = self.next_pos[upd_slots]
+        self.points[upd_slots, pos, 0] = np.asarray(times, dtype=np.float64)[index]
+        self.points[upd_slots, pos, 1] = np.asarray(xs, dtype=np.float64)[index]
+        self.points[upd_slots, pos, 2] = np.asarray(ys, dtype=np.float64)[index]
+        self.next_pos[upd_slots] = (pos + 1) % self.history_len
+        self.num_points[upd_slots] = np.minimum(self.num_points[upd_slots] + 1,
+                                                self.history_len)
+        self.last_time[upd_slots] = self.points[upd_slots, pos, 0]
+        return slots
+
+    def get_motion(self, slots, num_samples=None, min_dist=0.0):
+        """
+        Get the velocity and heading of the tracks over their last
+        num_samples samples (from the oldest to the newest of these samples)
+
+        Arguments:
+            slots {np.array} -- Slots of the tracks
+
+        Keyword Arguments:
+            num_samples {int} -- Number of samples (default: {None}, the
+                whole history)
+            min_dist {float} -- The heading is NaN if the track has not moved
+                more than min_dist (default: {0.0})
+
+        Returns:
+            [tuple] -- (speed, heading) arrays. Speed is in distance units per
+            second, heading in degrees [0,360). NaN for tracks with less than
+            two samples
+        """
+        slots = np.asarray(slots, dtype=np.int64)
+        if num_samples is None:
+            num_samples = self.history_len
+        num = np.minimum(self.num_points[slots],
+                         min(int(num_samples), self.history_len))
+        newest = (self.next_pos[slots] - 1) % self.history_len
+        oldest = (self.next_pos[slots] - num) % self.history_len
+        delta = self.points[slots, newest] - self.points[slots, oldest]
+        dist = np.hypot(delta[:, 1], delta[:, 2])
+        valid = num >= 2
+        with np.errstate(divide="ignore", invalid="ignore"):
+            speed = np.where(valid & (delta[:, 0] > 0), dist / delta[:, 0], np.nan)
+        angle = np.arctan2(delta[:, 2], delta[:, 1])
+        angle[angle < 0.0] += math.pi * 2
+        heading = np.degrees(angle)
+        heading[np.logical_not(valid) | (dist <= min_dist)] = np.nan
+        return speed, heading
+
+    def prune(self, timestamp_sec, max_age_sec):
+        """
+        Release the slots of the tracks not updated in the last max_age_sec
+        seconds
+
+        Arguments:
+            timestamp_sec {float} -- Current time (seconds)
+            max_age_sec {float} -- Maximum time since the last sample
+
+        Returns:
+            [int] -- Number of tracks released
+        """
+        expired = np.nonzero((self.num_points > 0) &
+                             (self.last_time < timestamp_sec - max_age_sec))[0]
+        for slot in expired.tolist():
+            del self.slots[self.slot_keys[slot]]
+            self.slot_keys[slot] = None
+            self.free_slots.append(slot)
+        self.num_points[expired] = 0
+        self.next_pos[expired] = 0
+        self.last_time[expired] = -np.inf
+        return len(expired)
@@ -0,0 +1,313 @@
+"""
+Map-matching of the tracks onto the road network (hidden Markov model)
+"""
+
+__version__ = '0.2'
+
+from collections import OrderedDict
+import numpy as np
+import networkx as nx
+from sklearn.neighbors import KDTree
+
+# Defaults of the matcher (see MapMatcher)
+SIGMA_IN_M = 2.0             # std dev of the position error (emission)
+BETA_IN_M = 3.0              # scale of |route distance - straight distance| (transition)
+MAX_DIST_IN_M = 20.0         # max distance from a point to its candidate edges
+MAX_CANDIDATES = 8           # candidate edges kept per point (nearest first)
+MAX_ROUTE_DIST_IN_M = 50.0   # max route distance between two points of a track
+MAX_GAP_SEC = 2.5            # a track restarts if it has no point for this long
+DIST_CACHE_SIZE = 2000       # nodes whose route distances are kept in the LRU cache
+
+
+class MapMatcher:
+    """
+    Matches the points of each track to the edges of a road network
+    (networkhelper.Network) with a hidden Markov model:
+    - the states of a point are its candidate edges, found with a KD tree on
+      the edge midpoints, and the point projected on each of them
+    - emission: gaussian on the distance from the point to its projection
+    - transition: exponential on the difference between the route distance
+      (on the network) and the straight distance between two consecutive
+      points of the track. A route longer than max_route_dist is not
+      possible
+
+    The Viterbi scores of the candidates of the last point of each track are
+    kept, and each new point of the track is one Viterbi step: the point is
+    snapped to the end of the best path. So the cost per point is bounded by
+    (number of candidates)^2, whatever the length of the track. The route
+    distances from a node to all the nodes within max_route_dist are
+    computed once (bounded Dijkstra) and kept in an LRU cache, since the
+    points of all the tracks go through the same nodes.
+
+    Candidates, projections and emissions are computed for all the points of
+    a call at once; only the Viterbi steps are done point by point
+    """
+
+    def __init__(self, network, sigma=SIGMA_IN_M, beta=BETA_IN_M,
+                 max_dist=MAX_DIST_IN_M, max_candidates=MAX_CANDIDATES,
+                 max_route_dist=MAX_ROUTE_DIST_IN_M, max_gap_sec=MAX_GAP_SEC,
+                 cache_size=DIST_CACHE_SIZE):
+        """
+        Init method
+
+        Arguments:
+            network {networkhelper.Network} -- The road network
+
+        Keyword Arguments:
+            sigma {float} -- Std dev of the position error (default: {SIGMA_IN_M})
+            beta {float} -- Scale of the route/straight distance difference
+                (default: {BETA_IN_M})
+            max_dist {float} -- Max distance from a point to its candidate
+                edges (default: {MAX_DIST_IN_M})
+            max_candidates {int} -- Candidate edges kept per point
+                (default: {MAX_CANDIDATES})
+            max_route_dist {float} -- Max route distance between two
+                consecutive points of a track (default: {MAX_ROUTE_DIST_IN_M})
+            max_gap_sec {float} -- A track restarts if it has no point for
+                this long (default: {MAX_GAP_SEC})
+            cache_size {int} -- Nodes kept in the route distance cache
+                (default: {DIST_CACHE_SIZE})
+        """
+        self.network = network
+        self.sigma = float(sigma)
+        self.beta = float(beta)
+        self.max_dist = float(max_dist)
+        self.max_candidates = max(int(max_candidates), 1)
+        self.max_route_dist = float(max_route_dist)
+        self.max_gap_sec = float(max_gap_sec)
+        self.cache_size = cache_size
+
+        self.edges = np.array(list(network.network.edges()),
+                              dtype=np.int64).reshape(-1, 2)
+        self.seg_start = network.node_xy[self.edges[:, 0]]
+        self.seg_delta = network.node_xy[self.edges[:, 1]] - self.seg_start
+        self.seg_len = np.hypot(self.seg_delta[:, 0], self.seg_delta[:, 1])
+        self.seg_len2 = np.maximum(self.seg_len ** 2, 1e-12)
+        self.kd_tree = None
+        self.search_radius = self.max_dist
+        if len(self.edges):
+            self.kd_tree = KDTree(self.seg_start + 0.5 * self.seg_delta)
+            self.search_radius += 0.5 * self.seg_len.max()
+
+        self.tracks = {}  #key: track key, value: (time, xy, candidate edges, candidate fractions, Viterbi scores)
+        self.dist_cache = OrderedDict()  #key: node id, value: {node id: route distance}
+        self.stats = {"numPoints": 0, "numMatched": 0, "numCandidates": 0,
+                      "numSteps": 0, "numRestarts": 0, "numSearches": 0,
+                      "numCacheHits": 0}
+
+    def get_candidates(self, xy_arr):
+        """
+        Get the candidate edges of the points: the edges within max_dist,
+        nearest first, at most max_candidates per point. Edges that share a
+        node both project a point beyond their ends onto that node; only one
+        of them is kept
+
+        Arguments:
+            xy_arr {np.array} -- (n,2) [x,y] of the points
+
+        Returns:
+            [tuple] -- (pt_ind, edge_ind, frac, proj, dist) arrays with one
+            row per candidate, sorted by point then distance: the point, the
+            edge, the position of the projection along the edge (0 to 1),
+            the projected [x,y] and the distance from the point to it
+        """
+        xy_arr = np.asarray(xy_arr, dtype=np.float64).reshape(-1, 2)
+        if self.kd_tree is None or not len(xy_arr):
+            return (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                    np.zeros(0), np.zeros((0, 2)), np.zeros(0))
+        ind_list = self.kd_tree.query_radius(xy_arr, r=self.search_radius)
+        counts = np.array([len(ind) for ind in ind_list], dtype=np.int64)
+        pt_ind = np.repeat(np.arange(len(xy_arr)), counts)
+        edge_ind = np.concatenate(ind_list).astype(np.int64)
+
+        pts = xy_arr[pt_ind]
+        delta = self.seg_delta[edge_ind]
+        frac = np.clip(np.einsum("ij,ij->i", pts - self.seg_start[edge_ind], delta) /
+                       self.seg_len2[edge_ind], 0.0, 1.0)
+        proj = self.seg_start[edge_ind] + frac[:, None] * delta
+        dist = np.hypot(pts[:, 0] - proj[:, 0], pts[:, 1] - proj[:, 1])
+
+        keep = np.nonzero(dist <= self.max_dist)[0]
+        keep = keep[np.lexsort((dist[keep], pt_ind[keep]))]
+        # One candidate per projected position (rounded to the mm)
+        _, first = np.unique(np.column_stack([pt_ind[keep],
+                                              np.round(proj[keep] * 1000.0)]),
+                             axis=0, return_index=True)
+        keep = keep[np.sort(first)]
+        rank = np.arange(len(keep)) - np.searchsorted(pt_ind[keep], pt_ind[keep])
+        keep = keep[rank < self.max_candidates]
+        return pt_ind[keep], edge_ind[keep], frac[keep], proj[keep], dist[keep]
+
+    def get_node_dists(self, node_id):
+        """
+        Get the route distances from a node to all the nodes within
+        max_route_dist (from the LRU cache, or by a bounded Dijkstra search)
+
+        Arguments:
+            node_id {int} -- The node id
+
+        Returns:
+            [dict] -- key: node id, value: route distance
+        """
+        lengths = self.dist_cache.get(node_id, None)
+        if lengths is not None:
+            self.stats["numCacheHits"] += 1
+            self.dist_cache.move_to_end(node_id)
+            return lengths
+        self.stats["numSearches"] += 1
+        lengths = nx.single_source_dijkstra_path_length(
+            self.network.network, node_id, cutoff=self.max_route_dist,
+            weight='weight')
+        if self.cache_size:
+            self.dist_cache[node_id] = lengths
+            if len(self.dist_cache) > self.cache_size:
+                self.dist_cache.popitem(last=False)
+        return lengths
+
+    def get_route_dists(self, prev_edges, prev_frac, edges, frac):
+        """
+        Get the route distances between the candidates of two consecutive
+        points: from the projection on the previous edge to one of its
+        nodes, to one of the nodes of the edge, to the projection on the edge
+        (or along the edge, if it is the same edge)
+
+        Arguments:
+            prev_edges {np.array} -- Candidate edges of the previous point
+            prev_frac {np.array} -- Their projection fractions
+            edges {np.array} -- Candidate edges of the point
+            frac {np.array} -- Their projection fractions
+
+        Returns:
+            [np.array] -- (len(prev_edges), len(edges)) route distances
+            (np.inf if longer than max_route_dist)
+        """
+        prev_nodes, prev_inv = np.unique(self.edges[prev_edges], return_inverse=True)
+        nodes, inv = np.unique(self.edges[edges], return_inverse=True)
+        nodes = nodes.tolist()
+        table = np.array([[lengths.get(node_id, np.inf) for node_id in nodes]
+                          for lengths in map(self.get_node_dists, prev_nodes.tolist())],
+                         dtype=np.float64)
+        # (prev candidate, prev node, candidate, node)
+        node_dists = table[prev_inv.reshape(-1, 2)][:, :, inv.reshape(-1, 2)]
+        prev_len = self.seg_len[prev_edges]
+        seg_len = self.seg_len[edges]
+        prev_off = np.column_stack([prev_frac * prev_len, (1.0 - prev_frac) * prev_len])
+        off = np.column_stack([frac * seg_len, (1.0 - frac) * seg_len])
+        route = (prev_off[:, :, None, None] + node_dists +
+                 off[None, None, :, :]).min(axis=(1, 3))
+        same_prev, same = np.nonzero(prev_edges[:, None] == edges[None, :])
+        route[same_prev, same] = (np.abs(frac[same] - prev_frac[same_prev]) *
+                                  prev_len[same_prev])
+        return route
+
+    def snap(self, xy_arr):
+        """
+        Snap each point to the nearest edge (no track)
+
+        Arguments:
+            xy_arr {np.array} -- (n,2) [x,y] of the points
+
+        Returns:
+            [tuple] -- (snapped, matched): (n,2) snapped [x,y] and a bool
+            array, False if the point has no edge within max_dist (it is
+            not moved)
+        """
+        xy_arr = np.asarray(xy_arr, dtype=np.float64).reshape(-1, 2)
+        pt_ind, _, _, proj, _ = self.get_candidates(xy_arr)
+        snapped = xy_arr.copy()
+        matched = np.zeros(len(xy_arr), dtype=bool)
+        # First (nearest) candidate of each point
+        first = np.flatnonzero(np.diff(np.concatenate(([-1], pt_ind))))
+        snapped[pt_ind[first]] = proj[first]
+        matched[pt_ind[first]] = True
+        return snapped, matched
+
+    def match(self, keys, times, xy_arr):
+        """
+        Match the points of the tracks to the network. The points of a track
+        are taken in time order, and each one is a Viterbi step from the last
+        point of the track (see the class docstring). A track restarts
+        (emissions only) if its last point is older than max_gap_sec, or if
+        no route is possible from it
+
+        Arguments:
+            keys {list} -- Track key of each point (e.g. object id)
+            times {list} -- Time of each point (seconds)
+            xy_arr {np.array} -- (n,2) [x,y] of the points
+
+        Returns:
+            [tuple] -- (snapped, matched): (n,2) snapped [x,y] and a bool
+            array, False if the point has no edge within max_dist (it is
+            not moved)
+        """
+        xy_arr = np.asarray(xy_arr, dtype=np.float64).reshape(-1, 2)
+        times = np.asarray(times, dtype=np.float64)
+        pt_ind, edge_ind, frac, proj, dist = self.get_candidates(xy_arr)
+        emission = -0.5 * (dist / self.sigma) ** 2
+        bounds = np.searchsorted(pt_ind, np.arange(len(xy_arr) + 1)).tolist()
+        snapped = xy_arr.copy()
+        matched = np.zeros(len(xy_arr), dtype=bool)
+        stats = self.stats
+        stats["numPoints"] += len(xy_arr)
+        stats["numCandidates"] += len(pt_ind)
+
+        tracks = self.tracks
+        for i in np.argsort(times, kind="mergesort").tolist():
+            start, end = bounds[i], bounds[i + 1]
+            if start == end:
+                continue
+            this_time = times[i]
+            this_edges = edge_ind[start:end]
+            this_frac = frac[start:end]
+            scores = emission[start:end]
+            prev = tracks.get(keys[i], None)
+            if prev is not None and 0.0 <= this_time - prev[0] <= self.max_gap_sec:
+                stats["numSteps"] += 1
+                route = self.get_route_dists(prev[2], prev[3], this_edges, this_frac)
+                straight = np.hypot(*(xy_arr[i] - prev[1]))
+                best = (prev[4][:, None] - np.abs(route - straight) / self.beta).max(axis=0)
+                if np.isfinite(best).any():
+                    scores = scores + best
+                else:
+                    stats["numRestarts"] += 1
+            best_ind = int(np.argmax(scores))
+            snapped[i] = proj[start + best_ind]
+            matched[i] = True
+            tracks[keys[i]] = (this_time, xy_arr[i], this_edges, this_frac,
+                               scores - scores[best_ind])
+        stats["numMatched"] += int(matched.sum())
+        if len(times):
+            self.prune(times.max())
+        return snapped, matched
+
+    def prune(self, time_sec):
+        """
+        Remove the tracks with no point in the last max_gap_sec seconds
+
+        Arguments:
+            time_sec {float} -- Current time (seconds)
+
+        Returns:
+            [int] -- Number of tracks removed
+        """
+        expired = [key for key, track in self.tracks.items()
+                   if track[0] < time_sec - self.max_gap_sec]
+        for key in expired:
+            del self.tracks[key]
+        return len(expired)
+
+    def get_stats(self):
+        """
+        Returns:
+            [dict] -- The matcher counters: points, matched points,
+            candidates per point, Viterbi steps, restarts, route distance
+            searches, cache hit rate and tracks
+        """
+        stats = dict(self.stats)
+        num_lookups = stats["numSearches"] + stats["numCacheHits"]
+        stats["candidatesPerPoint"] = (stats["numCandidates"] / float(stats["numPoints"])
+                                       if stats["numPoints"] else 0.0)
+        stats["hitRate"] = (stats["numCacheHits"] / float(num_lookups)
+                            if num_lookups else 0.0)
+        stats["numTracks"] = len(self.tracks)
+        return stats
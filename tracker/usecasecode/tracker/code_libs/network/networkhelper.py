@@ -4,23 +4,57 @@ Helper module for road-network related functions
 
 __version__ = '0.2'
 
+import hashlib
+import json
 import logging
+import math
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
 import numpy as np
 import networkx as nx
-from pysal.lib.cg import RTree, Rect
 from sklearn.neighbors import KDTree
-import pandas as pd
 from code_libs.euclidean import euchelper
 
+# Version of the on-disk road network cache (see load_road_network()).
+# Change it when the way the network is built (or keyed) changes. The caches
+# of the other versions are removed when a cache is saved
+CACHE_VERSION = 4
+CACHE_DIR_PREFIX = "road_network_"
+CACHE_ARRAYS = ("dense_lines", "points", "edges", "weights")
+
+# Shortest paths (see Network.get_shortest_path_bw_id())
+PATH_ALGORITHM = "astar"   # "astar" (euclidean heuristic) or "dijkstra"
+PATH_CACHE_SIZE = 10000    # (src, dst) paths kept in the LRU cache (0: no cache)
+ALL_PAIRS_MAX_NODES = 500  # max nodes for precompute_all_pairs()
+
 
 class Network:
     """Class for the Network graph
     """
 
-    def __init__(self, lines_arr, max_point_dist=0.1):
+    def __init__(self, lines_arr, max_point_dist=0.1, bulk_refine=True):
+        """
+        Init method
+
+        Arguments:
+            lines_arr {[list]} -- List of lines
+
+        Keyword Arguments:
+            max_point_dist {float} -- The max distance between two points
+                (default: {0.1})
+            bulk_refine {bool} -- Refine all the points at once
+                (refine_graph_bulk()). If False, the points are added to an
+                r-tree one by one (refine_graph()) (default: {True})
+        """
         self.pt_dict = {}
         self.adj_dict = {}
-        self.rtree = RTree()
+        self.rtree = None
+        if not bulk_refine:
+            from pysal.lib.cg import RTree
+            self.rtree = RTree()
 
         # KD Tree related
         self.kd_tree = None
@@ -30,9 +64,65 @@ class Network:
         self.kd_pt_data_list = []
 
         self.network = None
-        self.refine_graph(lines_arr, max_point_dist)
+        self.node_xy = None
+        self.init_path_cache()
+        if bulk_refine:
+            self.refine_graph_bulk(lines_arr, max_point_dist)
+        else:
+            self.refine_graph(lines_arr, max_point_dist)
         self.build_all_elements()
 
+    @classmethod
+    def from_arrays(cls, points, edges, weights):
+        """
+        Create the network from the arrays of a built network (see
+        get_arrays()), without refining the lines again. The r-tree is
+        only used while refining, and is None
+
+        Arguments:
+            points {np.array} -- (n,2) [x,y] of each point (point id = row)
+            edges {np.array} -- (m,2) [src,dst] point ids of each edge
+            weights {np.array} -- (m,) length of each edge
+
+        Returns:
+            [Network] -- The network
+        """
+        network = cls.__new__(cls)
+        network.rtree = None
+        network.kd_tree = None
+        network.points_kd = None
+        network.kd_ptid_to_nodeid_map = {}
+        network.kd_nodeid_to_ptid_map = {}
+        network.kd_pt_data_list = []
+        network.init_path_cache()
+
+        point_list = np.asarray(points, dtype=np.float64).tolist()
+        edge_list = np.asarray(edges, dtype=np.int64).tolist()
+        network.pt_dict = dict(enumerate(point_list))
+        network.adj_dict = {}
+        for src, dst in edge_list:
+            network.adj_dict.setdefault(src, []).append(dst)
+
+        network.build_network_from_arrays(point_list, edge_list, weights)
+        network.create_point_kd()
+        return network
+
+    def get_arrays(self):
+        """
+        Get the built network as arrays (see from_arrays())
+
+        Returns:
+            [dict] -- "points", "edges" and "weights" arrays
+        """
+        points = np.array([self.pt_dict[pt_id] for pt_id in range(len(self.pt_dict))],
+                          dtype=np.float64).reshape(-1, 2)
+        edges = np.array([(src, dst) for src in self.adj_dict
+                          for dst in self.adj_dict[src]],
+                         dtype=np.int64).reshape(-1, 2)
+        weights = np.array([self.network[src][dst]["weight"] for src, dst in edges.tolist()],
+                           dtype=np.float64)
+        return {"points": points, "edges": edges, "weights": weights}
+
     def check_and_add_pt(self, point, min_dist, next_pt_id):
         """Check if a point is present. A point will be added if
         there are no other points within the "min_dist" neighborhood
@@ -53,6 +143,7 @@ class Network:
             #logging.debug("\tREPEAT: point={}, res={}".format(point,res))
             point_id = res[0]
         else:
+            from pysal.lib.cg import Rect
             pt0 = ((point[0] - float(min_dist / 2.0)),
                    (point[1] - float(min_dist / 2.0)))
             pt1 = ((point[0] + float(min_dist / 2.0)),
@@ -70,6 +161,9 @@ class Network:
             lines_arr {[list]} -- List of lines
             max_point_dist {[float]} -- The max distance between two points
         """
+        if isinstance(lines_arr, np.ndarray):
+            lines_arr = lines_arr.tolist()
+
         # Put all lines in an r-tree
         pt_id = 0
 
@@ -108,6 +202,84 @@ class Network:
                 prev_pt_id = add_pt_id
         # logging.debug("pt_dict={}".format(self.pt_dict))
 
+    def refine_graph_bulk(self, lines_arr, max_point_dist):
+        """
+        Same as refine_graph(), for all the points at once. Exact repeats of
+        a point (e.g. the shared end points of the lines) are merged with one
+        np.unique(), and a KD-tree radius query finds the points that have
+        another point within their max_point_dist square. Only these are
+        merged one by one, in the order of the points; all the others are
+        new points.
+
+        If the squares of more than one added point contain a point, it is
+        merged into the first added one (the r-tree of refine_graph()
+        returns them in the order of its nodes, and takes the first). Apart
+        from this, the graph is the same as with refine_graph()
+
+        Arguments:
+            lines_arr {[list]} -- List of lines
+            max_point_dist {[float]} -- The max distance between two points
+        """
+        if isinstance(lines_arr, np.ndarray):
+            # Segment array (euchelper.densify_graph())
+            pts_arr = lines_arr.reshape(-1, 2).astype(np.float64)
+            line_lths = np.full(len(lines_arr), lines_arr.shape[1])
+        else:
+            pts_arr = np.array([point for line_string in lines_arr for point in line_string],
+                               dtype=np.float64).reshape(-1, 2)
+            line_lths = [len(line_string) for line_string in lines_arr]
+        if not len(pts_arr):
+            return
+
+        # Unique points, in the order they first appear
+        uniq_pts, first_index, inverse = np.unique(
+            pts_arr, axis=0, return_index=True, return_inverse=True)
+        appearance = np.argsort(first_index, kind="mergesort")
+        uniq_pts = uniq_pts[appearance]
+        first_index = first_index[appearance]
+        rank = np.empty(len(appearance), dtype=np.int64)
+        rank[appearance] = np.arange(len(appearance))
+        inverse = rank[inverse.ravel()]
+
+        # Square of each point (same as check_and_add_pt())
+        half_dist = float(max_point_dist / 2.0)
+        low = uniq_pts - half_dist
+        high = uniq_pts + half_dist
+        neighbors = KDTree(uniq_pts, metric="chebyshev").query_radius(
+            uniq_pts, r=half_dist * (1.0 + 1e-9))
+
+        merged_to = np.arange(len(uniq_pts))
+        is_new = np.ones(len(uniq_pts), dtype=bool)
+        for i in np.flatnonzero([len(ele) > 1 for ele in neighbors]).tolist():
+            pt_x, pt_y = uniq_pts[i]
+            candidates = [j for j in neighbors[i].tolist()
+                          if j < i and is_new[j] and
+                          low[j, 0] <= pt_x <= high[j, 0] and
+                          low[j, 1] <= pt_y <= high[j, 1]]
+            if candidates:
+                is_new[i] = False
+                merged_to[i] = min(candidates)
+
+        # Point ids are issued in the order the new points are added
+        new_ids = np.cumsum(is_new) - 1
+        pt_ids = new_ids[merged_to[inverse]]
+        new_index = np.flatnonzero(is_new)
+        self.pt_dict.update(zip(new_ids[new_index].tolist(),
+                                pts_arr[first_index[new_index]].tolist()))
+
+        # Edges between consecutive points of each line (src->dest)
+        line_ends = np.cumsum(line_lths)
+        has_next = np.ones(len(pts_arr), dtype=bool)
+        has_next[line_ends[line_ends > 0] - 1] = False
+        src_ids = pt_ids[:-1][has_next[:-1]].tolist()
+        dst_ids = pt_ids[1:][has_next[:-1]].tolist()
+        for src, dst in zip(src_ids, dst_ids):
+            adj_list = self.adj_dict.get(src, None)
+            if adj_list is None:
+                adj_list = []
+                self.adj_dict[src] = adj_list
+            adj_list.append(dst)
+
     def build_all_elements(self):
         """Build the network and create an indexing structure (kdtree)
         """
@@ -155,39 +327,165 @@ class Network:
     def build_network(self):
         """Build the road-network
         """
+        point_list = [self.pt_dict[pt_id] for pt_id in self.pt_dict]
+        edge_list = [(src, dst) for src in self.adj_dict
+                     for dst in self.adj_dict[src]]
+        weights = []
+        if edge_list:
+            points = np.array([self.pt_dict[pt_id] for pt_id in range(len(self.pt_dict))],
+                              dtype=np.float64).reshape(-1, 2)
+            edges = np.array(edge_list, dtype=np.int64)
+            weights = np.linalg.norm(points[edges[:, 0]] - points[edges[:, 1]], axis=1)
+        self.build_network_from_arrays(point_list, edge_list, weights,
+                                       pt_ids=list(self.pt_dict))
+
+    def build_network_from_arrays(self, point_list, edge_list, weights, pt_ids=None):
+        """
+        Build the road-network from the points and edges, in bulk
+
+        Arguments:
+            point_list {list} -- [x,y] of each point
+            edge_list {list} -- (src,dst) point ids of each edge
+            weights {list} -- Length of each edge
+
+        Keyword Arguments:
+            pt_ids {list} -- Id of each point (default: {None}, the index of
+                the point)
+        """
+        if pt_ids is None:
+            pt_ids = range(len(point_list))
+        pt_ids = np.asarray(pt_ids, dtype=np.int64)
+        # [x,y] of each node, indexed by node id (see get_path_xy())
+        self.node_xy = np.full((pt_ids.max() + 1 if len(pt_ids) else 0, 2), np.nan)
+        self.node_xy[pt_ids] = np.asarray(point_list, dtype=np.float64).reshape(-1, 2)
+        pt_ids = pt_ids.tolist()
         self.network = nx.Graph()
-        for pt_id in self.pt_dict:
-            self.network.add_node(pt_id, x=self.pt_dict[pt_id][0],
-                                  y=self.pt_dict[pt_id][1],
-                                  pos=(self.pt_dict[pt_id][0],
-                                       self.pt_dict[pt_id][1]))
-
-        for src in self.adj_dict:
-            for dst in self.adj_dict[src]:
-                src_pt = np.array(self.pt_dict[src])
-                dst_pt = np.array(self.pt_dict[dst])
-                edge_len = np.linalg.norm(src_pt-dst_pt)
-                self.network.add_edge(src, dst, weight=edge_len)
+        self.network.add_nodes_from(
+            (pt_id, {"x": point[0], "y": point[1], "pos": (point[0], point[1])})
+            for pt_id, point in zip(pt_ids, point_list))
+        self.network.add_weighted_edges_from(
+            (src, dst, weight) for (src, dst), weight
+            in zip(edge_list, np.asarray(weights, dtype=np.float64).tolist()))
+
+    def init_path_cache(self, cache_size=PATH_CACHE_SIZE,
+                        algorithm=PATH_ALGORITHM):
+        """
+        Reset the shortest path cache and its counters
 
-    def get_shortest_path_bw_id(self, start_point_id, dst_point_id):
-        """Get the shortest path between given source and dest
+        Keyword Arguments:
+            cache_size {int} -- Max number of (src, dst) paths kept
+                (default: {PATH_CACHE_SIZE})
+            algorithm {string} -- "astar" or "dijkstra"
+                (default: {PATH_ALGORITHM})
+        """
+        self.path_cache = OrderedDict()  #key: (src, dst), value: tuple of node ids (None if no path)
+        self.path_cache_size = cache_size
+        self.path_algorithm = algorithm
+        self.all_pairs_paths = None  #key: src, value: {dst: list of node ids}
+        self.path_stats = {"numQueries": 0, "numCacheHits": 0,
+                           "numAllPairsHits": 0, "numSearches": 0,
+                           "searchTimeSec": 0.0}
+
+    def precompute_all_pairs(self, max_nodes=ALL_PAIRS_MAX_NODES):
+        """
+        Precompute the shortest paths between all pairs of nodes, if the
+        network has at most max_nodes nodes (the table has n^2 paths)
 
-        Arguments:
-            start_point_id {[list]} -- [x,y] of the source point
-            dst_point_id {[type]} -- [x,y] of the destination point
+        Keyword Arguments:
+            max_nodes {int} -- Max number of nodes
+                (default: {ALL_PAIRS_MAX_NODES})
 
         Returns:
-            [list] -- list of points [x,y]
+            [bool] -- True if the table was computed
+        """
+        if self.network is None or self.network.number_of_nodes() > max_nodes:
+            return False
+        self.all_pairs_paths = dict(nx.all_pairs_dijkstra_path(self.network,
+                                                                weight='weight'))
+        return True
+
+    def get_path_heuristic(self, node_id1, node_id2):
+        """
+        Euclidean distance between two nodes (A* heuristic; the edge weights
+        are euclidean lengths, so it never overestimates)
+
+        Returns:
+            [float] -- The distance
+        """
+        nodes = self.network.nodes
+        return math.hypot(nodes[node_id1]["x"] - nodes[node_id2]["x"],
+                          nodes[node_id1]["y"] - nodes[node_id2]["y"])
+
+    def search_shortest_path(self, start_point_id, dst_point_id):
+        """
+        Search the shortest path in the graph (no cache)
+
+        Returns:
+            [list] -- list of node ids (None if there is no path)
         """
-        retval = []
         try:
-            retval = nx.shortest_path(
+            if self.path_algorithm == "astar":
+                return nx.astar_path(self.network, start_point_id, dst_point_id,
+                                     heuristic=self.get_path_heuristic,
+                                     weight='weight')
+            return nx.shortest_path(
                 self.network, source=start_point_id, target=dst_point_id,
                 weight='weight')
         except nx.NetworkXNoPath:
             # No path found between two points
-            retval = None
-        return retval
+            return None
+
+    def get_shortest_path_bw_id(self, start_point_id, dst_point_id):
+        """Get the shortest path between given source and dest. The path
+        is taken from the all-pairs table (see precompute_all_pairs()) or
+        from the LRU cache of the searched paths, if there
+
+        Arguments:
+            start_point_id {[int]} -- id of the source point
+            dst_point_id {[int]} -- id of the destination point
+
+        Returns:
+            [list] -- list of node ids (None if there is no path)
+        """
+        stats = self.path_stats
+        stats["numQueries"] += 1
+        if (self.all_pairs_paths is not None and
+                start_point_id in self.all_pairs_paths):
+            stats["numAllPairsHits"] += 1
+            path = self.all_pairs_paths[start_point_id].get(dst_point_id, None)
+            return None if path is None else list(path)
+
+        key = (start_point_id, dst_point_id)
+        if key in self.path_cache:
+            stats["numCacheHits"] += 1
+            self.path_cache.move_to_end(key)
+            path = self.path_cache[key]
+            return None if path is None else list(path)
+
+        start_time = time.perf_counter()
+        path = self.search_shortest_path(start_point_id, dst_point_id)
+        stats["searchTimeSec"] += time.perf_counter() - start_time
+        stats["numSearches"] += 1
+        if self.path_cache_size:
+            self.path_cache[key] = None if path is None else tuple(path)
+            if len(self.path_cache) > self.path_cache_size:
+                self.path_cache.popitem(last=False)
+        return path
+
+    def get_path_stats(self):
+        """
+        Returns:
+            [dict] -- The shortest path counters: queries, cache and
+            all-pairs hits, searches, hit rate and mean search latency
+        """
+        stats = dict(self.path_stats)
+        num_queries = stats["numQueries"]
+        stats["hitRate"] = ((stats["numCacheHits"] + stats["numAllPairsHits"]) /
+                            float(num_queries) if num_queries else 0.0)
+        stats["meanSearchMs"] = (1000.0 * stats["searchTimeSec"] / stats["numSearches"]
+                                 if stats["numSearches"] else 0.0)
+        stats["cacheSize"] = len(self.path_cache)
+        return stats
 
     def get_xy(self, node_id):
         """
@@ -205,6 +503,18 @@ class Network:
         else:
             return None
 
+    def get_path_xy(self, path):
+        """
+        Get the coordinates of the nodes of a path
+
+        Arguments:
+            path {list} -- list of node ids
+
+        Returns:
+            [np.array] -- (len(path),2) [x,y] of each node
+        """
+        return self.node_xy[np.asarray(path, dtype=np.int64)].reshape(-1, 2)
+
     def get_interpolated_path(self, st_pt, end_pt, ts_arr,
                               interpolate_time_sec=0.5, id_str=None):
         """
@@ -218,185 +528,79 @@ class Network:
         Keyword Arguments:
             interpolate_time_sec {float} -- The interpolation time
                 (default: {0.5})
-            id_str {string} -- The string id provided as a suffix to file
-                (default: {None})
-        """
-        retval = []
-        path = self.get_shortest_path_bw_id(st_pt, end_pt)
-        if path is None:
-            retval = None
-
-        elif path:
-            last_ts = ts_arr[len(ts_arr) - 1]
-            start_ts = ts_arr[0]
-            total_time_sec = (last_ts - start_ts) / np.timedelta64(1, 's')
-            path_lth = 0
-            path_pts = []
-            prev_pt = None
-            # Compute path length
-            for node in path:
-                thept = self.get_xy(node)
-                if thept is not None:
-                    thept = np.array(thept)
-                    path_pts.append(thept)
-                    if prev_pt is not None:
-                        dist = np.linalg.norm(thept-prev_pt)
-                        path_lth += dist
-                    prev_pt = thept
-
-            # Chop the distance into points based on speed and time
-            time_diff = (ts_arr[len(ts_arr) - 1] -
-                         ts_arr[0]) / np.timedelta64(1, 's')
-            dist_km_per_hop = (path_lth *
-                               interpolate_time_sec / float(total_time_sec))
-
-            path_list = []
-            prev_node = None
-            prev_node_pt = None
-            remaining_dist_on_this_hop = 0.0
-            curr_ts = start_ts
-            for node in path:
-                thept = np.array(self.get_xy(node))
-                if prev_node_pt is not None:
-                    # Now interpolate with the distance
-                    edge_len_km = np.linalg.norm(thept - prev_node_pt)
-
-                    traversed_dist_on_this_hop = abs(
-                        remaining_dist_on_this_hop)
-
-                    if(remaining_dist_on_this_hop < 0 and
-                       abs(remaining_dist_on_this_hop) < edge_len_km):
-
-                        proportion = (
-                            traversed_dist_on_this_hop / float(edge_len_km))
-                        new_pt = euchelper.interpolate_line(
-                            prev_node_pt, thept, proportion)
-                        curr_lth = abs(remaining_dist_on_this_hop)
-                        time_delta_this_hop_sec = (curr_lth *
-                                                   time_diff / float(path_lth))
-                        curr_ts = (curr_ts +
-                                   pd.Timedelta(time_delta_this_hop_sec, unit='s'))
-                        path_list.append({"ts": curr_ts, "edgept1": prev_node,
-                                          "edgept2": node,
-                                          "edgeX0": prev_node_pt[0],
-                                          "edgeY0": prev_node_pt[1],
-                                          "edgeX1": thept[0], "edgeY1": thept[1],
-                                          "edgeLth": edge_len_km,
-                                          "x": new_pt[0], "y": new_pt[1],
-                                          "proportion": proportion,
-                                          "currLth": curr_lth,
-                                          "timeDelta": time_delta_this_hop_sec,
-                                          "distOnHop": traversed_dist_on_this_hop,
-                                          "remLth": remaining_dist_on_this_hop}
-                                         )
-                        retval.append(
-                            [curr_ts, new_pt[0], new_pt[1], curr_lth])
-
-                    remaining_dist_on_this_hop = edge_len_km + remaining_dist_on_this_hop
-
-                    if remaining_dist_on_this_hop <= 0:
-                        # Add entire edge
-                        new_pt = thept
-                        curr_lth = edge_len_km
-                        remaining_dist_on_this_hop -= curr_lth
-
-                        time_delta_this_hop_sec = curr_lth * \
-                            time_diff / float(path_lth)
-                        curr_ts = curr_ts + \
-                            pd.Timedelta(time_delta_this_hop_sec, unit='s')
-                        retval.append(
-                            [curr_ts, new_pt[0], new_pt[1], curr_lth])
-                        path_list.append({"ts": curr_ts,
-                                          "edgeX0": prev_node_pt[0],
-                                          "edgeY0": prev_node_pt[1],
-                                          "edgeX1": thept[0],
-                                          "edgeY1": thept[1],
-                                          "x": new_pt[0],
-                                          "y": new_pt[1],
-                                          "edgeLth": edge_len_km,
-                                          "proportion": 1.0,
-                                          "currLth": curr_lth,
-                                          "timeDelta": time_delta_this_hop_sec,
-                                          "distOnHop": curr_lth,
-                                          "remLth": remaining_dist_on_this_hop}
-                                         )
-                    else:
-                        while remaining_dist_on_this_hop >= 0.0:
-                            # Now keep interpolating
-                            curr_lth = dist_km_per_hop  # about 0.7
-                            traversed_dist_on_this_hop += curr_lth
-                            remaining_dist_on_this_hop = edge_len_km - traversed_dist_on_this_hop
-
-                            if traversed_dist_on_this_hop > edge_len_km:
-                                curr_lth = (edge_len_km -
-                                            (traversed_dist_on_this_hop - curr_lth))
-                                traversed_dist_on_this_hop = edge_len_km
-
-                            proportion = (traversed_dist_on_this_hop /
-                                          float(edge_len_km))
-                            new_pt = euchelper.interpolate_line(
-                                prev_node_pt, thept, proportion)
-                            time_delta_this_hop_sec = (curr_lth *
-                                                       time_diff / float(path_lth))
-                            curr_ts = (curr_ts +
-                                       pd.Timedelta(time_delta_this_hop_sec, unit='s'))
-                            path_list.append({"ts": curr_ts,
-                                              "edgept1": prev_node,
-                                              "edgept2": node,
-                                              "edgeX0": prev_node_pt[0],
-                                              "edgeY0": prev_node_pt[1],
-                                              "edgeX1": thept[0],
-                                              "edgeY1": thept[1],
-                                              "edgeLth": edge_len_km,
-                                              "x": new_pt[0],
-                                              "y": new_pt[1],
-                                              "proportion": proportion,
-                                              "currLth": curr_lth,
-                                              "timeDelta": time_delta_this_hop_sec,
-                                              "distOnHop": traversed_dist_on_this_hop,
-                                              "remLth": remaining_dist_on_this_hop})
-                            retval.append(
-                                [curr_ts, new_pt[0], new_pt[1], curr_lth])
+            id_str {string} -- If given, the points are also written to
+                "pathBreaks_<id_str>.csv" (default: {None})
 
-                else:
-                    # First point
-                    retval.append([curr_ts, thept[0], thept[1], 0])
-                    path_list.append({"ts": curr_ts, "edgept1": prev_node,
-                                      "edgept2": node, "edgeX0": None,
-                                      "edgeY0": None,
-                                      "edgeX1": thept[0],
-                                      "edgeY1": thept[1],
-                                      "x": thept[0],
-                                      "y": thept[1],
-                                      "edgeLth": None,
-                                      "proportion": None,
-                                      "currLth": None,
-                                      "timeDelta": None,
-                                      "distOnHop": None,
-                                      "remLth": remaining_dist_on_this_hop})
-                prev_node = node
-                prev_node_pt = thept
-                pd.DataFrame(path_list).to_csv(
-                    "pathBreaks_{}.csv".format(id_str), index=False)
-
-        if(retval is not None) and (len(retval) > 2):
-            path_list = []
-            index = 0
-            curr_ts = start_ts
-            lth_vec = [ele[3] for ele in retval]
-            total_lth = float(np.sum(lth_vec))
-            curr_ts = start_ts
-            for ent in retval:
-                ent[0] = curr_ts
-                time_inc = ent[3] * total_time_sec / float(total_lth)
-                curr_ts = curr_ts + pd.Timedelta(time_inc, unit='s')
-                index += 1
-                path_list.append(
-                    {"ts": ent[0], "edgeX0": ent[1], "edgeY0": ent[2]})
-
-            pd.DataFrame(path_list).to_csv(
-                "pathBreaks_final_{}.csv".format(id_str), index=False)
+        Returns:
+            [list] -- list of [timestamp, x, y, distance from the previous
+            point] (see get_interpolated_paths()). None if there is no path
+        """
+        retval = self.get_interpolated_paths([(st_pt, end_pt, ts_arr)],
+                                             interpolate_time_sec)[0]
+        if retval and id_str is not None:
+            import pandas as pd
+            pd.DataFrame(retval, columns=["ts", "x", "y", "currLth"]).to_csv(
+                "pathBreaks_{}.csv".format(id_str), index=False)
+        return retval
+
+    def get_interpolated_paths(self, requests, interpolate_time_sec=0.5):
+        """
+        Interpolate the paths of many requests at once (e.g. to fill the
+        gaps of all the tracks offline). The path of each request is the
+        shortest path between its points; the object is assumed to move at
+        a constant speed from the first to the last timestamp of the
+        request. A point is placed every interpolate_time_sec seconds, and
+        at every node of the path
+
+        Arguments:
+            requests {list} -- list of (st_pt, end_pt, ts_arr): the ids of
+                the start and end points, and the timestamps of the visits
+                (only the first and the last are used)
+
+        Keyword Arguments:
+            interpolate_time_sec {float} -- The interpolation time
+                (default: {0.5})
 
+        Returns:
+            [list] -- For each request, the list of [timestamp, x, y,
+            distance from the previous point] (None if there is no path
+            between the points, [] if the path is empty). The timestamp of a
+            point is the first timestamp plus the time to travel to it, i.e.
+            the total time times the share of the path length up to the
+            point: the first point is at the first timestamp and the last
+            point (the end point) at the last one. The timestamps are
+            pd.Timestamp. If the total time is 0, the points are the nodes
+            of the path, all at the first timestamp
+        """
+        retval = [None] * len(requests)
+        path_xy_list = []
+        total_time_list = []
+        req_index = []
+        for index, (st_pt, end_pt, ts_arr) in enumerate(requests):
+            path = self.get_shortest_path_bw_id(st_pt, end_pt)
+            if path is None:
+                continue
+            if not path:
+                retval[index] = []
+                continue
+            path_xy_list.append(self.get_path_xy(path))
+            total_time_list.append(
+                (ts_arr[len(ts_arr) - 1] - ts_arr[0]) / np.timedelta64(1, 's'))
+            req_index.append(index)
+        if not req_index:
+            return retval
+
+        import pandas as pd
+        line_index, time_sec, x_arr, y_arr, lth_arr = interpolate_polylines(
+            path_xy_list, total_time_list, interpolate_time_sec)
+        bounds = np.searchsorted(line_index, np.arange(len(req_index) + 1))
+        for line, index in enumerate(req_index):
+            start, end = bounds[line], bounds[line + 1]
+            ts_list = (pd.Timestamp(requests[index][2][0]) +
+                       pd.to_timedelta(time_sec[start:end], unit='s')).tolist()
+            retval[index] = [list(ele) for ele in zip(
+                ts_list, x_arr[start:end].tolist(), y_arr[start:end].tolist(),
+                lth_arr[start:end].tolist())]
         return retval
 
     def draw_network(self):
@@ -411,3 +615,226 @@ class Network:
             nx.draw(self.network, pos, with_labels=True)
 
             plt.show()
+
+
+def interpolate_polylines(polylines, total_time_secs, interpolate_time_sec=0.5):
+    """
+    Place points along polylines traversed at constant speed: one point
+    every interpolate_time_sec seconds, plus one at every vertex. All the
+    polylines are interpolated together, with array operations over the
+    cumulative arc lengths
+
+    Arguments:
+        polylines {list} -- list of (n,2) [x,y] arrays (n >= 1)
+        total_time_secs {list} -- Time taken to traverse each polyline
+
+    Keyword Arguments:
+        interpolate_time_sec {float} -- The interpolation time
+            (default: {0.5})
+
+    Returns:
+        [tuple] -- (polyline index, time from the start of the polyline in
+        seconds, x, y, distance from the previous point) arrays, sorted by
+        polyline and time
+    """
+    num_lines = len(polylines)
+    counts = np.array([len(line) for line in polylines], dtype=np.int64)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    ends = starts + counts - 1
+    points = np.concatenate([np.asarray(line, dtype=np.float64).reshape(-1, 2)
+                             for line in polylines])
+    total_times = np.asarray(total_time_secs, dtype=np.float64)
+
+    # Cumulative arc length of each vertex, from the start of its polyline
+    # (summed per polyline, so that the result does not depend on the other
+    # polylines of the batch)
+    seg_lth = np.hypot(*np.diff(points, axis=0).T)
+    cum_lth = np.concatenate([
+        np.cumsum(np.concatenate([[0.0], seg_lth[start:end]]))
+        for start, end in zip(starts.tolist(), ends.tolist())])
+    lengths = cum_lth[ends]
+
+    # Arc length of the points: every interpolate_time_sec, and the vertices
+    moving = (lengths > 0) & (total_times > 0)
+    num_steps = np.zeros(num_lines, dtype=np.int64)
+    if interpolate_time_sec > 0:
+        num_steps[moving] = np.floor(total_times[moving] /
+                                     interpolate_time_sec).astype(np.int64)
+    step_line = np.repeat(np.arange(num_lines), num_steps)
+    step_num = np.arange(len(step_line)) - np.repeat(np.cumsum(num_steps) - num_steps,
+                                                     num_steps) + 1
+    step_lth = (lengths[step_line] * interpolate_time_sec /
+                total_times[step_line] * step_num)
+    vertex_line = np.repeat(np.arange(num_lines), counts)
+    line_index = np.concatenate([vertex_line, step_line])
+    arc = np.concatenate([cum_lth, step_lth])
+    order = np.lexsort((arc, line_index))
+    line_index = line_index[order]
+    arc = arc[order]
+    keep = np.ones(len(arc), dtype=bool)
+    keep[1:] = ((line_index[1:] != line_index[:-1]) |
+                (arc[1:] - arc[:-1] > 1e-9 * np.maximum(lengths[line_index[1:]], 1.0)))
+    keep &= arc <= lengths[line_index]
+    line_index = line_index[keep]
+    arc = arc[keep]
+
+    # Segment of each point, and its position on the segment. The polylines
+    # are laid end to end (with a gap) so that one searchsorted finds them
+    offsets = np.cumsum(lengths + 1.0) - (lengths + 1.0)
+    seg = np.searchsorted(cum_lth + np.repeat(offsets, counts),
+                          arc + offsets[line_index], side='right') - 1
+    seg = np.clip(seg, starts[line_index],
+                  np.maximum(starts[line_index], ends[line_index] - 1))
+    nxt = np.minimum(seg + 1, ends[line_index])
+    seg_arc = cum_lth[nxt] - cum_lth[seg]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        proportion = np.where(seg_arc > 0,
+                              np.clip((arc - cum_lth[seg]) / seg_arc, 0.0, 1.0), 0.0)
+    x_arr = points[seg, 0] + proportion * (points[nxt, 0] - points[seg, 0])
+    y_arr = points[seg, 1] + proportion * (points[nxt, 1] - points[seg, 1])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        time_sec = np.where(lengths[line_index] > 0,
+                            arc / lengths[line_index] * total_times[line_index], 0.0)
+    lth_arr = np.concatenate(([0.0], np.diff(arc)))
+    first = np.ones(len(arc), dtype=bool)
+    first[1:] = line_index[1:] != line_index[:-1]
+    lth_arr[first] = 0.0
+    return line_index, time_sec, x_arr, y_arr, lth_arr
+
+
+def get_road_network_key(map_info, max_point_dist):
+    """
+    Get the content hash of a road network. The lines are converted to
+    floats first, so lists, tuples and numpy arrays of the same points have
+    the same hash
+
+    Arguments:
+        map_info {list} -- The road network as a list of lines
+        max_point_dist {float} -- The max distance between two points
+
+    Returns:
+        [string] -- The hash (hex)
+    """
+    try:
+        lines = np.asarray(map_info, dtype=np.float64).tolist()
+    except ValueError:
+        # Lines with different numbers of points
+        lines = [np.asarray(line, dtype=np.float64).tolist() for line in map_info]
+    content = json.dumps([CACHE_VERSION, float(max_point_dist), lines],
+                         separators=(",", ":"))
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def get_cache_dir_name(map_info, max_point_dist):
+    """
+    Returns:
+        [string] -- The name of the cache directory of a road network (cache
+        version and content hash)
+    """
+    return "{}v{}_{}".format(CACHE_DIR_PREFIX, CACHE_VERSION,
+                             get_road_network_key(map_info, max_point_dist))
+
+
+def remove_old_caches(cache_dir):
+    """
+    Remove the road network caches of the other cache versions from
+    cache_dir (the partially written caches are left to their writers)
+
+    Arguments:
+        cache_dir {string} -- The cache directory
+
+    Returns:
+        [list] -- The removed cache directories
+    """
+    current_prefix = "{}v{}_".format(CACHE_DIR_PREFIX, CACHE_VERSION)
+    removed = []
+    for name in os.listdir(cache_dir):
+        if name.startswith(CACHE_DIR_PREFIX) and not name.startswith(current_prefix):
+            path = os.path.join(cache_dir, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+                removed.append(path)
+    return removed
+
+
+def save_road_network(cache_path, dense_lines, network):
+    """
+    Save the densified lines and the built network as .npy files in the
+    directory cache_path. The directory is written under a temporary name
+    first, so a partially written cache is never loaded. The caches of the
+    other cache versions next to it are removed
+
+    Arguments:
+        cache_path {string} -- The cache directory of the network
+        dense_lines {np.array} -- The densified line segments
+            (euchelper.densify_graph())
+        network {Network} -- The built network
+    """
+    arrays = network.get_arrays()
+    arrays["dense_lines"] = np.asarray(dense_lines, dtype=np.float64).reshape(-1, 2, 2)
+    parent_dir = os.path.dirname(cache_path) or "."
+    tmp_path = tempfile.mkdtemp(prefix=".tmp_" + CACHE_DIR_PREFIX, dir=parent_dir)
+    try:
+        for name in CACHE_ARRAYS:
+            np.save(os.path.join(tmp_path, name + ".npy"), arrays[name])
+        os.rename(tmp_path, cache_path)
+    except OSError:
+        # e.g. another tracker has written the same cache meanwhile
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    try:
+        for path in remove_old_caches(parent_dir):
+            logging.info("Road network: removed old cache %s", path)
+    except OSError as cache_error:
+        logging.warning("Road network: could not remove the old caches in %s: %s",
+                        parent_dir, str(cache_error))
+
+
+def load_road_network(map_info, cache_dir=None, max_point_dist=0.1):
+    """
+    Densify the road network (map_info) and build the Network. If cache_dir
+    is given, the result is cached there, keyed by the content hash of
+    map_info (see get_road_network_key()). Later calls with the same
+    map_info load the arrays (memory-mapped) instead of building the network
+    again. A cache that can not be read or written is logged, and the
+    network is built as without a cache
+
+    Arguments:
+        map_info {list} -- The road network as a list of lines
+
+    Keyword Arguments:
+        cache_dir {string} -- The cache directory (default: {None}, no cache)
+        max_point_dist {float} -- The max distance between two points
+            (default: {0.1})
+
+    Returns:
+        [tuple] -- ((n,2,2) array of the densified line segments, Network)
+    """
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(
+            cache_dir, get_cache_dir_name(map_info, max_point_dist))
+        if os.path.isdir(cache_path):
+            try:
+                arrays = {name: np.load(os.path.join(cache_path, name + ".npy"),
+                                        mmap_mode="r")
+                          for name in CACHE_ARRAYS}
+                network = Network.from_arrays(arrays["points"], arrays["edges"],
+                                              arrays["weights"])
+                logging.info("Road network: loaded from cache %s", cache_path)
+                return arrays["dense_lines"], network
+            except (OSError, ValueError) as cache_error:
+                logging.error("ERROR: Road network: could not load cache %s: %s",
+                              cache_path, str(cache_error))
+
+    dense_lines = euchelper.densify_graph(map_info)
+    network = Network(dense_lines, max_point_dist=max_point_dist)
+    if cache_path is not None:
+        try:
+            save_road_network(cache_path, dense_lines, network)
+            logging.info("Road network: saved cache %s", cache_path)
+        except OSError as cache_error:
+            logging.error("ERROR: Road network: could not save cache %s: %s",
+                          cache_path, str(cache_error))
+    return dense_lines, network